@@ -0,0 +1,69 @@
+"""
+batched search: queries per second of search_many against a loop over search, on a batch replayed from a Zipf query
+log (see bench_cache), with one process and with a pool of workers. the loop is also timed with the caches of
+QueryProcessor, which share the work of repeated queries too, but only after the first time. the results of
+search_many are checked to be the same as the ones of search.
+
+    python -m benchmarks.bench_batch
+"""
+import os
+import random
+import time
+
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.bench_cache import make_queries
+from benchmarks.common import synthetic_corpus, zipf_log
+
+SIZE = 5000
+N_DISTINCT = 500
+N_QUERIES = 2000
+ZIPF_S = 1.1
+WORKERS = (1, 2, 4)
+
+
+def throughput(function, batch):
+    start = time.perf_counter()
+    results = function(batch)
+    return len(batch) / (time.perf_counter() - start), results
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE), spell_backend='bktree')
+    index.create_posting_list()
+    rng = random.Random(0)
+    queries = make_queries(index, rng, N_DISTINCT)
+    rng.shuffle(queries)
+    batch = zipf_log(queries, N_QUERIES, ZIPF_S, rng)
+    print(f"{SIZE} documents, {len(index.posting_list)} words, {len(batch)} queries, {len(set(batch))} distinct, "
+          f"{os.cpu_count()} cpus")
+
+    processor = QueryProcessor(index)
+    processor.create_prefix_trie()
+    # build the BK-tree and the lexicon before timing
+    processor.search(queries[0])
+    index.get_lexicon()
+
+    def fresh(cache_size=0):
+        # a new processor for every run, so nothing is shared between runs but the index
+        other = QueryProcessor(index, cache_size=cache_size)
+        other.prefix_trie = processor.prefix_trie
+        other.indexed_words = processor.indexed_words
+        return other
+
+    loop, expected = throughput(lambda queries: [processor.search(query) for query in queries], batch)
+    print(f"\n{'method':>24} {'queries/s':>10} {'speedup':>8}")
+    print(f"{'loop over search':>24} {loop:10.0f} {1:8.1f}")
+    cached = fresh(cache_size=len(batch))
+    rate, results = throughput(lambda queries: [cached.search(query) for query in queries], batch)
+    assert results == expected
+    print(f"{'loop, with caches':>24} {rate:10.0f} {rate / loop:8.1f}")
+    for workers in WORKERS:
+        other = fresh()
+        rate, results = throughput(lambda queries: other.search_many(queries, workers=workers), batch)
+        assert results == expected
+        print(f"{f'search_many, {workers} workers':>24} {rate:10.0f} {rate / loop:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
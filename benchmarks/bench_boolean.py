@@ -0,0 +1,50 @@
+"""
+boolean queries with wildcards on both sides: the old pairwise evaluation (one intersect or union per pair of expanded
+words, every word looked up again for every pair) against the parsed query, whose wildcards are expanded and looked up
+once and whose AND operands are evaluated from the rarest one.
+
+    python -m benchmarks.bench_boolean
+"""
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.common import best_of, synthetic_corpus
+
+SIZE = 1600
+QUERIES = [('sa*', 'and', 'c?n*'), ('pr*', 'and', '*ing'), ('re*', 'or', 'co*'), ('*tion', 'and', 'ma*'),
+           ('a*e', 'or', 't*'), ('*er', 'and', 'b*')]
+
+
+def pairwise(processor, left, operator, right):
+    """
+    the evaluation of the old QueryProcessor.search for 'left operator right'.
+    """
+    result = set()
+    for first in processor.wildcard_query(left):
+        for second in processor.wildcard_query(right):
+            docs1, docs2 = processor.get_word_docs(first), processor.get_word_docs(second)
+            result |= docs1 & docs2 if operator == 'and' else docs1 | docs2
+    return result
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE))
+    index.create_posting_list()
+    processor = QueryProcessor(index)
+    processor.create_prefix_trie()
+    print(f"{'query':>20} {'pairs':>8} {'docs':>6} {'pairwise (ms)':>14} {'parsed (ms)':>12} {'speedup':>8}")
+    for left, operator, right in QUERIES:
+        query = f'{left} {operator} {right}'
+        pairs = len(processor.wildcard_query(left)) * len(processor.wildcard_query(right))
+        old_time, expected = best_of(lambda: pairwise(processor, left, operator, right), repeat=1)
+        new_time, result = best_of(lambda: processor.search(query))
+        assert result == expected, query
+        print(f'{query:>20} {pairs:>8} {len(result):>6} {old_time * 1000:14.1f} {new_time * 1000:12.2f} '
+              f'{old_time / new_time:7.0f}x')
+
+    nested = '(s* or c*) and not (pr* near/2 *ing) and (a* or e*)'
+    new_time, result = best_of(lambda: processor.search(nested))
+    print(f"{nested}: {len(result)} docs in {new_time * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+build time of the posting list against corpus size, for the old per-token insert (add_document) and the bulk build.
+
+    python -m benchmarks.bench_build
+"""
+from src.indexing import InvertedIndex
+from benchmarks.common import best_of, synthetic_corpus
+
+SIZES = [100, 200, 400, 800, 1600, 3200]
+# the insert build is quadratic, so we stop timing it after this size
+MAX_INSERT_SIZE = 400
+
+
+def build(documents, bulk):
+    index = InvertedIndex(documents)
+    index.create_posting_list(bulk=bulk)
+    return index
+
+
+def same_index(first, second):
+    if [t.word for t in first.posting_list] != [t.word for t in second.posting_list]:
+        return False
+    return all(t1.docs == t2.docs for t1, t2 in zip(first.posting_list, second.posting_list))
+
+
+def main():
+    print(f"{'docs':>6} {'tokens':>8} {'vocab':>7} {'insert (s)':>11} {'bulk (s)':>9} {'speedup':>8}")
+    for size in SIZES:
+        documents = synthetic_corpus(size)
+        bulk_time, bulk_index = best_of(lambda: build(documents, bulk=True))
+        if size <= MAX_INSERT_SIZE:
+            insert_time, insert_index = best_of(lambda: build(documents, bulk=False), repeat=1)
+            assert same_index(insert_index, bulk_index), 'bulk build differs from the insert build'
+            insert_col, speedup_col = f'{insert_time:11.3f}', f'{insert_time / bulk_time:7.1f}x'
+        else:
+            insert_col, speedup_col = f"{'-':>11}", f"{'-':>8}"
+        n_tokens = sum(len(doc) for doc in documents)
+        print(f'{size:>6} {n_tokens:>8} {len(bulk_index.posting_list):>7} {insert_col} {bulk_time:9.3f} {speedup_col}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+query caches: throughput of search on a replayed query log where the queries follow a Zipf distribution, like real
+traffic, without caches, with the term and wildcard caches only, and with the result cache too, for a few cache sizes.
+the hit rate of every cache is printed, and the cached results are checked to be the same as the uncached ones.
+
+    python -m benchmarks.bench_cache
+"""
+import random
+import time
+
+from src.cache import LRUCache
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.common import misspell, synthetic_corpus, zipf_log
+
+SIZE = 5000
+N_DISTINCT = 1000
+N_QUERIES = 5000
+ZIPF_S = 1.1
+CACHE_SIZES = (128, 1024)
+
+
+def make_queries(index, rng, n_distinct=N_DISTINCT):
+    """
+    distinct queries of words, misspelled words, prefix wildcards and their AND / OR, from the 2000 most common words.
+    """
+    tokens = sorted(index.posting_list, key=lambda token: len(token.doc_ids))
+    # near is a word of the corpus, but it would be read as the NEAR operator
+    common = [token.word for token in tokens[-2000:] if token.word not in ('near', 'and', 'or', 'not')]
+    typos = misspell(common, n_distinct, max_edits=1, seed=1)
+    queries = set()
+    while len(queries) < n_distinct:
+        kind = rng.randrange(5)
+        if kind == 0:
+            queries.add(rng.choice(common))
+        elif kind == 1:
+            queries.add(rng.choice(typos))
+        elif kind == 2:
+            queries.add(rng.choice(common)[:3] + '*')
+        elif kind == 3:
+            queries.add(f'{rng.choice(common)} and {rng.choice(typos)}')
+        else:
+            queries.add(f'{rng.choice(common)[:3]}* or {rng.choice(common)}')
+    return sorted(queries)
+
+
+def replay(processor, log):
+    start = time.perf_counter()
+    results = [processor.search(query) for query in log]
+    return len(log) / (time.perf_counter() - start), results
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE), spell_backend='bktree')
+    index.create_posting_list()
+    rng = random.Random(0)
+    queries = make_queries(index, rng)
+    rng.shuffle(queries)
+    log = zipf_log(queries, N_QUERIES, ZIPF_S, rng)
+    print(f"{SIZE} documents, {len(index.posting_list)} words, {len(log)} queries, {len(set(log))} distinct, "
+          f"zipf s={ZIPF_S}")
+
+    processor = QueryProcessor(index)
+    processor.create_prefix_trie()
+    # the first run builds the BK-tree and the lexicon, which are not what is measured
+    replay(processor, queries)
+    throughput, expected = replay(processor, log)
+    print(f"\n{'caches':>20} {'size':>6} {'queries/s':>10} {'term hits':>10} {'wildcard hits':>14} {'result hits':>12}")
+    print(f"{'none':>20} {0:6} {throughput:10.0f}")
+    for size in CACHE_SIZES:
+        for with_results in (False, True):
+            cached = QueryProcessor(index, cache_size=size)
+            cached.prefix_trie = processor.prefix_trie
+            cached.indexed_words = processor.indexed_words
+            if not with_results:
+                cached.result_cache = LRUCache(0)
+            throughput, results = replay(cached, log)
+            assert results == expected
+            stats = cached.cache_stats()
+            name = 'all' if with_results else 'term + wildcard'
+            result_hits = f"{stats['result']['hit_rate']:12.1%}" if with_results else f"{'-':>12}"
+            print(f"{name:>20} {size:6} {throughput:10.0f} {stats['term']['hit_rate']:10.1%} "
+                  f"{stats['wildcard']['hit_rate']:14.1%} {result_hits}")
+
+    # every change of the index empties the caches, so they only help between the changes
+    cached = QueryProcessor(index, cache_size=CACHE_SIZES[-1])
+    cached.prefix_trie = processor.prefix_trie
+    cached.indexed_words = processor.indexed_words
+    start = time.perf_counter()
+    for i, query in enumerate(log):
+        if i % 1000 == 0:
+            index.version += 1
+        assert cached.search(query) == expected[i]
+    print(f"\nindex changes every 1000 queries: {len(log) / (time.perf_counter() - start):.0f} queries/s, "
+          f"result hits {cached.result_cache.stats()['hit_rate']:.1%}")
+
+
+if __name__ == '__main__':
+    main()
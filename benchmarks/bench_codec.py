@@ -0,0 +1,84 @@
+"""
+compressed postings: bytes per posting and per position of the int32 arrays of Token against the variable-byte blocks
+of src.codec, the decode throughput of whole lists, and the latency of AND and NEAR queries, which decode only the
+blocks they touch. the compressed index is checked to give the same results.
+
+    python -m benchmarks.bench_codec
+"""
+import random
+import time
+
+from src.codec import CompressedToken
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.common import synthetic_corpus
+
+SIZE = 20000
+N_QUERIES = 200
+
+
+def make_queries(index, rng):
+    # near is a word of the corpus, but it would be read as the NEAR operator
+    tokens = [token for token in index.posting_list if token.word != 'near']
+    tokens.sort(key=lambda token: len(token.doc_ids))
+    rare = [token.word for token in tokens[-2000:-500]]
+    common = [token.word for token in tokens[-50:]]
+    queries = []
+    for _ in range(N_QUERIES // 2):
+        queries.append(f'{rng.choice(rare)} and {rng.choice(common)}')
+        queries.append(f'{rng.choice(rare)} NEAR/5 {rng.choice(common)}')
+    return queries
+
+
+def query_time(processor, queries, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for query in queries:
+            processor.search(query)
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries) * 1000
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE))
+    index.create_posting_list()
+    compressed = [CompressedToken.from_token(token) for token in index.posting_list]
+    n_postings = sum(len(token.doc_ids) for token in index.posting_list)
+    n_positions = sum(len(token.positions) for token in index.posting_list)
+    doc_bytes = sum(len(token.record) for token in compressed)
+    pos_bytes = sum(len(token.pos_record) for token in compressed)
+    print(f"{SIZE} documents, {len(compressed)} words, {n_postings} postings, {n_positions} positions")
+    print(f"{'layout':>12} {'bytes/posting':>14} {'bytes/position':>15} {'total (MB)':>11}")
+    raw = 4 * n_postings + 4 * (n_postings + len(compressed)) + 4 * n_positions
+    print(f"{'int32':>12} {4 * (2 * n_postings + len(compressed)) / n_postings:14.2f} {4.0:15.2f} {raw / 2 ** 20:11.2f}")
+    print(f"{'vbyte':>12} {doc_bytes / n_postings:14.2f} {pos_bytes / n_positions:15.2f} "
+          f"{(doc_bytes + pos_bytes) / 2 ** 20:11.2f}")
+
+    start = time.perf_counter()
+    for token in index.posting_list:
+        list(token.doc_ids), list(token.offsets), list(token.positions)
+    raw_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for token in compressed:
+        token.arrays()
+    decode_time = time.perf_counter() - start
+    n_integers = 2 * n_postings + len(compressed) + n_positions
+    print(f"\n{'decode':>12} {'M integers/s':>14}")
+    print(f"{'int32':>12} {n_integers / raw_time / 1e6:14.1f}")
+    print(f"{'vbyte':>12} {n_integers / decode_time / 1e6:14.1f}")
+
+    processor = QueryProcessor(index)
+    processor.create_prefix_trie()
+    queries = make_queries(index, random.Random(0))
+    expected = [processor.search(query) for query in queries]
+    raw_latency = query_time(processor, queries)
+    index.posting_list = compressed
+    assert [processor.search(query) for query in queries] == expected
+    print(f"\n{'query':>12} {'ms':>8}")
+    print(f"{'int32':>12} {raw_latency:8.2f}")
+    print(f"{'vbyte':>12} {query_time(processor, queries):8.2f}")
+
+
+if __name__ == '__main__':
+    main()
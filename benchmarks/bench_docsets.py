@@ -0,0 +1,91 @@
+"""
+document sets: the time of boolean queries that mix dense and sparse words on a corpus of a million documents, with the
+sorted lists of evaluate and with the NumPy DocSet of evaluate_docset (doc_sets='numpy'), and the memory of their
+results. building a million documents from text takes long, so the posting lists are made directly, with every word in
+a random fraction of the documents. the results of both are checked to be the same.
+
+    python -m benchmarks.bench_docsets
+"""
+import random
+import sys
+import time
+from array import array
+
+from src.indexing import InvertedIndex, Token
+from src.query_parser import parse_query
+from src.querying import QueryProcessor
+
+N_DOCS = 1000000
+# word: fraction of the documents that have it
+DENSITIES = {'dense50': 0.5, 'dense20': 0.2, 'dense05': 0.05, 'mid01': 0.01, 'rare001': 0.0001, 'rare0001': 0.00001}
+QUERIES = [
+    'dense50 and dense20',
+    'dense50 or dense20',
+    'not dense50',
+    'dense50 and not dense20',
+    'rare001 and dense50',
+    'rare001 or rare0001',
+    'mid01 and dense05',
+    '(dense50 or dense05) and not mid01',
+    'dense20 and dense05 and dense50',
+    'not (dense20 or rare001)',
+]
+
+
+def make_index(rng):
+    tokens = []
+    for word, density in sorted(DENSITIES.items()):
+        doc_ids = array('i', sorted(rng.sample(range(N_DOCS), int(N_DOCS * density))))
+        # one position in every document, the queries do not read them
+        offsets, positions = array('i', range(len(doc_ids) + 1)), array('i', [0]) * len(doc_ids)
+        tokens.append(Token.from_arrays(word, doc_ids, offsets, positions))
+    index = InvertedIndex(None)
+    index.posting_list = tokens
+    index._num_docs = N_DOCS
+    return index
+
+
+def best_time(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def set_size(doc_ids):
+    # a set of ints, with the ints, the ones below 257 are shared by python
+    return sys.getsizeof(doc_ids) + sum(sys.getsizeof(doc_idx) for doc_idx in doc_ids if doc_idx > 256)
+
+
+def main():
+    index = make_index(random.Random(0))
+    lists = QueryProcessor(index)
+    docsets = QueryProcessor(index, doc_sets='numpy')
+    print(f"{N_DOCS} documents, words: " + ', '.join(f'{word} {density:g}' for word, density in DENSITIES.items()))
+    print(f"\n{'query':>36} {'docs':>8} {'list ms':>8} {'numpy ms':>9} {'speedup':>8} "
+          f"{'set MB':>7} {'docset MB':>10}")
+    total_list = total_numpy = 0
+    for query in QUERIES:
+        node = parse_query(query)
+        list_time, expected = best_time(lambda: list(lists.evaluate(node, {})))
+        numpy_time, doc_set = best_time(lambda: docsets.evaluate_docset(node, {}))
+        assert doc_set.to_list() == expected, query
+        total_list += list_time
+        total_numpy += numpy_time
+        doc_set_bytes = (doc_set.bits if doc_set.is_dense() else doc_set.ids).nbytes
+        print(f"{query:>36} {len(expected):8} {list_time:8.2f} {numpy_time:9.2f} {list_time / numpy_time:8.1f} "
+              f"{set_size(set(expected)) / 2 ** 20:7.1f} {doc_set_bytes / 2 ** 20:10.2f}")
+    print(f"{'total':>36} {'':8} {total_list:8.2f} {total_numpy:9.2f} {total_list / total_numpy:8.1f}")
+
+    # search returns a python set, so the doc ids are turned into ints at the end of both
+    query = 'dense50 and not dense20'
+    list_time, expected = best_time(lambda: lists.search(query))
+    numpy_time, result = best_time(lambda: docsets.search(query))
+    assert result == expected
+    print(f"\nsearch('{query}'), with the set of the result: list {list_time:.1f} ms, numpy {numpy_time:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+times edit_distance and bounded_edit_distance against a plain Levenshtein matrix on pairs of vocabulary words. their
+results are checked against the matrix by tests/test_edit_distance.py.
+
+    python -m benchmarks.bench_edit_distance
+"""
+import random
+import time
+
+from src.utils import bounded_edit_distance, edit_distance
+from benchmarks.common import misspell, synthetic_corpus
+
+N_PAIRS = 20000
+
+
+def reference_distance(word1, word2):
+    """
+    textbook Levenshtein distance with a full (len(word1) + 1) x (len(word2) + 1) matrix.
+    """
+    dp = [[0] * (len(word2) + 1) for _ in range(len(word1) + 1)]
+    for i in range(len(word1) + 1):
+        dp[i][0] = i
+    for j in range(len(word2) + 1):
+        dp[0][j] = j
+    for i in range(1, len(word1) + 1):
+        for j in range(1, len(word2) + 1):
+            dp[i][j] = min(dp[i - 1][j - 1] + (word1[i - 1] != word2[j - 1]), dp[i - 1][j] + 1, dp[i][j - 1] + 1)
+    return dp[-1][-1]
+
+
+def timed(func, pairs):
+    start = time.perf_counter()
+    for word1, word2 in pairs:
+        func(word1, word2)
+    return (time.perf_counter() - start) / len(pairs) * 1e6
+
+
+def main():
+    words = sorted({word for doc in synthetic_corpus(200) for word in doc})
+    rng = random.Random(0)
+    pairs = list(zip(misspell(words, N_PAIRS), (rng.choice(words) for _ in range(N_PAIRS))))
+    print(f"{'kernel':>24} {'us/pair':>8}")
+    print(f"{'matrix':>24} {timed(reference_distance, pairs):8.2f}")
+    print(f"{'bit-parallel':>24} {timed(edit_distance, pairs):8.2f}")
+    for max_distance in (1, 2, 3):
+        elapsed = timed(lambda word1, word2: bounded_edit_distance(word1, word2, max_distance), pairs)
+        print(f"{f'bounded, max {max_distance}':>24} {elapsed:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+peak memory of building an index from a folder of text files, for corpora of growing size: read_documents +
+preprocess_documents + create_posting_list, which hold the raw text, the tokens and the index at the same time,
+against the streaming ingestion of src.ingest with a fixed memory budget. every build runs in a new process, so its peak
+RSS is its own.
+
+    python -m benchmarks.bench_ingest
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import synthetic_corpus
+
+SIZES = (2000, 8000, 32000)
+MEMORY_BUDGET = 16 * 1024 * 1024
+
+
+def write_corpus(folder, n_docs):
+    for doc_idx, document in enumerate(synthetic_corpus(n_docs, seed=n_docs)):
+        with open(os.path.join(folder, f'{doc_idx:06d}.txt'), 'w', encoding='utf-8') as file:
+            file.write(' '.join(document))
+
+
+def child(mode, folder, out):
+    from src.indexing import InvertedIndex
+    from src.ingest import ingest
+    from src.preprocessing import iter_documents, preprocess_documents, read_documents
+
+    start = time.perf_counter()
+    if mode == 'memory':
+        index = InvertedIndex(preprocess_documents(list(read_documents(folder).values())))
+        index.create_posting_list()
+    else:
+        index = ingest(iter_documents(folder), out, memory_budget=MEMORY_BUDGET)
+    elapsed = time.perf_counter() - start
+    print(f'{len(index.posting_list)} {elapsed:.2f} {peak_rss():.0f}')
+
+
+def peak_rss():
+    """
+    peak RSS of this process in MB. ru_maxrss is kept across fork and exec on Linux, so it can be the peak of the
+    benchmark process itself. VmHWM is reset by exec, so it is used when /proc is there.
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode, folder, out):
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.bench_ingest', mode, folder, out], check=True,
+                            capture_output=True, text=True).stdout.split()
+    return int(output[0]), float(output[1]), float(output[2])
+
+
+def main():
+    print(f"memory budget of the streaming ingestion: {MEMORY_BUDGET // 2 ** 20} MB")
+    print(f"{'documents':>10} {'words':>8} {'in memory (s)':>14} {'peak (MB)':>10} {'streaming (s)':>14} {'peak (MB)':>10}")
+    for n_docs in SIZES:
+        folder = tempfile.mkdtemp()
+        out = tempfile.mkdtemp()
+        try:
+            write_corpus(folder, n_docs)
+            words, memory_time, memory_peak = run('memory', folder, out)
+            streamed_words, stream_time, stream_peak = run('stream', folder, out)
+            assert words == streamed_words
+            print(f'{n_docs:>10} {words:>8} {memory_time:14.2f} {memory_peak:10.0f} {stream_time:14.2f} '
+                  f'{stream_peak:10.0f}')
+        finally:
+            shutil.rmtree(folder)
+            shutil.rmtree(out)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4:
+        child(*sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,56 @@
+"""
+memory and wildcard latency of the bigram index against the two permuterm backends.
+
+    python -m benchmarks.bench_kgram
+"""
+import time
+import tracemalloc
+
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.common import synthetic_corpus
+
+SIZE = 1600
+BACKENDS = ('trie', 'array', 'kgram')
+PATTERNS = ['s*', '*ing', 'pr*e', '*a*e*', 'c?t*', 're*tion*', '*inter*tion*al', 'ga*l?ne', '*ou*']
+REPEAT = 5
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE))
+    index.create_posting_list()
+    index.vocabulary()
+    processors = {}
+    print(f"vocabulary: {len(index.posting_list)} words")
+    print(f"{'backend':>8} {'build (s)':>10} {'memory (MB)':>12}")
+    for backend in BACKENDS:
+        processor = QueryProcessor(index, wildcard_backend=backend)
+        tracemalloc.start()
+        start = time.perf_counter()
+        processor.create_prefix_trie()
+        build_time = time.perf_counter() - start
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        processors[backend] = processor
+        print(f'{backend:>8} {build_time:10.2f} {memory / 2 ** 20:12.1f}')
+
+    print()
+    print(f"{'pattern':>16} {'matches':>8}" + ''.join(f' {backend + " (ms)":>11}' for backend in BACKENDS))
+    for pattern in PATTERNS:
+        row, results = [], {}
+        for backend in BACKENDS:
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                results[backend] = sorted(processors[backend].wildcard_query(pattern))
+            row.append((time.perf_counter() - start) / REPEAT * 1000)
+        assert results['trie'] == results['array'] == results['kgram'], pattern
+        print(f"{pattern:>16} {len(results['kgram']):>8}" + ''.join(f' {elapsed:11.2f}' for elapsed in row))
+
+    # without create_prefix_trie, the bigram index is built by the index when a wildcard needs it
+    lazy = QueryProcessor(index, wildcard_backend='kgram')
+    for pattern in PATTERNS:
+        assert sorted(lazy.wildcard_query(pattern)) == sorted(processors['trie'].wildcard_query(pattern)), pattern
+
+
+if __name__ == '__main__':
+    main()
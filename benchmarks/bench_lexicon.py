@@ -0,0 +1,84 @@
+"""
+term dictionary: memory of the vocabulary as a list of strings, as the lexicon of the version 1 format (an int64 offset
+and the utf-8 bytes of every term) and front coded in blocks, and the time to find the term id of a word, with the
+binary search over posting_list that get_token_index used to do and with the front-coded lexicon, for an index in
+memory and a mapped one.
+
+    python -m benchmarks.bench_lexicon
+"""
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from src.indexing import InvertedIndex
+from src.lexicon import FrontCodedLexicon
+from benchmarks.common import synthetic_corpus
+
+SIZE = 20000
+N_LOOKUPS = 20000
+BLOCK_SIZES = (4, 8, 16, 32, 64)
+
+
+def binary_search(posting_list, x):
+    """
+    the get_token_index of before, which compares the words of tokens of posting_list.
+    """
+    low, high = 0, len(posting_list) - 1
+    while low <= high:
+        mid = (high + low) // 2
+        word = posting_list[mid].word
+        if word < x:
+            low = mid + 1
+        elif word > x:
+            high = mid - 1
+        else:
+            return mid
+    return -1
+
+
+def lookup_time(function, queries):
+    start = time.perf_counter()
+    for query in queries:
+        function(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE))
+    index.create_posting_list()
+    words = index.vocabulary()
+    rng = random.Random(0)
+    # half of the lookups are words of the vocabulary, the other half are not
+    queries = [rng.choice(words) if i % 2 else rng.choice(words) + 'q' for i in range(N_LOOKUPS)]
+
+    encoded = sum(len(word.encode('utf-8')) for word in words)
+    print(f"{len(words)} words, {encoded / 2 ** 20:.2f} MB of utf-8")
+    print(f"{'vocabulary':>22} {'MB':>7}")
+    print(f"{'list of str':>22} {(sys.getsizeof(words) + sum(map(sys.getsizeof, words))) / 2 ** 20:7.2f}")
+    print(f"{'offsets + bytes':>22} {(encoded + 8 * (len(words) + 1)) / 2 ** 20:7.2f}")
+    for block_size in BLOCK_SIZES:
+        lexicon = FrontCodedLexicon(words, block_size=block_size)
+        size = len(lexicon.blob) + 8 * len(lexicon.block_offsets)
+        print(f"{f'front coded, {block_size}':>22} {size / 2 ** 20:7.2f}")
+
+    path = tempfile.mkdtemp()
+    try:
+        index.save(path)
+        loaded = InvertedIndex.load(path)
+        for query in queries:
+            expected = binary_search(index.posting_list, query)
+            assert index.get_token_index(query) == expected == loaded.get_token_index(query)
+        print(f"\n{'lookup (us)':>22} {'in memory':>10} {'mapped':>10}")
+        print(f"{'binary search':>22} {lookup_time(lambda x: binary_search(index.posting_list, x), queries):10.2f} "
+              f"{lookup_time(lambda x: binary_search(loaded.posting_list, x), queries):10.2f}")
+        print(f"{'front-coded lexicon':>22} {lookup_time(index.get_token_index, queries):10.2f} "
+              f"{lookup_time(loaded.get_token_index, queries):10.2f}")
+        del loaded
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
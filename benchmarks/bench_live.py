@@ -0,0 +1,167 @@
+"""
+live index: documents are added one by one and some are deleted while the index is searched, against building the whole
+index again to take the changes in. every few thousand documents, the live index is checked to give the same results as
+a static index of the same documents, with the deleted ones empty, and the query latency is measured with and without
+merging the segments. at the end, documents are deleted while the merger thread of start_merger merges the segments,
+and the merger is checked to still run and the results (of search_many too) to be right, and the postings of a word are
+read while documents with it are added, which should always give consistent arrays.
+
+    python -m benchmarks.bench_live
+"""
+import random
+import sys
+import threading
+import time
+
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from src.segments import LiveIndex
+from benchmarks.common import synthetic_corpus
+
+SIZE = 20000
+CHECKPOINT = 5000
+SEGMENT_SIZE = 500
+DELETE_RATE = 0.1
+N_QUERIES = 50
+# documents and segment size of the check of the merger thread, small segments so it merges all the time
+MERGER_DOCS = 4000
+MERGER_SEGMENT_SIZE = 20
+
+
+def make_queries(index, rng):
+    words = [token.word for token in index.posting_list if len(token.word) > 3 and len(token.doc_ids) > 1]
+    queries = []
+    for _ in range(N_QUERIES):
+        first, second, third = rng.sample(words, 3)
+        queries.append(rng.choice((f'{first} or {second}', f'{first} and not {second}', f'not {first}',
+                                   f'{first[:2]}* and {second}', f'({first} or {second}) and not {third}',
+                                   f'"{first} {second}" or {third}')))
+    return queries
+
+
+def check(live_processor, static_processor, queries, deleted):
+    # the deleted documents are empty in the static index, but NOT would still return them
+    for query in queries:
+        assert live_processor.search(query) == static_processor.search(query) - deleted, query
+
+
+def check_merger(documents, rng):
+    """
+    add and delete documents while the merger thread runs. delete changes the deleted documents under the lock while
+    the merger counts the live documents of the segments, which should not make the merger fail.
+    """
+    live = LiveIndex(segment_size=MERGER_SEGMENT_SIZE)
+    # switch threads often, so the deletes run in the middle of what the merger does
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    live.start_merger(interval=0.001)
+    try:
+        for doc in documents[:MERGER_DOCS]:
+            live.add(doc)
+        for doc_idx in rng.sample(range(MERGER_DOCS), MERGER_DOCS // 2):
+            live.add(documents[live.num_docs % len(documents)])
+            live.delete(doc_idx)
+        assert live._merger.is_alive(), 'the merger thread stopped'
+        # search_many does not fork while the merger runs, a forked worker could inherit the lock held by the merger
+        processor = QueryProcessor(live, wildcard_backend='array')
+        processor.create_prefix_trie()
+        queries = make_queries(live, rng)
+        assert processor.search_many(queries, workers=2) == [processor.search(query) for query in queries]
+    finally:
+        live.stop_merger()
+        sys.setswitchinterval(switch_interval)
+    live.merge_segments(force=True)
+    static = InvertedIndex(list(live.documents))
+    static.create_posting_list()
+    live_processor, static_processor = QueryProcessor(live, wildcard_backend='array'), QueryProcessor(static)
+    live_processor.create_prefix_trie()
+    static_processor.create_prefix_trie()
+    check(live_processor, static_processor, make_queries(static, rng), live.deleted)
+    print(f"merger: {live.num_docs} documents, {len(live.deleted)} deleted while merging, {len(live.segments)} segment")
+
+
+def check_concurrent_reads(documents):
+    """
+    read the postings of a common word in the main thread while another thread adds documents that have it. a token of
+    the in-memory segment changes with every document, so readers should get a copy whose arrays agree.
+    """
+    # one segment, so the postings of the word are the token of the in-memory segment
+    live = LiveIndex(segment_size=MERGER_DOCS)
+    for doc in documents[:10]:
+        live.add(doc)
+    word = max(live.memory.tokens.values(), key=len).word
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    writer = threading.Thread(target=lambda: [live.add(doc + [word]) for doc in documents[10:MERGER_DOCS]])
+    # a query holds on to the token it got, like term_cache does, while the writer keeps adding documents
+    token = live.merged_token(word)
+    writer.start()
+    reads = 0
+    try:
+        while writer.is_alive():
+            assert len(token.offsets) == len(token.doc_ids) + 1
+            assert token.offsets[-1] == len(token.positions)
+            token.doc_positions(len(token.doc_ids) - 1)
+            reads += 1
+            if reads % 1000 == 0:
+                token = live.merged_token(word)
+    finally:
+        writer.join()
+        sys.setswitchinterval(switch_interval)
+    print(f"concurrent reads: {reads} reads of {word!r} while {MERGER_DOCS - 10} documents were added")
+
+
+def query_time(processor, queries):
+    # the postings merged by earlier queries are dropped, so the queries read the segments
+    processor.indexing_model.merged = {}
+    start = time.perf_counter()
+    for query in queries:
+        processor.search(query)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    documents = synthetic_corpus(SIZE)
+    rng = random.Random(0)
+    live = LiveIndex(segment_size=SEGMENT_SIZE)
+    live_processor = QueryProcessor(live, wildcard_backend='array')
+    add_time = 0
+    print(f"{SIZE} documents, segments of {SEGMENT_SIZE}, {DELETE_RATE:.0%} deleted")
+    print(f"{'documents':>10} {'add (docs/s)':>13} {'rebuild (s)':>12} {'segments':>9} {'query (ms)':>11} "
+          f"{'merged':>7} {'query (ms)':>11}")
+    for doc in documents:
+        start = time.perf_counter()
+        live.add(doc)
+        if rng.random() < DELETE_RATE:
+            doc_idx = rng.randrange(live.num_docs)
+            if doc_idx not in live.deleted:
+                live.delete(doc_idx)
+        add_time += time.perf_counter() - start
+        if live.num_docs == SIZE // 20:
+            live_processor.create_prefix_trie()
+        if live.num_docs % CHECKPOINT:
+            continue
+
+        # what the live index saves: building the index of all documents again
+        start = time.perf_counter()
+        static = InvertedIndex(list(live.documents))
+        static.create_posting_list()
+        rebuild_time = time.perf_counter() - start
+        static_processor = QueryProcessor(static, wildcard_backend='array')
+        static_processor.create_prefix_trie()
+
+        queries = make_queries(static, rng)
+        check(live_processor, static_processor, queries, live.deleted)
+        segments = len(live.segments)
+        unmerged = query_time(live_processor, queries)
+        live.merge_segments()
+        merged = query_time(live_processor, queries)
+        check(live_processor, static_processor, queries, live.deleted)
+        print(f'{live.num_docs:>10} {live.num_docs / add_time:13.0f} {rebuild_time:12.2f} '
+              f'{segments:>9} {unmerged:11.2f} {len(live.segments):>7} {merged:11.2f}')
+    check_merger(documents, rng)
+    check_concurrent_reads(documents)
+
+
+if __name__ == '__main__':
+    main()
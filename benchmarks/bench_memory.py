@@ -0,0 +1,60 @@
+"""
+memory of the index with the old per-document dictionaries against the array-backed Token, on the sample corpus
+scaled up synthetically.
+
+    python -m benchmarks.bench_memory
+"""
+import tracemalloc
+
+from src.indexing import InvertedIndex
+from benchmarks.common import synthetic_corpus
+
+SIZES = [200, 800, 3200]
+
+
+class DictToken:
+    """
+    the old Token layout: a plain object with a list of {'doc_idx': ..., 'indexes': [...]} dictionaries.
+    """
+
+    def __init__(self, word, docs):
+        self.word = word
+        self.docs = docs
+
+
+def traced(func):
+    """
+    return the result of func and the number of bytes it allocated and kept alive.
+    """
+    tracemalloc.start()
+    result = func()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    print(f"{'docs':>6} {'text (KB)':>10} {'dicts (KB)':>11} {'arrays (KB)':>12} {'ratio':>6} {'B/posting old':>14} "
+          f"{'B/posting new':>14}")
+    for size in SIZES:
+        documents = synthetic_corpus(size)
+        text_size = sum(len(word) + 1 for doc in documents for word in doc)
+        n_postings = sum(len(doc) for doc in documents)
+
+        def build_arrays():
+            index = InvertedIndex(documents)
+            index.create_posting_list()
+            return index.posting_list
+
+        posting_list, arrays_size = traced(build_arrays)
+        # the old layout is copied out of the new one, so both hold the same postings
+        old_docs = [(token.word, token.docs) for token in posting_list]
+        _, dicts_size = traced(lambda: [DictToken(word, docs) for word, docs in
+                                        [(word, [{'doc_idx': d['doc_idx'], 'indexes': list(d['indexes'])}
+                                                 for d in docs]) for word, docs in old_docs]])
+        print(f'{size:>6} {text_size / 1024:10.0f} {dicts_size / 1024:11.0f} {arrays_size / 1024:12.0f} '
+              f'{dicts_size / arrays_size:5.1f}x {dicts_size / n_postings:14.1f} {arrays_size / n_postings:14.1f}')
+
+
+if __name__ == '__main__':
+    main()
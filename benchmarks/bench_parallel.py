@@ -0,0 +1,48 @@
+"""
+parallel build: preprocessing and indexing with 1, 2, 4, 8 and 16 processes against the serial build. every parallel
+index is checked to be identical to the serial one. the speedup can not be larger than the number of cores.
+
+    python -m benchmarks.bench_parallel
+"""
+import os
+import time
+
+from src.build import build_index
+from src.indexing import InvertedIndex
+from src.preprocessing import preprocess_documents
+from benchmarks.common import synthetic_corpus
+
+SIZE = 8000
+WORKERS = (1, 2, 4, 8, 16)
+
+
+def same_index(first, second):
+    if first.documents != second.documents or len(first.posting_list) != len(second.posting_list):
+        return False
+    return all(a.word == b.word and a.doc_ids == b.doc_ids and a.offsets == b.offsets and a.positions == b.positions
+               for a, b in zip(first.posting_list, second.posting_list))
+
+
+def main():
+    raw_documents = [' '.join(document) for document in synthetic_corpus(SIZE)]
+    serial = InvertedIndex(preprocess_documents(raw_documents))
+    serial.create_posting_list()
+    # timed again, so that it runs with the same objects in memory as the parallel builds
+    start = time.perf_counter()
+    index = InvertedIndex(preprocess_documents(raw_documents))
+    index.create_posting_list()
+    serial_time = time.perf_counter() - start
+    del index
+    print(f"{SIZE} documents, {len(serial.posting_list)} words, {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'time (s)':>9} {'speedup':>8}")
+    print(f"{'serial':>8} {serial_time:9.2f} {1.0:7.2f}x")
+    for workers in WORKERS:
+        start = time.perf_counter()
+        index = build_index(raw_documents, workers=workers)
+        elapsed = time.perf_counter() - start
+        assert same_index(index, serial), workers
+        print(f'{workers:>8} {elapsed:9.2f} {serial_time / elapsed:7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+build time, memory and query latency of the permuterm Trie against the sorted array PermutermIndex.
+
+    python -m benchmarks.bench_permuterm
+"""
+import time
+import tracemalloc
+
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.common import synthetic_corpus
+
+SIZES = [400, 1600, 6400]
+# permuterm keys of the wildcard queries a*, *ing, pr*e, *ou*, ga*ine
+QUERIES = ['$a', 'ing$', 'e$pr', 'ou', 'ine$ga']
+REPEAT = 20
+
+
+def build(index, backend):
+    processor = QueryProcessor(index, wildcard_backend=backend)
+    tracemalloc.start()
+    start = time.perf_counter()
+    processor.create_prefix_trie()
+    build_time = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return processor.prefix_trie, build_time, memory
+
+
+def main():
+    print(f"{'docs':>6} {'vocab':>7} {'backend':>8} {'build (s)':>10} {'memory (MB)':>12} {'query (ms)':>11}")
+    for size in SIZES:
+        index = InvertedIndex(synthetic_corpus(size))
+        index.create_posting_list()
+        results = {}
+        for backend in ('trie', 'array'):
+            permuterm, build_time, memory = build(index, backend)
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                results[backend] = [permuterm.query(query) for query in QUERIES]
+            query_time = (time.perf_counter() - start) / (REPEAT * len(QUERIES))
+            print(f'{size:>6} {len(index.posting_list):>7} {backend:>8} {build_time:10.2f} {memory / 2 ** 20:12.1f} '
+                  f'{query_time * 1000:11.3f}')
+            del permuterm
+        assert results['trie'] == results['array'], 'the backends returned different rotations'
+
+
+if __name__ == '__main__':
+    main()
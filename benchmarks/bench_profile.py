@@ -0,0 +1,86 @@
+"""
+profiling: the cost of a Profiler of src.profiling on queries that do not need a spell correction, which are the fastest
+ones and show its cost the most, before it is attached, while it is attached (profiling every query and one query out of
+10) and after it is detached. the results are checked to be the same. then it profiles a mix of queries with misspelled
+words and prints the time of every stage, the slowest trace and a part of the Prometheus export.
+
+    python -m benchmarks.bench_profile
+"""
+import random
+import time
+
+from src.indexing import InvertedIndex
+from src.profiling import Profiler
+from src.querying import QueryProcessor
+from benchmarks.bench_cache import make_queries
+from benchmarks.common import synthetic_corpus
+
+SIZE = 2000
+N_DISTINCT = 300
+REPEAT = 7
+
+
+def run(processor, queries):
+    """
+    return the best microseconds per query of REPEAT runs, and the results.
+    """
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        results = [processor.search(query) for query in queries]
+        best = min(best, time.perf_counter() - start)
+    return best / len(queries) * 1e6, results
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE), spell_backend='bktree')
+    index.create_posting_list()
+    processor = QueryProcessor(index)
+    processor.create_prefix_trie()
+    queries = make_queries(index, random.Random(0), N_DISTINCT)
+    # the queries with a typo have a word that is not in the index
+    cheap = [query for query in queries if all(index.get_token_index(word) != -1
+                                               for word in query.replace('*', '').split() if word not in ('and', 'or'))
+             and '*' not in query]
+    wildcards = [query for query in queries if '*' in query and ' and ' not in query]
+    print(f"{SIZE} documents, {len(index.posting_list)} words")
+    print(f"\n{'queries':>24} {'plain us':>9} {'attached us':>12} {'sampled 1/10 us':>16} {'detached us':>12}")
+    run(processor, cheap + wildcards)
+    for name, workload in (('words', cheap), ('wildcards', wildcards)):
+        plain_time, expected = run(processor, workload)
+        times = []
+        for sample in (1, 10):
+            profiler = Profiler(sample=sample).attach(processor)
+            attached_time, results = run(processor, workload)
+            assert results == expected
+            profiler.detach()
+            times.append(attached_time)
+        detached_time, results = run(processor, workload)
+        assert results == expected
+        print(f"{name + ' (' + str(len(workload)) + ')':>24} {plain_time:9.1f} "
+              + ' '.join(f"{time:{width - 8}.1f} ({time / plain_time - 1:+5.0%})"
+                         for time, width in zip(times, (12, 16)))
+              + f" {detached_time:12.1f}")
+
+    profiler = Profiler(max_traces=len(queries)).attach(processor)
+    start = time.perf_counter()
+    for query in queries:
+        processor.search(query)
+    elapsed = time.perf_counter() - start
+    print(f"\nall {len(queries)} queries: {elapsed * 1000:.0f} ms, by stage (self time):")
+    print(f"{'stage':>24} {'calls':>7} {'ms':>9} {'share':>7}")
+    for stage, histogram in sorted(profiler.stage_seconds.items(), key=lambda item: -item[1].sum):
+        print(f"{stage:>24} {histogram.count:7} {histogram.sum * 1000:9.1f} {histogram.sum / elapsed:7.1%}")
+    for (stage, item), histogram in sorted(profiler.stage_items.items()):
+        print(f"{stage + ' ' + item:>36}: mean {histogram.sum / histogram.count:9.1f}, "
+              f"p95 <= {histogram.quantile(0.95)}")
+
+    slowest = max(profiler.traces, key=lambda trace: trace.seconds)
+    print(f"\nslowest query:\n{slowest.report()}")
+    profiler.detach()
+    print('\n' + '\n'.join(line for line in profiler.to_prometheus().splitlines()
+                           if 'stage="spell_correction"' in line and '_bucket' not in line or line.startswith('#')))
+
+
+if __name__ == '__main__':
+    main()
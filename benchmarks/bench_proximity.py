@@ -0,0 +1,75 @@
+"""
+NEAR/k and phrase queries on long documents with many occurrences: the old near, which slices the text of the
+documents after every occurrence of both words, against the positional engine, which intersects the doc ids and merges
+the position lists. the results are checked against a scan of the documents.
+
+    python -m benchmarks.bench_proximity
+"""
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.common import best_of, synthetic_corpus
+
+N_DOCS = 200
+DOC_LEN = 5000
+DISTANCES = (1, 3, 10)
+
+
+def text_near(index, first_word, second_word, distance):
+    """
+    the old QueryProcessor.near, it reads the documents.
+    """
+    result = set()
+    for token in (index.get_token(first_word), index.get_token(second_word)):
+        for doc_idx, indexes in token.postings():
+            for idx in indexes:
+                if second_word in index.documents[doc_idx][idx + 1:idx + 1 + distance]:
+                    result.add(doc_idx)
+    return result
+
+
+def scan_near(documents, first_word, second_word, distance):
+    result = []
+    for doc_idx, words in enumerate(documents):
+        first = [i for i, word in enumerate(words) if word == first_word]
+        second = [i for i, word in enumerate(words) if word == second_word]
+        if any(0 < abs(i - j) <= distance for i in first for j in second):
+            result.append(doc_idx)
+    return result
+
+
+def scan_phrase(documents, words):
+    return [doc_idx for doc_idx, document in enumerate(documents)
+            if any(document[i:i + len(words)] == words for i in range(len(document)))]
+
+
+def main():
+    documents = synthetic_corpus(N_DOCS, doc_len=DOC_LEN)
+    index = InvertedIndex(documents)
+    index.create_posting_list()
+    processor = QueryProcessor(index)
+    by_frequency = sorted(index.posting_list, key=lambda token: -len(token.positions))
+    common, middle, rare = by_frequency[0], by_frequency[30], by_frequency[300]
+    pairs = [(common, by_frequency[1]), (common, middle), (middle, rare), (common, rare)]
+    print(f"{N_DOCS} documents of {DOC_LEN} words")
+    print(f"{'words (occurrences)':>34} {'k':>3} {'docs':>5} {'text (ms)':>10} {'positional (ms)':>16}")
+    for first, second in pairs:
+        for distance in DISTANCES:
+            old_time, _ = best_of(lambda: text_near(index, first.word, second.word, distance), repeat=1)
+            new_time, result = best_of(lambda: processor.near(first.word, second.word, distance))
+            assert result == scan_near(documents, first.word, second.word, distance)
+            label = f'{first.word}({len(first.positions)}) {second.word}({len(second.positions)})'
+            print(f'{label:>34} {distance:>3} {len(result):>5} {old_time * 1000:10.1f} {new_time * 1000:16.2f}')
+
+    print()
+    print(f"{'phrase':>34} {'docs':>5} {'positional (ms)':>16}")
+    for start in (0, 1000, 2500):
+        for length in (2, 3):
+            words = documents[7][start:start + length]
+            words = [word for word in words if word not in index.stop_words]
+            new_time, result = best_of(lambda: processor.phrase(words))
+            assert result == scan_phrase(documents, words)
+            print(f'{" ".join(words):>34} {len(result):>5} {new_time * 1000:16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+ranked search: top k by BM25 with MaxScore pruning against scoring every posting of the query words. the two must give
+the same documents with the same scores.
+
+    python -m benchmarks.bench_ranking
+"""
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.common import best_of, synthetic_corpus
+
+SIZE = 10000
+K = (10, 100)
+
+
+def same_ranking(first, second):
+    if len(first) != len(second):
+        return False
+    for (doc1, score1), (doc2, score2) in zip(first, second):
+        # summing the same scores in another order can change the last bits, and swap documents with equal scores
+        if abs(score1 - score2) > 1e-9 * max(1.0, score1):
+            return False
+        if doc1 != doc2 and sum(1 for _, score in first if abs(score - score1) <= 1e-9 * max(1.0, score1)) == 1:
+            return False
+    return True
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE))
+    index.create_posting_list()
+    processor = QueryProcessor(index)
+    processor.create_prefix_trie()
+    by_frequency = sorted(index.posting_list, key=lambda token: -len(token.doc_ids))
+    common = [token.word for token in by_frequency[:3]]
+    middle = [token.word for token in by_frequency[200:203]]
+    rare = [token.word for token in by_frequency[3000:3002]]
+    queries = [common[0], ' or '.join(common), ' or '.join(common + middle), ' or '.join(common + middle + rare),
+               ' or '.join(middle + rare), 'pr*', 're* or co*', f'({common[0]} or {middle[0]}) and {common[1]}']
+    index.get_bm25()
+    print(f"{SIZE} documents")
+    print(f"{'query':>60} {'k':>4} {'exhaustive (ms)':>16} {'maxscore (ms)':>14} {'speedup':>8}")
+    for query in queries:
+        for k in K:
+            full_time, expected = best_of(lambda: processor.ranked_search(query, k, exhaustive=True))
+            pruned_time, result = best_of(lambda: processor.ranked_search(query, k))
+            assert same_ranking(result, expected), query
+            label = query if len(query) <= 60 else query[:57] + '...'
+            print(f'{label:>60} {k:>4} {full_time * 1000:16.2f} {pruned_time * 1000:14.2f} '
+                  f'{full_time / pruned_time:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+load test of the query server of src.server on localhost. it builds an index of a synthetic corpus, starts the server
+in another process, and replays a Zipf query log (see bench_cache) with a number of concurrent keep-alive connections.
+it prints the throughput, the latency percentiles and the status codes for every concurrency, then overloads a server
+with small limits to show that it answers 503 and 504 instead of queueing without bound.
+
+    python -m benchmarks.bench_server
+    python -m benchmarks.bench_server --port 8000     # against a server that is already running
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import quote
+
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.bench_cache import make_queries
+from benchmarks.common import percentile, synthetic_corpus, zipf_log
+
+SIZE = 5000
+N_DISTINCT = 500
+N_REQUESTS = 500
+ZIPF_S = 1.1
+CONCURRENCY = (1, 8, 64)
+WORKERS = 2
+
+
+async def request(reader, writer, path):
+    """
+    send a GET on a keep-alive connection and return the status and the decoded body.
+    """
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def load(host, port, paths, concurrency):
+    """
+    send all paths with `concurrency` connections, each one sending its next request when it gets a response.
+    :return:
+        latencies in seconds, Counter of status codes, wall time in seconds
+    """
+    queue = list(reversed(paths))
+    latencies, statuses = [], Counter()
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while queue:
+                path = queue.pop()
+                start = time.perf_counter()
+                status, _ = await request(reader, writer, path)
+                latencies.append(time.perf_counter() - start)
+                statuses[status] += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def get(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return await request(reader, writer, path)
+    finally:
+        writer.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(path, port, *options):
+    server = subprocess.Popen([sys.executable, '-m', 'src.server', path, '--port', str(port), *options],
+                              stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # it prints its address when it listens
+    server.stdout.readline()
+    return server
+
+
+def report(name, latencies, statuses, elapsed):
+    print(f"{name:>22} {len(latencies) / elapsed:8.0f} {percentile(latencies, 50) * 1000:8.1f} "
+          f"{percentile(latencies, 95) * 1000:8.1f} {percentile(latencies, 99) * 1000:8.1f}  "
+          + ' '.join(f'{status}:{count}' for status, count in sorted(statuses.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help='port of a running server, if there is none one is started')
+    args = parser.parse_args()
+
+    index = InvertedIndex(synthetic_corpus(SIZE))
+    index.create_posting_list()
+    rng = random.Random(0)
+    queries = make_queries(index, rng, N_DISTINCT)
+    rng.shuffle(queries)
+    paths = ['/search?limit=10&q=' + quote(query) for query in zipf_log(queries, N_REQUESTS, ZIPF_S, rng)]
+
+    path = tempfile.mkdtemp()
+    servers = []
+    try:
+        port = args.port
+        if port is None:
+            index.save(path)
+            processor = QueryProcessor(index, wildcard_backend='array')
+            processor.create_prefix_trie()
+            processor.save_prefix_trie(path)
+            port = free_port()
+            servers.append(start_server(path, port, '--workers', str(WORKERS), '--spell-backend', 'bktree',
+                                        '--timeout', '30'))
+        # the first queries build the BK-tree and the BM25 lengths of the processes, which is not what is measured
+        asyncio.run(load(args.host, port, ['/search?q=' + quote(query) for query in queries[:50]], 8))
+        # invalid queries and limits are bad requests, not errors of the server
+        for bad in ('/search?q=' + quote('a and ('), '/search?limit=0&q=a', '/ranked?k=-1&q=a'):
+            assert asyncio.run(get(args.host, port, bad))[0] == 400, bad
+        print(f"{SIZE} documents, {len(paths)} requests, {len(set(paths))} distinct, {os.cpu_count()} cpus, "
+              f"{WORKERS} workers")
+        print(f"\n{'connections':>22} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+        for concurrency in CONCURRENCY:
+            report(str(concurrency), *asyncio.run(load(args.host, port, paths, concurrency)))
+        status, stats = asyncio.run(get(args.host, port, '/stats'))
+        print(f"server: {stats}")
+
+        if args.port is None:
+            # a server that runs 2 queries at a time, keeps 4 waiting and gives a query 50 ms
+            port = free_port()
+            servers.append(start_server(path, port, '--workers', str(WORKERS), '--spell-backend', 'bktree',
+                                        '--max-concurrency', '2', '--max-queue', '4', '--timeout', '0.05'))
+            report('overloaded, 64', *asyncio.run(load(args.host, port, paths, 64)))
+            status, stats = asyncio.run(get(args.host, port, '/stats'))
+            print(f"server: {stats}")
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
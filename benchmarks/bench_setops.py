@@ -0,0 +1,49 @@
+"""
+set operations on posting lists of skewed document frequencies: the old set based intersect and not_in against
+galloping intersection, merge union and the lazy complement on the sorted doc id arrays.
+
+    python -m benchmarks.bench_setops
+"""
+import random
+from array import array
+from itertools import islice
+
+from src.utils import complement, gallop_intersect, intersect_sorted, union_sorted
+from benchmarks.common import best_of
+
+N_DOCS = 500000
+PAIRS = [(10, 1000), (10, 100000), (10, 400000), (100, 100000), (1000, 100000), (1000, 400000), (100000, 100000),
+         (100000, 400000)]
+
+
+def postings(df, rng):
+    return array('i', sorted(rng.sample(range(N_DOCS), df)))
+
+
+def main():
+    rng = random.Random(7)
+    print(f"{'df pair':>16} {'result':>7} {'sets (ms)':>10} {'merge (ms)':>11} {'gallop (ms)':>12} {'union (ms)':>11}")
+    for rare_df, common_df in PAIRS:
+        rare, common = postings(rare_df, rng), postings(common_df, rng)
+        sets_time, expected = best_of(lambda: set(rare) & set(common))
+        merge_time, merged = best_of(lambda: intersect_sorted(rare, common))
+        gallop_time, galloped = best_of(lambda: gallop_intersect(rare, common))
+        union_time, union = best_of(lambda: union_sorted(rare, common))
+        assert merged == galloped == sorted(expected)
+        assert union == sorted(set(rare) | set(common))
+        print(f'{rare_df:>7}/{common_df:<8} {len(expected):>7} {sets_time * 1000:10.2f} {merge_time * 1000:11.2f} '
+              f'{gallop_time * 1000:12.3f} {union_time * 1000:11.2f}')
+
+    print()
+    print(f"{'not df':>8} {'sets (ms)':>10} {'first 10 (ms)':>14} {'all (ms)':>9}")
+    for df in (10, 100000, 400000):
+        docs = postings(df, rng)
+        sets_time, expected = best_of(lambda: set(range(N_DOCS)) - set(docs))
+        first_time, first = best_of(lambda: list(islice(complement(docs, N_DOCS), 10)))
+        all_time, everything = best_of(lambda: list(complement(docs, N_DOCS)))
+        assert everything == sorted(expected) and first == everything[:10]
+        print(f'{df:>8} {sets_time * 1000:10.2f} {first_time * 1000:14.3f} {all_time * 1000:9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+latency of spell_correction over misspelled queries, scanning the whole vocabulary against searching a BK-tree and
+the bigram index.
+
+    python -m benchmarks.bench_spelling
+"""
+import time
+
+from src.indexing import InvertedIndex
+from benchmarks.common import misspell, percentile, synthetic_corpus
+
+SIZES = [100, 400, 1600]
+N_QUERIES = 200
+
+
+def latencies(index, queries):
+    result, times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result.append(index.spell_correction(query))
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def main():
+    print(f"{'docs':>6} {'vocab':>7} {'backend':>8} {'build (s)':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'mean (ms)':>10}")
+    for size in SIZES:
+        documents = synthetic_corpus(size)
+        results = {}
+        for backend in ('linear', 'bktree', 'kgram'):
+            index = InvertedIndex(documents, spell_backend=backend)
+            index.create_posting_list()
+            queries = misspell(index.vocabulary(), N_QUERIES)
+            start = time.perf_counter()
+            if backend != 'linear':
+                index.spell_correction(queries[0])
+            build_time = time.perf_counter() - start
+            results[backend], times = latencies(index, queries)
+            print(f'{size:>6} {len(index.posting_list):>7} {backend:>8} {build_time:10.2f} '
+                  f'{percentile(times, 50) * 1000:9.2f} {percentile(times, 99) * 1000:9.2f} '
+                  f'{sum(times) / len(times) * 1000:10.2f}')
+        assert results['linear'] == results['bktree'] == results['kgram'], 'the backends returned different words'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+startup time of a worker that builds the index from scratch against one that maps a saved index.
+
+    python -m benchmarks.bench_storage
+"""
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.common import synthetic_corpus
+
+SIZES = [400, 1600, 6400]
+
+# runs in a fresh interpreter, so nothing is cached in the process
+LOAD_SCRIPT = """
+import time
+start = time.perf_counter()
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+index = InvertedIndex.load({path!r})
+processor = QueryProcessor(index)
+processor.load_prefix_trie({path!r})
+loaded = time.perf_counter()
+processor.search('gas* and price')
+print(loaded - start, time.perf_counter() - loaded)
+"""
+
+
+def main():
+    print(f"{'docs':>6} {'build (s)':>10} {'save (s)':>9} {'load (s)':>9} {'first query (ms)':>17}")
+    for size in SIZES:
+        documents = synthetic_corpus(size)
+        start = time.perf_counter()
+        index = InvertedIndex(documents)
+        index.create_posting_list()
+        processor = QueryProcessor(index)
+        processor.create_prefix_trie()
+        build_time = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as path:
+            start = time.perf_counter()
+            index.save(path)
+            processor.save_prefix_trie(path)
+            save_time = time.perf_counter() - start
+            output = subprocess.run([sys.executable, '-c', LOAD_SCRIPT.format(path=path)], capture_output=True,
+                                    text=True, check=True).stdout
+            load_time, query_time = map(float, output.split())
+        print(f'{size:>6} {build_time:10.2f} {save_time:9.2f} {load_time:9.3f} {query_time * 1000:17.2f}')
+
+
+if __name__ == '__main__':
+    main()
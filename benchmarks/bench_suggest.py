@@ -0,0 +1,56 @@
+"""
+latency of suggest over thousands of misspelled queries, against a latency objective for running it on every
+keystroke. the first SIZES index is also checked against ranking the whole vocabulary.
+
+    python -m benchmarks.bench_suggest
+"""
+import time
+
+from src.indexing import InvertedIndex
+from src.utils import edit_distance
+from benchmarks.common import misspell, percentile, synthetic_corpus
+
+SIZES = [400, 1600, 6400]
+N_QUERIES = 2000
+K = 5
+MAX_DISTANCE = 2
+SLO_P50_MS = 1.0
+SLO_P99_MS = 5.0
+
+
+def brute_force(index, word):
+    words = index.vocabulary()
+    candidates = []
+    for word_idx, other in enumerate(words):
+        dist = edit_distance(other, word)
+        if dist <= MAX_DISTANCE:
+            candidates.append((dist, -index.doc_freqs[word_idx], word_idx))
+    return [(words[word_idx], dist, -freq) for dist, freq, word_idx in sorted(candidates)[:K]]
+
+
+def main():
+    print(f"{'docs':>6} {'vocab':>7} {'build (s)':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'SLO':>5}")
+    for size_idx, size in enumerate(SIZES):
+        index = InvertedIndex(synthetic_corpus(size))
+        index.create_posting_list()
+        queries = misspell(index.vocabulary(), N_QUERIES)
+
+        start = time.perf_counter()
+        index.suggest(queries[0], K, MAX_DISTANCE)
+        build_time = time.perf_counter() - start
+
+        times = []
+        for query in queries:
+            start = time.perf_counter()
+            index.suggest(query, K, MAX_DISTANCE)
+            times.append(time.perf_counter() - start)
+        if size_idx == 0:
+            for query in queries[:100]:
+                assert index.suggest(query, K, MAX_DISTANCE) == brute_force(index, query), query
+        p50, p99 = percentile(times, 50) * 1000, percentile(times, 99) * 1000
+        verdict = 'ok' if p50 <= SLO_P50_MS and p99 <= SLO_P99_MS else 'miss'
+        print(f'{size:>6} {len(index.posting_list):>7} {build_time:10.2f} {p50:9.3f} {p99:9.3f} {verdict:>5}')
+
+
+if __name__ == '__main__':
+    main()
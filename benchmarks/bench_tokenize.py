@@ -0,0 +1,70 @@
+"""
+text normalization: tokens per second of preprocess_text with the regex tokenizer against NLTK word_tokenize, checked
+to give the same tokens on the sample corpus and on every contraction that NLTK splits, and the time to import the
+modules of src in a new process.
+
+    python -m benchmarks.bench_tokenize
+"""
+import re
+import subprocess
+import sys
+import time
+
+from nltk.tokenize.destructive import MacIntyreContractions
+
+from src.preprocessing import CONTRACTIONS, nltk_tokenize, preprocess_documents, preprocess_text, regex_tokenize
+from benchmarks.common import load_raw_documents
+
+REPEAT = 5
+# the sample corpus is small, so it is tokenized this many times for the timing
+SCALE = 50
+IMPORTS = ('src.preprocessing', 'src.indexing', 'src.querying', 'nltk')
+
+
+def tokens_per_second(documents, tokenizer):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        tokens = preprocess_documents(documents, tokenizer)
+        best = min(best, time.perf_counter() - start)
+    return sum(map(len, tokens)) / best
+
+
+def import_time(module):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    documents = load_raw_documents()
+    expected = preprocess_documents(documents, nltk_tokenize)
+    tokens = preprocess_documents(documents, regex_tokenize)
+    assert tokens == expected
+    # the contractions that are split, which the sample corpus may not have, are the same ones as in NLTK
+    patterns = MacIntyreContractions.CONTRACTIONS2 + MacIntyreContractions.CONTRACTIONS3
+    # the groups of a pattern like (?i)\b(gim)(?#X)(me)\b are the parts of the contraction
+    split = [tuple(re.findall(r"\((?!\?)([^)]+)\)", pattern)) for pattern in patterns]
+    assert {''.join(parts): parts for parts in split} == CONTRACTIONS
+    text = ('we ' + ' '.join(CONTRACTIONS) + ' cannotx gimmes ' +
+            ' '.join(word.replace("'", '') for word in CONTRACTIONS))
+    assert regex_tokenize(text) == nltk_tokenize(text), regex_tokenize(text)
+    assert preprocess_text(text) == preprocess_text(text, nltk_tokenize)
+    # every occurrence of a word is the same string
+    assert len({id(token) for doc in tokens for token in doc}) == len({token for doc in tokens for token in doc})
+
+    print(f"{len(documents)} documents, {sum(map(len, tokens))} tokens")
+    print(f"{'tokenizer':>10} {'tokens/s':>10}")
+    for name, tokenizer in (('nltk', nltk_tokenize), ('regex', regex_tokenize)):
+        print(f'{name:>10} {tokens_per_second(documents * SCALE, tokenizer):10.0f}')
+    baseline = import_time('sys')
+    print(f"\n{'import':>18} {'time (ms)':>10}")
+    for module in IMPORTS:
+        print(f'{module:>18} {(import_time(module) - baseline) * 1000:10.0f}')
+
+
+if __name__ == '__main__':
+    main()
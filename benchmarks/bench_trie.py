@@ -0,0 +1,61 @@
+"""
+broad prefix queries on the permuterm Trie: the old recursive traversal followed by sorted(), against the iterative
+traversal, for all results and for the first 10.
+
+    python -m benchmarks.bench_trie
+"""
+import time
+
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from benchmarks.common import synthetic_corpus
+
+SIZE = 1600
+# permuterm keys of a*, s*, *e and *
+QUERIES = ['$a', '$s', 'e$', '']
+LIMIT = 10
+
+
+def recursive_query(trie, x):
+    """
+    the traversal Trie.query used before: one recursive call and one string copy per node, then a full sort.
+    """
+    def dfs(node, prefix, result):
+        if node.is_end:
+            result.append(prefix + node.char)
+        for child in node.children.values():
+            dfs(child, prefix + node.char, result)
+
+    node = trie.root
+    for char in x:
+        if char not in node.children:
+            return []
+        node = node.children[char]
+    result = []
+    dfs(node, x[:-1], result)
+    return sorted(result)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE))
+    index.create_posting_list()
+    processor = QueryProcessor(index)
+    processor.create_prefix_trie()
+    trie = processor.prefix_trie
+    print(f"{'key':>5} {'matches':>8} {'recursive (ms)':>15} {'iterative (ms)':>15} {f'first {LIMIT} (ms)':>15}")
+    for query in QUERIES:
+        old_time, old = timed(lambda: recursive_query(trie, query))
+        new_time, new = timed(lambda: trie.query(query))
+        limit_time, first = timed(lambda: trie.query(query, limit=LIMIT))
+        assert old == new and first == new[:LIMIT], query
+        print(f'{query!r:>5} {len(new):>8} {old_time:15.2f} {new_time:15.2f} {limit_time:15.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+wildcard patterns of increasing selectivity: candidates read from the permuterm index, matches, and latency against
+matching the pattern on the whole vocabulary.
+
+    python -m benchmarks.bench_wildcard
+"""
+import time
+
+from src.indexing import InvertedIndex
+from src.querying import QueryProcessor
+from src.utils import wildcard_to_regex
+from benchmarks.common import synthetic_corpus
+
+SIZE = 1600
+PATTERNS = ['*', '*e*', 's*', '*ing', '*a*e*', 'pr*e', 'c?t*', 're*tion*', '*inter*tion*al', 'ga*l?ne']
+REPEAT = 5
+
+
+def timed(func):
+    best, result = float('inf'), None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    index = InvertedIndex(synthetic_corpus(SIZE))
+    index.create_posting_list()
+    words = index.vocabulary()
+    print(f"vocabulary: {len(words)} words")
+    print(f"{'pattern':>16} {'candidates':>11} {'matches':>8} {'scan (ms)':>10} {'trie (ms)':>10} {'array (ms)':>11}")
+    processors = {}
+    for backend in ('trie', 'array'):
+        processors[backend] = QueryProcessor(index, wildcard_backend=backend)
+        processors[backend].create_prefix_trie()
+    for pattern in PATTERNS:
+        matcher = wildcard_to_regex(pattern)
+        scan_time, expected = timed(lambda: [word for word in words if matcher.fullmatch(word)])
+        trie_time, trie_result = timed(lambda: processors['trie'].wildcard_query(pattern))
+        array_time, array_result = timed(lambda: processors['array'].wildcard_query(pattern))
+        assert sorted(trie_result) == sorted(array_result) == expected, pattern
+        stars = [i for i, char in enumerate(pattern) if char in '*?']
+        key = pattern[stars[-1] + 1:] + '$' + pattern[:stars[0]]
+        candidates = len(processors['array'].prefix_trie.query(key))
+        print(f'{pattern:>16} {candidates:>11} {len(expected):>8} {scan_time:10.2f} {trie_time:10.2f} '
+              f'{array_time:11.2f}')
+
+
+if __name__ == '__main__':
+    main()
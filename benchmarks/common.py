@@ -0,0 +1,114 @@
+import os
+import random
+import string
+import time
+
+from src.preprocessing import preprocess_documents
+
+RAW_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset', 'raw')
+
+
+def load_raw_documents(doc_folder=RAW_FOLDER):
+    """
+    read the sample corpus as a list of strings, sorted by file name. some of the files are not utf-8, so they are
+    decoded as cp1252 when utf-8 fails.
+    """
+    documents = []
+    for doc_file in sorted(os.listdir(doc_folder)):
+        if doc_file.endswith('.txt'):
+            with open(os.path.join(doc_folder, doc_file), 'rb') as file:
+                content = file.read()
+            try:
+                documents.append(content.decode('utf-8'))
+            except UnicodeDecodeError:
+                documents.append(content.decode('cp1252'))
+    return documents
+
+
+def load_corpus():
+    """
+    return the preprocessed sample corpus (list of lists of tokens).
+    """
+    return preprocess_documents(load_raw_documents())
+
+
+def synthetic_corpus(n_docs, doc_len=150, vocab_growth=0.1, seed=0):
+    """
+    scale the sample corpus up synthetically. every document is built by sampling tokens from the real corpus, and a
+    fraction of them get a random two letters suffix so that the vocabulary grows with the corpus like real text does.
+    :param n_docs:
+        number of documents to generate
+    :param doc_len:
+        number of tokens in each document
+    :param vocab_growth:
+        probability that a sampled token is turned into a new word
+    :param seed:
+        seed of the random generator, so runs are reproducible
+    :return:
+        list of lists of tokens
+    """
+    base = [token for doc in load_corpus() for token in doc]
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(n_docs):
+        doc = []
+        for _ in range(doc_len):
+            token = rng.choice(base)
+            if rng.random() < vocab_growth:
+                token += rng.choice(string.ascii_lowercase) + rng.choice(string.ascii_lowercase)
+            doc.append(token)
+        docs.append(doc)
+    return docs
+
+
+def misspell(words, n_queries, max_edits=2, seed=0):
+    """
+    make misspelled queries by applying 1 to max_edits random edits (insert, delete, replace, swap) to words sampled
+    from the vocabulary.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        word = rng.choice(words)
+        for _ in range(rng.randint(1, max_edits)):
+            i = rng.randrange(len(word))
+            edit = rng.choice(('insert', 'delete', 'replace', 'swap'))
+            if edit == 'insert':
+                word = word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+            elif edit == 'delete' and len(word) > 2:
+                word = word[:i] + word[i + 1:]
+            elif edit == 'swap' and i + 1 < len(word):
+                word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+            else:
+                word = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+        queries.append(word)
+    return queries
+
+
+def zipf_log(queries, n, s, rng):
+    """
+    replay log of n queries, where the i-th most popular query is asked with a probability proportional to 1 / i^s.
+    """
+    weights = [1 / rank ** s for rank in range(1, len(queries) + 1)]
+    return rng.choices(queries, weights=weights, k=n)
+
+
+def percentile(values, p):
+    """
+    the p-th percentile of values, nearest rank.
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def best_of(func, repeat=3):
+    """
+    run func `repeat` times and return the best wall time in seconds and the last result.
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
@@ -0,0 +1,148 @@
+"""
+Parallel build of an InvertedIndex. The documents are cut into contiguous shards, and a pool of processes preprocesses
+every shard and builds its posting lists with global doc ids. The sorted shard lexicons are then merged with a k-way
+merge. Because the shards are contiguous and merged in order, the doc ids and positions of every word are concatenated
+without sorting, and the result is exactly the index of the serial build:
+
+    index = InvertedIndex(preprocess_documents(raw_documents))
+    index.create_posting_list()
+"""
+import gc
+import heapq
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate, count, groupby, repeat
+from operator import itemgetter
+
+from src.indexing import InvertedIndex, Token
+from src.preprocessing import preprocess_text
+
+# a few shards per worker, so a worker that gets slow shards does not hold the others back
+SHARDS_PER_WORKER = 4
+
+
+def build_shard(first_doc_idx, documents, preprocess=True):
+    """
+    preprocess a shard of documents and build its posting lists. it runs in a worker process, and its result is a few
+    flat arrays instead of one object per word, so it is cheap to send back to the main process.
+    :param first_doc_idx:
+        global index of the first document of the shard
+    :param documents:
+        the raw documents of the shard, or lists of tokens if preprocess is False
+    :param preprocess:
+        whether the documents should go through preprocess_text
+    :return:
+        the lists of tokens of the documents, and the lexicon of the shard as (words, dfs, doc_ids, offsets,
+        positions): the sorted words, the number of documents of every word, then the doc ids, the offsets and the
+        positions of all words one after the other. the offsets of a word are Token.offsets without the first 0.
+    """
+    if preprocess:
+        documents = [preprocess_text(document) for document in documents]
+    tokens = {}
+    for doc_idx, document in enumerate(documents, first_doc_idx):
+        for token_idx, word in enumerate(document):
+            token = tokens.get(word)
+            if token is None:
+                token = tokens[word] = Token(word)
+            token.add_position(doc_idx, token_idx)
+    words = sorted(tokens)
+    dfs, doc_ids, offsets, positions = array('i'), array('i'), array('i'), array('i')
+    for word in words:
+        token = tokens[word]
+        dfs.append(len(token.doc_ids))
+        doc_ids.extend(token.doc_ids)
+        offsets.extend(token.offsets[1:])
+        positions.extend(token.positions)
+    return documents, (words, dfs, doc_ids, offsets, positions)
+
+
+def _starts(lexicon):
+    """
+    return where the doc ids and the positions of every word of a shard lexicon start, with one more item at the end.
+    """
+    _, dfs, _, offsets, _ = lexicon
+    doc_starts = list(accumulate(dfs, initial=0))
+    pos_starts = list(accumulate((offsets[end - 1] for end in doc_starts[1:]), initial=0))
+    return doc_starts, pos_starts
+
+
+def merge_shards(lexicons):
+    """
+    k-way merge of sorted shard lexicons into one posting list. the lexicons should be in order of their documents.
+    :param lexicons:
+        list of shard lexicons, as made by build_shard
+    :return:
+        sorted list of Token
+    """
+    # the merge makes no reference cycles, but the garbage collector would scan all tokens again and again while they
+    # are created
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return _merge(lexicons)
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _merge(lexicons):
+    starts = [_starts(lexicon) for lexicon in lexicons]
+    # entries of the same word are ordered by shard, so their doc ids are concatenated in order
+    entries = heapq.merge(*[zip(lexicon[0], repeat(shard), count()) for shard, lexicon in enumerate(lexicons)])
+    posting_list = []
+    for word, parts in groupby(entries, key=itemgetter(0)):
+        doc_ids, offsets, positions = None, None, None
+        for _, shard, t in parts:
+            _, _, shard_doc_ids, shard_offsets, shard_positions = lexicons[shard]
+            doc_starts, pos_starts = starts[shard]
+            doc_start, doc_end = doc_starts[t], doc_starts[t + 1]
+            if doc_ids is None:
+                doc_ids = shard_doc_ids[doc_start:doc_end]
+                offsets = array('i', [0]) + shard_offsets[doc_start:doc_end]
+                positions = shard_positions[pos_starts[t]:pos_starts[t + 1]]
+                continue
+            doc_ids.extend(shard_doc_ids[doc_start:doc_end])
+            # the offsets of a later shard continue after the positions of the earlier ones
+            offsets.extend(array('i', map(len(positions).__add__, shard_offsets[doc_start:doc_end])))
+            positions.extend(shard_positions[pos_starts[t]:pos_starts[t + 1]])
+        posting_list.append(Token.from_arrays(word, doc_ids, offsets, positions))
+    return posting_list
+
+
+def build_index(documents, workers=None, preprocess=True, **kwargs):
+    """
+    build an InvertedIndex with several processes. it is identical to the serial build of the same documents.
+    :param documents:
+        list of raw documents, or lists of tokens if preprocess is False
+    :param workers:
+        number of processes, os.cpu_count() by default. with one worker, the whole corpus is one shard built in this
+        process.
+    :param preprocess:
+        whether the documents should go through preprocess_text
+    :param kwargs:
+        passed to InvertedIndex, like case_sensitive and spell_backend
+    :return:
+        an InvertedIndex with its posting list created
+    """
+    workers = workers or os.cpu_count() or 1
+    n_shards = 1 if workers == 1 else min(len(documents), workers * SHARDS_PER_WORKER) or 1
+    bounds = [len(documents) * i // n_shards for i in range(n_shards + 1)]
+    shards = [(bounds[i], documents[bounds[i]:bounds[i + 1]]) for i in range(n_shards)]
+    if workers == 1:
+        results = [build_shard(start, shard, preprocess) for start, shard in shards]
+    else:
+        # forked workers share the memory of this process until they write to it, and a garbage collection in a worker
+        # would write to every object it scans. frozen objects are not scanned.
+        gc.freeze()
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(build_shard, start, shard, preprocess) for start, shard in shards]
+                results = [future.result() for future in futures]
+        finally:
+            gc.unfreeze()
+
+    index = InvertedIndex([document for shard_documents, _ in results for document in shard_documents], **kwargs)
+    index.clear_vocabulary_caches()
+    index.posting_list = merge_shards([lexicon for _, lexicon in results])
+    return index
@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    This class is a dictionary of at most maxsize entries. When it is full, the least recently used entry is evicted to
+    make room for a new one. With a ttl, an entry also expires ttl seconds after it was put, and it is dropped when it
+    is read after that. It counts its hits, misses, evictions and expirations, so the hit rate of a workload can be
+    measured.
+    ...
+    Attributes:
+    -----------
+    maxsize: int
+        the largest number of entries. 0 disables the cache, nothing is kept and every get is a miss.
+    ttl: float
+        seconds an entry is valid after it was put, or None if entries do not expire
+    clock: Callable
+        the time function of ttl, time.monotonic by default
+    entries: OrderedDict
+        {key: (value, expiry time)}, from the least recently used to the most recently used
+    hits, misses, evictions, expirations: int
+        counters since the cache was made, clear does not reset them
+
+    Methods
+    -------
+    Methods defined here:
+        get(self, key, default=None):
+            return the value of key and mark it as recently used, or default if it is missing or expired.
+        put(self, key, value):
+            set the value of key, evicting the least recently used entry if the cache is full.
+        clear(self):
+            drop all entries.
+        stats(self):
+            return the counters, the size and the hit rate as a dictionary.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        if maxsize < 0:
+            raise Exception("maxsize should not be negative")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[1] is not None and entry[1] <= self.clock():
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        if not self.maxsize:
+            return
+        expiry = None if self.ttl is None else self.clock() + self.ttl
+        self.entries[key] = (value, expiry)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
@@ -0,0 +1,347 @@
+"""
+Compressed posting lists. The postings of a word are cut into blocks of BLOCK_SIZE documents. In a block, the doc ids
+are stored as gaps from the doc id before them, followed by the number of positions of every document, all as
+variable-byte integers (7 bits per byte, the high bit set if more bytes follow). The positions are in a second record,
+block after block, as gaps from the position before them in the same document. Small gaps take one byte instead of the
+four bytes of an int32.
+
+A record starts with a skip table: the last doc id of every block, where every block starts in the blob and in the
+positions record, and the number of positions before it. A lookup finds its block with a binary search in the skip
+table and decodes that block only, so intersections and NEAR decode the blocks they touch instead of whole lists:
+
+    record:     DOC_HEADER (df, n_blocks), block_last (int32 * n_blocks), doc_starts, pos_starts, pos_counts
+                (int32 * (n_blocks + 1) each), then the blob of the blocks
+    positions:  the position gaps of all blocks
+
+CompressedToken reads a record the same way in memory and from a mapped file.
+"""
+import struct
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from src.utils import gallop_intersect
+
+BLOCK_SIZE = 128
+DOC_HEADER = struct.Struct('<II')
+
+
+def encode_vbyte(values):
+    """
+    return the variable-byte encoding of non-negative integers, lowest 7 bits first.
+    """
+    out = bytearray()
+    for n in values:
+        while n >= 0x80:
+            out.append((n & 0x7f) | 0x80)
+            n >>= 7
+        out.append(n)
+    return out
+
+
+def decode_vbyte(data):
+    """
+    return the list of integers of a variable-byte encoded buffer. when every byte is below 0x80, which is the common
+    case of small gaps, every byte is one integer and the list is built without a python loop.
+    """
+    data = bytes(data)
+    if data.isascii():
+        return list(data)
+    values = []
+    n = shift = 0
+    for byte in data:
+        if byte < 0x80:
+            values.append(n | (byte << shift))
+            n = shift = 0
+        else:
+            n |= (byte & 0x7f) << shift
+            shift += 7
+    return values
+
+
+def encode_postings(doc_ids, offsets, positions):
+    """
+    compress the postings of a word.
+    :param doc_ids:
+        sorted doc ids
+    :param offsets:
+        the positions of the i-th document are positions[offsets[i]:offsets[i + 1]], as in Token
+    :param positions:
+        positions of all documents
+    :return:
+        the doc record and the positions record, as bytes
+    """
+    df = len(doc_ids)
+    n_blocks = (df + BLOCK_SIZE - 1) // BLOCK_SIZE
+    block_last, doc_starts, pos_starts, pos_counts = array('i'), array('i', [0]), array('i', [0]), array('i', [0])
+    blob, pos_blob = bytearray(), bytearray()
+    previous = 0
+    for start in range(0, df, BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, df)
+        gaps, tfs, position_gaps = [], [], []
+        for i in range(start, end):
+            gaps.append(doc_ids[i] - previous)
+            previous = doc_ids[i]
+            doc_positions = positions[offsets[i]:offsets[i + 1]]
+            tfs.append(len(doc_positions))
+            last = 0
+            for position in doc_positions:
+                position_gaps.append(position - last)
+                last = position
+        blob += encode_vbyte(gaps)
+        blob += encode_vbyte(tfs)
+        pos_blob += encode_vbyte(position_gaps)
+        block_last.append(previous)
+        doc_starts.append(len(blob))
+        pos_starts.append(len(pos_blob))
+        pos_counts.append(offsets[end])
+    record = DOC_HEADER.pack(df, n_blocks) + block_last.tobytes() + doc_starts.tobytes() + pos_starts.tobytes() + \
+        pos_counts.tobytes() + blob
+    return record, bytes(pos_blob)
+
+
+class DocIdView:
+    """
+    This class is the doc_ids of a CompressedToken, a read-only sequence that decodes the block of an item when it is
+    read. bisect, gallop and iteration work on it as on an array.
+    """
+
+    def __init__(self, token):
+        self.token = token
+
+    def __len__(self):
+        return self.token.df
+
+    def __getitem__(self, i):
+        token = self.token
+        if type(i) is int and 0 <= i < token.df:
+            # the common case of galloping and bisecting, checked first
+            b, j = divmod(i, BLOCK_SIZE)
+            cached_b, block = token._block
+            return block[0][j] if cached_b == b else token.decode_block(b)[0][j]
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(token.df))]
+        if i < 0:
+            i += token.df
+        if not 0 <= i < token.df:
+            raise IndexError("doc id index out of range")
+        return token.decode_block(i // BLOCK_SIZE)[0][i % BLOCK_SIZE]
+
+    def __iter__(self):
+        for b in range(self.token.n_blocks):
+            yield from self.token.decode_block(b)[0]
+
+    def tobytes(self):
+        return array('i', self).tobytes()
+
+
+class OffsetView:
+    """
+    This class is the offsets of a CompressedToken. offsets[i] is the number of positions of the documents before the
+    i-th one, from the count of positions before its block and the numbers of positions in the block.
+    """
+
+    def __init__(self, token):
+        self.token = token
+
+    def __len__(self):
+        return self.token.df + 1
+
+    def __getitem__(self, i):
+        token = self.token
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(token.df + 1))]
+        if i < 0:
+            i += token.df + 1
+        if not 0 <= i <= token.df:
+            raise IndexError("offset index out of range")
+        if i == token.df:
+            return token.pos_counts[token.n_blocks]
+        b, j = divmod(i, BLOCK_SIZE)
+        return token.pos_counts[b] + token.decode_block(b)[2][j]
+
+    def __iter__(self):
+        for b in range(self.token.n_blocks):
+            base = self.token.pos_counts[b]
+            for count in self.token.decode_block(b)[2][:-1]:
+                yield base + count
+        yield self.token.pos_counts[self.token.n_blocks]
+
+    def tobytes(self):
+        return array('i', self).tobytes()
+
+
+class CompressedToken:
+    """
+    This class is a read-only Token whose postings are compressed in blocks. doc_ids and offsets are views that decode
+    the blocks they read, and the last decoded block is kept, so reading a list in order decodes every block once.
+    ...
+    Attributes:
+    -----------
+    word: str
+        the word of this token
+    df: int
+        number of documents of the word
+    n_blocks: int
+        number of blocks
+    block_last, doc_starts, pos_starts, pos_counts: memoryview
+        the skip table of the record
+    blob: memoryview
+        the compressed doc ids and numbers of positions
+    pos_blob: memoryview
+        the compressed positions
+
+    Methods
+    -------
+    Methods defined here:
+        from_arrays(cls, word, doc_ids, offsets, positions):
+            compress the arrays of a Token.
+        from_token(cls, token):
+            compress a Token.
+        from_records(cls, word, record, pos_record):
+            read a record made by encode_postings, from bytes or a memoryview of a mapped file.
+        decode_block(self, b):
+            return the doc ids, the numbers of positions and their running sums of the b-th block.
+        decode_positions(self, b):
+            return the positions of all documents of the b-th block, one document after the other.
+        doc_positions(self, i):
+            return the positions of the word inside the i-th document of doc_ids, decoding its block only.
+        intersect(self, doc_ids):
+            return the documents of a sorted list that contain the word. only the blocks that may have them are
+            decoded.
+        arrays(self):
+            return the decoded doc_ids, offsets and positions as arrays, like the ones of Token.
+        postings(self):
+            yield (doc_idx, positions) for every document of the word.
+    """
+    __slots__ = ('word', 'df', 'n_blocks', 'block_last', 'doc_starts', 'pos_starts', 'pos_counts', 'blob', 'pos_blob',
+                 'record', 'pos_record', '_block', '_positions')
+
+    @classmethod
+    def from_arrays(cls, word, doc_ids, offsets, positions):
+        return cls.from_records(word, *encode_postings(doc_ids, offsets, positions))
+
+    @classmethod
+    def from_token(cls, token):
+        return cls.from_arrays(token.word, token.doc_ids, token.offsets, token.positions)
+
+    @classmethod
+    def from_records(cls, word, record, pos_record):
+        token = cls.__new__(cls)
+        token.word = word
+        token.record = record
+        token.pos_record = pos_record
+        token.df, token.n_blocks = DOC_HEADER.unpack_from(record, 0)
+        view = memoryview(record)
+        start = DOC_HEADER.size
+        n = token.n_blocks
+        token.block_last = view[start:start + 4 * n].cast('i')
+        start += 4 * n
+        token.doc_starts = view[start:start + 4 * (n + 1)].cast('i')
+        start += 4 * (n + 1)
+        token.pos_starts = view[start:start + 4 * (n + 1)].cast('i')
+        start += 4 * (n + 1)
+        token.pos_counts = view[start:start + 4 * (n + 1)].cast('i')
+        token.blob = view[start + 4 * (n + 1):]
+        token.pos_blob = memoryview(pos_record)
+        token._block = (-1, None)
+        token._positions = (-1, None)
+        return token
+
+    @property
+    def doc_ids(self):
+        return DocIdView(self)
+
+    @property
+    def offsets(self):
+        return OffsetView(self)
+
+    @property
+    def positions(self):
+        return self.arrays()[2]
+
+    def decode_block(self, b):
+        cached_b, block = self._block
+        if cached_b == b:
+            return block
+        n = min(BLOCK_SIZE, self.df - b * BLOCK_SIZE)
+        values = decode_vbyte(self.blob[self.doc_starts[b]:self.doc_starts[b + 1]])
+        # the first gap of a block is from the last doc id of the block before it
+        first = self.block_last[b - 1] if b else 0
+        doc_ids = list(accumulate(values[:n], initial=first))[1:]
+        tfs = values[n:]
+        block = (doc_ids, tfs, list(accumulate(tfs, initial=0)))
+        self._block = (b, block)
+        return block
+
+    def decode_positions(self, b):
+        cached_b, positions = self._positions
+        if cached_b == b:
+            return positions
+        gaps = decode_vbyte(self.pos_blob[self.pos_starts[b]:self.pos_starts[b + 1]])
+        tfs = self.decode_block(b)[1]
+        if len(gaps) == len(tfs):
+            # one position per document, which is the gap from 0
+            positions = gaps
+        else:
+            positions = []
+            start = 0
+            for tf in tfs:
+                if tf == 1:
+                    positions.append(gaps[start])
+                else:
+                    positions.extend(accumulate(gaps[start:start + tf]))
+                start += tf
+        self._positions = (b, positions)
+        return positions
+
+    def doc_positions(self, i):
+        b, j = divmod(i, BLOCK_SIZE)
+        counts = self.decode_block(b)[2]
+        return self.decode_positions(b)[counts[j]:counts[j + 1]]
+
+    def intersect(self, doc_ids):
+        if len(doc_ids) * BLOCK_SIZE >= self.df:
+            # the list touches most blocks, so they are all decoded
+            return gallop_intersect(doc_ids, list(self.doc_ids))
+        result = []
+        b = 0
+        for doc_idx in doc_ids:
+            b = bisect_left(self.block_last, doc_idx, b)
+            if b == self.n_blocks:
+                break
+            block = self.decode_block(b)[0]
+            i = bisect_left(block, doc_idx)
+            if block[i] == doc_idx:
+                result.append(doc_idx)
+        return result
+
+    def arrays(self):
+        doc_ids, offsets, positions = array('i'), array('i', [0]), array('i')
+        for b in range(self.n_blocks):
+            block_doc_ids, _, counts = self.decode_block(b)
+            doc_ids.extend(block_doc_ids)
+            base = self.pos_counts[b]
+            offsets.extend([base + count for count in counts[1:]] if base else counts[1:])
+            positions.extend(self.decode_positions(b))
+        return doc_ids, offsets, positions
+
+    def postings(self):
+        for b in range(self.n_blocks):
+            block_doc_ids, _, counts = self.decode_block(b)
+            positions = self.decode_positions(b)
+            for j, doc_idx in enumerate(block_doc_ids):
+                yield doc_idx, positions[counts[j]:counts[j + 1]]
+
+    @property
+    def docs(self):
+        return [{'doc_idx': doc_idx, 'indexes': list(indexes)} for doc_idx, indexes in self.postings()]
+
+    def __len__(self):
+        return self.df
+
+    def __str__(self):
+        return self.word
+
+    def __repr__(self):
+        return self.word
@@ -0,0 +1,197 @@
+"""
+Document sets for boolean queries on large corpora, in NumPy. A set of documents of a corpus of n documents is either a
+sorted array of doc ids, when it is sparse, or a bitmap of n bits packed 8 per byte, when it is dense. A doc id takes 4
+bytes and a document of the bitmap takes 1/8 byte, so a set is a bitmap when it has more than n / DENSE_RATIO
+documents, which is the smaller of the two, like the containers of roaring bitmaps.
+
+AND, OR and NOT are vectorized for every pair of representations: two bitmaps are combined byte by byte, an array is
+checked against a bitmap by looking up its bits, and two arrays are merged by NumPy. NOT of anything is a bitmap. The
+doc ids are only built again at the end of a query, with to_list.
+"""
+import numpy as np
+
+# a set with more than n / DENSE_RATIO documents is a bitmap, 32 bits of a doc id for 1 bit of a document
+DENSE_RATIO = 32
+
+
+def as_doc_id_array(doc_ids):
+    """
+    return sorted doc ids as an int32 NumPy array. the arrays and the mapped buffers of tokens are used without copy.
+    """
+    if isinstance(doc_ids, np.ndarray):
+        return doc_ids
+    try:
+        return np.frombuffer(doc_ids, dtype=np.int32)
+    except TypeError:
+        # lists and the lazy doc ids of a CompressedToken
+        return np.fromiter(doc_ids, dtype=np.int32, count=len(doc_ids))
+
+
+class DocSet:
+    """
+    This class is a set of documents of a corpus of n documents, a sorted array of doc ids if it is sparse or a packed
+    bitmap if it is dense. The result of an operation takes the smaller representation, so the sets of common words
+    and of NOT are bitmaps and the sets of rare words stay arrays.
+    ...
+    Attributes:
+    -----------
+    n: int
+        number of documents of the corpus, the doc ids are in range(n)
+    ids: numpy.ndarray
+        the sorted int32 doc ids, or None if the set is a bitmap
+    bits: numpy.ndarray
+        the uint8 bitmap, bit i % 8 of byte i // 8 is set if document i is in the set, or None if the set is an array
+
+    Methods
+    -------
+    Methods defined here:
+        from_ids(cls, doc_ids, n):
+            make a set from sorted doc ids, like the doc ids of a token.
+        union_all(cls, doc_id_lists, n):
+            make the union of several lists of sorted doc ids at once.
+        full(cls, n):
+            the set of all documents.
+        is_dense(self):
+            whether the set is a bitmap.
+        __and__, __or__, __sub__(self, other):
+            intersection, union and difference of two sets of the same corpus.
+        intersect_ids(self, doc_ids):
+            intersection with sorted doc ids, without making a set of them.
+        __invert__(self):
+            the documents of the corpus that are not in the set.
+        to_ids(self):
+            return the sorted doc ids as a NumPy array.
+        to_list(self):
+            return the sorted doc ids as a list of ints.
+    """
+    __slots__ = ('n', 'ids', 'bits')
+
+    def __init__(self, n, ids=None, bits=None):
+        self.n = n
+        self.ids = ids
+        self.bits = bits
+
+    @classmethod
+    def from_ids(cls, doc_ids, n):
+        return cls(n, ids=as_doc_id_array(doc_ids)).compact()
+
+    @classmethod
+    def union_all(cls, doc_id_lists, n):
+        """
+        make the union of several lists of sorted doc ids, like the tokens of a wildcard. if the union may be dense, the
+        bits of all lists are set in one bitmap, otherwise the lists are concatenated and sorted once.
+        """
+        arrays = [as_doc_id_array(doc_ids) for doc_ids in doc_id_lists]
+        if len(arrays) == 1:
+            return cls(n, ids=arrays[0]).compact()
+        if sum(len(ids) for ids in arrays) * DENSE_RATIO > n:
+            flags = np.zeros(n, dtype=bool)
+            for ids in arrays:
+                flags[ids] = True
+            return cls(n, bits=np.packbits(flags, bitorder='little')).compact()
+        if not arrays:
+            return cls(n, ids=np.empty(0, dtype=np.int32))
+        return cls(n, ids=np.unique(np.concatenate(arrays)))
+
+    @classmethod
+    def full(cls, n):
+        bits = np.full((n + 7) // 8, 0xff, dtype=np.uint8)
+        return cls(n, bits=bits).clear_tail()
+
+    def is_dense(self):
+        return self.bits is not None
+
+    def clear_tail(self):
+        # the bits after the n-th one should stay 0, so counts and to_ids do not see documents that do not exist
+        if self.n % 8:
+            self.bits[-1] &= (1 << (self.n % 8)) - 1
+        return self
+
+    def compact(self):
+        """
+        turn the set into its smaller representation.
+        """
+        if self.bits is not None:
+            if len(self) * DENSE_RATIO <= self.n:
+                return DocSet(self.n, ids=self.to_ids())
+        elif len(self.ids) * DENSE_RATIO > self.n:
+            return DocSet(self.n, bits=self.as_bits())
+        return self
+
+    def as_bits(self):
+        """
+        return the bitmap of the set, making it from the doc ids of a sparse set.
+        """
+        if self.bits is not None:
+            return self.bits
+        flags = np.zeros(self.n, dtype=bool)
+        flags[self.ids] = True
+        return np.packbits(flags, bitorder='little')
+
+    def contains(self, ids):
+        """
+        return a boolean array of whether every doc id of ids is in the set. ids should be an array of doc ids.
+        """
+        bits = self.as_bits()
+        return ((bits[ids >> 3] >> (ids & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def __and__(self, other):
+        if self.bits is not None and other.bits is not None:
+            return DocSet(self.n, bits=self.bits & other.bits).compact()
+        if self.ids is not None and other.ids is not None:
+            return DocSet(self.n, ids=np.intersect1d(self.ids, other.ids, assume_unique=True))
+        sparse, dense = (self, other) if self.ids is not None else (other, self)
+        return DocSet(self.n, ids=sparse.ids[dense.contains(sparse.ids)])
+
+    def intersect_ids(self, doc_ids):
+        """
+        return the intersection of the set with sorted doc ids, like the doc ids of a token. the ids of a sparse set
+        are binary searched in doc_ids, and doc_ids are looked up in a bitmap, so no set is made of doc_ids, which is
+        what costs most when a rare word is intersected with a common one.
+        """
+        doc_ids = as_doc_id_array(doc_ids)
+        if self.bits is not None:
+            if len(doc_ids) * DENSE_RATIO > self.n:
+                # both are dense, and and-ing two bitmaps is faster than looking up every doc id
+                return self & DocSet(self.n, bits=DocSet(self.n, ids=doc_ids).as_bits())
+            return DocSet(self.n, ids=doc_ids[self.contains(doc_ids)])
+        if not len(doc_ids):
+            return DocSet(self.n, ids=doc_ids)
+        found = np.minimum(np.searchsorted(doc_ids, self.ids), len(doc_ids) - 1)
+        return DocSet(self.n, ids=self.ids[doc_ids[found] == self.ids])
+
+    def __or__(self, other):
+        if self.ids is not None and other.ids is not None:
+            return DocSet(self.n, ids=np.union1d(self.ids, other.ids)).compact()
+        return DocSet(self.n, bits=self.as_bits() | other.as_bits())
+
+    def __sub__(self, other):
+        if self.ids is not None:
+            if other.ids is not None:
+                return DocSet(self.n, ids=np.setdiff1d(self.ids, other.ids, assume_unique=True))
+            return DocSet(self.n, ids=self.ids[~other.contains(self.ids)])
+        return DocSet(self.n, bits=self.bits & ~other.as_bits()).compact()
+
+    def __invert__(self):
+        return DocSet(self.n, bits=~self.as_bits()).clear_tail().compact()
+
+    def __len__(self):
+        if self.ids is not None:
+            return len(self.ids)
+        return int(np.unpackbits(self.bits).sum())
+
+    def __bool__(self):
+        if self.ids is not None:
+            return len(self.ids) > 0
+        return bool(self.bits.any())
+
+    def to_ids(self):
+        if self.ids is not None:
+            return self.ids
+        return np.flatnonzero(np.unpackbits(self.bits, count=self.n, bitorder='little')).astype(np.int32)
+
+    def to_list(self):
+        return self.to_ids().tolist()
+
+    def __repr__(self):
+        return f"DocSet({len(self)} of {self.n}, {'bitmap' if self.bits is not None else 'array'})"
@@ -1,14 +1,131 @@
-import nltk
+import heapq
 import string
+from array import array
+from bisect import bisect_left
 from typing import List
 
-from src.utils import edit_distance
+from src.codec import CompressedToken
+from src.kgram import KGramIndex
+from src.lexicon import FrontCodedLexicon
+from src.preprocessing import stop_words
+from src.ranking import BM25
+from src.spelling import BKTree, DeletionIndex
+from src.utils import bounded_edit_distance, edit_distance, gallop_intersect
+
+SPELL_BACKENDS = ('linear', 'bktree', 'kgram')
+# largest distance of the deletion dictionary of suggest. larger distances are answered by the BK-tree.
+SUGGEST_MAX_DISTANCE = 2
 
 
 class Token:
+    """
+    This class stores a word and its postings. The postings are kept in three contiguous integer arrays instead of a
+    list of dictionaries, so every posting costs a few bytes instead of a few hundred.
+    ...
+    Attributes:
+    -----------
+    word: str
+        the word of this token
+    doc_ids: array
+        sorted indexes of the documents that contain the word
+    offsets: array
+        positions of the i-th document are positions[offsets[i]:offsets[i + 1]], so it has len(doc_ids) + 1 items
+    positions: array
+        indexes of the word inside the documents, document after document
+
+    Methods
+    -------
+    Methods defined here:
+        add_position(self, doc_idx, position):
+            add one occurrence of the word. occurrences should be added in order of doc_idx.
+            :param doc_idx:
+                index of the document
+            :param position:
+                index of the word inside the document
+            :return:
+                None
+        insert_document(self, doc_idx, positions):
+            add all occurrences of the word in one document, in any order of doc_idx. doc_ids stays sorted.
+            :param doc_idx:
+                index of the document. it should not be in doc_ids yet.
+            :param positions:
+                sorted indexes of the word inside the document
+            :return:
+                None
+        doc_positions(self, i):
+            return the positions of the word inside the i-th document of doc_ids.
+        intersect(self, doc_ids):
+            return the documents of a sorted list that contain the word. CompressedToken does the same by decoding
+            only the blocks it needs.
+        postings(self):
+            iterate over (doc_idx, positions) pairs without creating dictionaries.
+        from_arrays(cls, word, doc_ids, offsets, positions):
+            create a token over existing buffers, for example memoryviews of a mapped index file. such a token is
+            read-only.
+        docs:
+            the postings in the old format, a list of {'doc_idx': ..., 'indexes': [...]} dictionaries. it is built on
+            every access, so it should only be used for printing or comparing.
+    """
+    __slots__ = ('word', 'doc_ids', 'offsets', 'positions')
+
     def __init__(self, word: str):
         self.word = word
-        self.docs = []
+        self.doc_ids = array('i')
+        self.offsets = array('i', [0])
+        self.positions = array('i')
+
+    @classmethod
+    def from_arrays(cls, word, doc_ids, offsets, positions):
+        token = cls.__new__(cls)
+        token.word = word
+        token.doc_ids = doc_ids
+        token.offsets = offsets
+        token.positions = positions
+        return token
+
+    def add_position(self, doc_idx, position):
+        if not self.doc_ids or self.doc_ids[-1] != doc_idx:
+            self.doc_ids.append(doc_idx)
+            self.offsets.append(self.offsets[-1])
+        self.positions.append(position)
+        self.offsets[-1] += 1
+
+    def insert_document(self, doc_idx, positions):
+        i = bisect_left(self.doc_ids, doc_idx)
+        if i < len(self.doc_ids) and self.doc_ids[i] == doc_idx:
+            raise Exception(f"Document {doc_idx} is already in the postings of {self.word!r}")
+        n = len(positions)
+        start = self.offsets[i]
+        if i == len(self.doc_ids):
+            self.doc_ids.append(doc_idx)
+            self.positions.extend(positions)
+            self.offsets.append(start + n)
+            return
+        self.doc_ids.insert(i, doc_idx)
+        self.positions[start:start] = array('i', positions)
+        # the documents after the new one start n positions later
+        tail = self.offsets[i + 1:]
+        del self.offsets[i + 1:]
+        self.offsets.append(start + n)
+        self.offsets.extend(array('i', map(n.__add__, tail)))
+
+    def doc_positions(self, i):
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+    def intersect(self, doc_ids):
+        return gallop_intersect(doc_ids, self.doc_ids)
+
+    def postings(self):
+        offsets, positions = self.offsets, self.positions
+        for i, doc_idx in enumerate(self.doc_ids):
+            yield doc_idx, positions[offsets[i]:offsets[i + 1]]
+
+    @property
+    def docs(self):
+        return [{'doc_idx': doc_idx, 'indexes': list(indexes)} for doc_idx, indexes in self.postings()]
+
+    def __len__(self):
+        return len(self.doc_ids)
 
     def __str__(self):
         return self.word
@@ -31,41 +148,92 @@ class InvertedIndex:
         set of stop words to check when tokenizing
     case_sensitive: bool
         a boolean to determine whether we want to distinguish between lowercase and uppercase form.
+    spell_backend: str
+        how spell_correction finds the nearest word. 'linear' computes the edit distance to every word of posting_list,
+        'bktree' searches a BK-tree of the vocabulary, which is built on the first correction, and 'kgram' checks the
+        words that share bigrams with the given word, in order of the number of shared bigrams.
+    words: List[str]
+        the words of posting_list, or None if vocabulary() was not called yet
+    lexicon: FrontCodedLexicon
+        the front-coded words of posting_list, which maps a word to its term id, its index in posting_list. None if it
+        is not built yet.
+    bk_tree: BKTree
+        BK-tree of the vocabulary, or None if it is not built yet
+    kgram_index: KGramIndex
+        bigram index of the vocabulary, or None if it is not built yet. QueryProcessor uses it for wildcards too.
+    deletion_index: DeletionIndex
+        deletion dictionary of the vocabulary for suggest, or None if it is not built yet
+    doc_freqs: array
+        number of documents of every token of posting_list, or None if it is not computed yet
+    bm25: BM25
+        document lengths and score bounds for ranked search, or None if they are not computed yet
+    version: int
+        a counter that goes up every time the postings change, so the caches of QueryProcessor know that they are out
+        of date
 
     Methods
     -------
     Methods defined here:
-        __init__(self, documents: List, case_sensitive=False):
+        __init__(self, documents: List, case_sensitive=False, spell_backend='linear'):
             Constructor will set initial attributes like documents and case_sensitive. NOTE that documents should be
             list of strings at first.
             :parameter
             ---------
             documents:List
                 list of strings at first. but then chagnes to list of lists of strings
+            spell_backend:str
+                'linear', 'bktree' or 'kgram'
             :return
                 None
+        num_docs:
+            number of documents in the index.
+        vocabulary(self):
+            return the words of posting_list in order. the list is kept until the posting list changes.
+        clear_vocabulary_caches(self):
+            drop the vocabulary and the spelling and ranking structures built from it, and increase version.
+        get_kgram_index(self):
+            return the bigram index of the vocabulary, build it if it is not built yet.
+        get_lexicon(self):
+            return the front-coded lexicon of the vocabulary, build it if it is not built yet.
+        get_bm25(self):
+            return the BM25 scorer of the index, build it if it is not built yet.
         add_document(self, doc_idx, doc):
             this function will add a document to the posting list. it will loop over all tokens in the document and
-            add them to the posting list.
+            add them to the posting list. doc_idx does not have to be larger than the indexes of the documents that
+            are already added.
             :param doc_idx:
                 index of the document in the documents list
             :param doc:
                 list of tokens in the document
             :return:
                 None
-        create_posting_list(self):
+        create_posting_list(self, bulk=True):
             calling this function, will create posting list of all occurred words cross all documents.
             :parameter
-                None
+                bulk: bool
+                    if True, collect the postings in a dictionary in one pass and sort the vocabulary once at the end.
+                    if False, insert the tokens one by one with add_document.
             :return
                 None
+        suggest(self, word, k=5, max_distance=2):
+            return the k best corrections of a word, ranked by edit distance and then by document frequency.
+            :param word:
+                the word you want suggestions for
+            :param k:
+                number of suggestions
+            :param max_distance:
+                largest edit distance of a suggestion
+            :return:
+                list of (word, distance, doc_freq) tuples, best first
+        deleted_docs(self):
+            return the sorted indexes of the deleted documents, which is empty for an InvertedIndex.
         get_token_index(self, x):
-            this function find index of a word in posting list using binary search algorithm.
+            this function find index of a word in posting list, its term id, with a binary search in the lexicon.
             :parameter
                 x:str
                     the word you want to find its index
             :return
-                int: index of the word in posting_list
+                int: index of the word in posting_list, or -1 if it is not there
         get_token(self, token):
                 This function will return the token object that contains docs informations. if the given token is not in the
                 posting_list, it return the spell corrected token.
@@ -73,9 +241,18 @@ class InvertedIndex:
                     token you want to fetch it from posting list
                 :return:
                     return the instance of token from posting list
+        compress(self):
+            replace the tokens of posting_list by CompressedToken. the posting list is read-only after that.
+        save(self, path, compressed=False):
+            save the posting list into the directory `path` in the binary format of src.storage, with compressed
+            postings if compressed is True.
+        load(cls, path):
+            load an index saved with save. the files are memory-mapped, so loading takes the same time for any size
+            of index. save does not save the documents, so the documents attribute of the loaded index is None,
+            unless the index was written by src.ingest, which keeps them on disk in a DocumentStore.
     """
 
-    def __init__(self, documents: List, case_sensitive=False):
+    def __init__(self, documents: List, case_sensitive=False, spell_backend='linear'):
         """
         Constructor will set initial attributes like documents and case_sensitive. NOTE that documents should be
             list of strings at first.
@@ -83,35 +260,101 @@ class InvertedIndex:
             ---------
             documents:List
                 list of strings at first. but then chagnes to list of lists of strings
+            spell_backend:str
+                'linear', 'bktree' or 'kgram'
             :return
                 None
         """
+        if spell_backend not in SPELL_BACKENDS:
+            raise Exception(f"spell_backend should be one of {SPELL_BACKENDS}")
         self.documents = documents
+        self._num_docs = 0
         self.posting_list: List[Token] = []
-        self.stop_words: set = set(nltk.corpus.stopwords.words('english') + list(string.punctuation))
+        self.stop_words: set = stop_words | set(string.punctuation)
         self.case_sensitive = case_sensitive
+        self.spell_backend = spell_backend
+        self.words = None
+        self.lexicon = None
+        self.bk_tree = None
+        self.kgram_index = None
+        self.deletion_index = None
+        self.doc_freqs = None
+        self.bm25 = None
+        self.version = 0
+
+    @property
+    def num_docs(self):
+        if self.documents is not None:
+            return len(self.documents)
+        return self._num_docs
+
+    def vocabulary(self):
+        """
+        return the words of posting_list in order, without creating tokens for a loaded index. the list is kept until
+        the posting list changes.
+        """
+        if self.words is None:
+            self.words = getattr(self.posting_list, 'words', None)
+            if self.words is None:
+                self.words = [token.word for token in self.posting_list]
+        return self.words
+
+    def clear_vocabulary_caches(self):
+        """
+        drop the structures built from the vocabulary, they are built again when they are needed. it is called whenever
+        the postings change, so it also increases version.
+        """
+        self.version += 1
+        self.words = None
+        self.lexicon = None
+        self.bk_tree = None
+        self.kgram_index = None
+        self.deletion_index = None
+        self.doc_freqs = None
+        self.bm25 = None
+
+    def get_kgram_index(self):
+        """
+        return the bigram index of the vocabulary, build it if it is not built yet.
+        """
+        if self.kgram_index is None:
+            self.kgram_index = KGramIndex(self.vocabulary())
+        return self.kgram_index
+
+    def get_lexicon(self):
+        """
+        return the front-coded lexicon of the vocabulary, build it if it is not built yet. a loaded index is already
+        front coded on disk, so its words are used as they are.
+        """
+        if self.lexicon is None:
+            words = self.vocabulary()
+            self.lexicon = words if isinstance(words, FrontCodedLexicon) else FrontCodedLexicon(words)
+        return self.lexicon
+
+    def get_bm25(self):
+        """
+        return the BM25 scorer of the index, build it if it is not built yet. it counts the length of every document
+        from the posting list, so it is dropped with the other caches when the posting list changes.
+        """
+        if self.bm25 is None:
+            self.bm25 = BM25(self)
+        return self.bm25
 
     def add_document(self, doc_idx, doc):
+        self.clear_vocabulary_caches()
+        occurrences = {}
         for token_idx, token in enumerate(doc):
-            if len(self.posting_list) == 0:
-                self.posting_list.append(Token(token))
-                self.posting_list[0].docs.append({'doc_idx': doc_idx, 'indexes': [token_idx]})
-                continue
+            occurrences.setdefault(token, []).append(token_idx)
+        for token, positions in occurrences.items():
             i = 0
             while i < len(self.posting_list) and token > self.posting_list[i].word:
                 i += 1
-            if i == len(self.posting_list):
-                self.posting_list.append(Token(token))
-                # self.posting_list[i].post_idx.append(post_idx)
-            elif token != self.posting_list[i].word:
+            if i == len(self.posting_list) or token != self.posting_list[i].word:
                 self.posting_list.insert(i, Token(token))
+            # the document can be older than documents that are already indexed, so it is inserted at its place
+            self.posting_list[i].insert_document(doc_idx, positions)
 
-            if doc_idx not in [elem['doc_idx'] for elem in self.posting_list[i].docs]:
-                self.posting_list[i].docs.append({'doc_idx': doc_idx, 'indexes': [token_idx]})
-            else:
-                self.posting_list[i].docs[-1]['indexes'].append(token_idx)
-
-    def create_posting_list(self):
+    def create_posting_list(self, bulk=True):
         """
         calling this function, will create posting list of all occurred words cross all documents. in this function, we
         loop over all documents, then inside this loop, we loop over all the tokens that are in the current document.
@@ -119,14 +362,29 @@ class InvertedIndex:
         posting_list is more than 0, we find the correct index of the token in posting_list alphabetically. then we check
         if this token, has been already in posting_list, we just add the current document index in tokens.docs, else, we
         add this token in the posting_list, then add the current document index.
+        in bulk mode, instead of finding the place of every token in posting_list, we keep the tokens in a dictionary
+        while looping over the documents, and sort them once at the end. the result is exactly the same.
             :parameter
-                None
+                bulk: bool
+                    if True, build the posting list in one pass with a dictionary. if False, use add_document.
             :return
                 None
         :return:
         """
+        self.clear_vocabulary_caches()
+        if not bulk:
+            for doc_idx, doc in enumerate(self.documents):
+                self.add_document(doc_idx=doc_idx, doc=doc)
+            return
+
+        tokens = {token.word: token for token in self.posting_list}
         for doc_idx, doc in enumerate(self.documents):
-            self.add_document(doc_idx=doc_idx, doc=doc)
+            for token_idx, word in enumerate(doc):
+                token = tokens.get(word)
+                if token is None:
+                    token = tokens[word] = Token(word)
+                token.add_position(doc_idx, token_idx)
+        self.posting_list = [tokens[word] for word in sorted(tokens)]
 
     def spell_correction(self, word):
         """
@@ -136,36 +394,78 @@ class InvertedIndex:
         :return:
             index of the nearest token from posting list to the given word
         """
+        if self.spell_backend == 'bktree':
+            if self.bk_tree is None:
+                self.bk_tree = BKTree(self.vocabulary())
+            return self.bk_tree.nearest(word)[0]
+        if self.spell_backend == 'kgram':
+            return self.get_kgram_index().nearest(word)[0]
+
+        # a word only has to be checked against the best distance so far, so the distance of most words is abandoned
+        # after a few rows of the matrix
+        words = self.vocabulary()
         nearest_idx = 0
-        nearest_val = edit_distance(self.posting_list[nearest_idx].word, word)
-        for idx in range(len(self.posting_list)):
-            temp_dist = edit_distance(self.posting_list[idx].word, word)
+        nearest_val = edit_distance(words[nearest_idx], word)
+        for idx in range(len(words)):
+            if nearest_val == 0:
+                break
+            temp_dist = bounded_edit_distance(words[idx], word, nearest_val - 1)
             if temp_dist < nearest_val:
                 nearest_idx = idx
                 nearest_val = temp_dist
         return nearest_idx
 
+    def suggest(self, word, k=5, max_distance=2):
+        """
+        this function returns the k best corrections of a word. the candidates within max_distance are found with a
+        deletion dictionary (or the BK-tree, if max_distance is more than the dictionary supports), then they are ranked
+        by edit distance, then by document frequency (more frequent first), then by their order in posting_list.
+        :param word:
+            the word you want suggestions for. if it is in posting_list, it is the first suggestion.
+        :param k:
+            number of suggestions
+        :param max_distance:
+            largest edit distance of a suggestion
+        :return:
+            list of (word, distance, doc_freq) tuples, best first
+        """
+        words = self.vocabulary()
+        if self.doc_freqs is None:
+            self.doc_freqs = array('i', (len(token.doc_ids) for token in self.posting_list))
+        if max_distance <= SUGGEST_MAX_DISTANCE:
+            if self.deletion_index is None:
+                self.deletion_index = DeletionIndex(words, max_distance=SUGGEST_MAX_DISTANCE)
+            candidates = self.deletion_index.within(word, max_distance)
+        else:
+            if self.bk_tree is None:
+                self.bk_tree = BKTree(words)
+            candidates = self.bk_tree.within(word, max_distance)
+        doc_freqs = self.doc_freqs
+
+        def rank(candidate):
+            dist, word_idx = candidate
+            return dist, -doc_freqs[word_idx], word_idx
+
+        best = heapq.nsmallest(k, candidates, key=rank)
+        return [(words[word_idx], dist, doc_freqs[word_idx]) for dist, word_idx in best]
+
+    def deleted_docs(self):
+        """
+        return the sorted indexes of the deleted documents. an InvertedIndex can not delete documents, see LiveIndex.
+        """
+        return []
+
     def get_token_index(self, x):
         """
-        this function find index of a word in posting list using binary search algorithm.
+        this function find index of a word in posting list, its term id, with a binary search over the blocks of the
+        front-coded lexicon, so it compares bytes of a few words instead of creating tokens.
             :parameter
                 x:str
                     the word you want to find its index
             :return
-                int: index of the word in posting_list
-        """
-        low = 0
-        high = len(self.posting_list) - 1
-        mid = 0
-        while low <= high:
-            mid = (high + low) // 2
-            if self.posting_list[mid].word < x:
-                low = mid + 1
-            elif self.posting_list[mid].word > x:
-                high = mid - 1
-            else:
-                return mid
-        return -1
+                int: index of the word in posting_list, or -1 if it is not there
+        """
+        return self.get_lexicon().term_id(x)
 
     def get_token(self, token):
         """
@@ -181,6 +481,39 @@ class InvertedIndex:
             p = self.spell_correction(token)
         return self.posting_list[p]
 
+    def compress(self):
+        """
+        compress the postings of every token in blocks of variable-byte gaps, see src.codec. queries decode the blocks
+        they read, so the posting list takes a fraction of the memory. documents can not be added after that.
+        """
+        self.posting_list = [token if isinstance(token, CompressedToken) else CompressedToken.from_token(token)
+                             for token in self.posting_list]
+        self.version += 1
+
+    def save(self, path, compressed=False):
+        """
+        save the posting list into the directory `path`. see src.storage for the format.
+        :param path:
+            directory of the index files
+        :param compressed:
+            whether the postings and positions are saved compressed, see src.codec
+        :return:
+            None
+        """
+        from src.storage import save_index
+        save_index(self, path, compressed)
+
+    @classmethod
+    def load(cls, path, case_sensitive=False, spell_backend='linear'):
+        """
+        load an index saved with save. the files are memory-mapped and tokens are read from them on access.
+        :param path:
+            directory of the index files
+        :return:
+            an InvertedIndex. its documents are a DocumentStore if the directory has them (see src.ingest), else None.
+        """
+        from src.storage import load_documents, load_index
+        index = cls(load_documents(path), case_sensitive=case_sensitive, spell_backend=spell_backend)
+        index.posting_list, index._num_docs = load_index(path)
+        return index
 
-nltk.download('punkt')
-nltk.download('stopwords')
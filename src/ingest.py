@@ -0,0 +1,170 @@
+"""
+Streaming ingestion of a corpus into an index on disk, in the style of SPIMI (single-pass in-memory indexing). The
+documents are read, preprocessed and indexed one at a time. The posting lists are kept in memory until they reach a
+memory budget, then they are written to a sorted run file and dropped. At the end the runs are merged with a k-way merge
+straight into the files of src.storage, and the index is mapped from them. The tokens of the documents go to a
+DocumentStore on disk as they are read, so the memory of the whole pipeline stays bounded by the budget, the lexicon and
+a few integers per document, whatever the size of the corpus.
+
+    index = ingest(iter_documents(doc_folder), path)
+"""
+import heapq
+import os
+import struct
+from array import array
+from itertools import groupby
+from operator import itemgetter
+
+from src.indexing import InvertedIndex, Token
+from src.preprocessing import preprocess_text
+from src.storage import DocumentWriter, IndexWriter
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+# rough sizes in bytes of a new word (Token, its arrays and the word) and of a posting, used to check the budget
+WORD_SIZE = 400
+POSTING_SIZE = 8
+POSITION_SIZE = 4
+
+# length of the word, number of documents and number of positions of a run record
+RUN_RECORD = struct.Struct('<III')
+
+
+class SpimiIndexer:
+    """
+    This class builds posting lists in memory and writes them to sorted runs on disk when they reach the memory budget.
+    Documents should be added in order of doc_idx, so every run covers a range of documents after the previous one.
+    ...
+    Attributes:
+    -----------
+    run_dir: str
+        directory of the run files
+    memory_budget: int
+        bytes the posting lists in memory may take before they are written to a run
+    tokens: dict
+        {word: Token} of the documents since the last run
+    size: int
+        estimated bytes of tokens
+    runs: List[str]
+        paths of the run files, in order
+
+    Methods
+    -------
+    Methods defined here:
+        add_document(self, doc_idx, doc):
+            add the tokens of a document, and write a run if the budget is reached.
+        flush(self):
+            write the posting lists in memory to a new run, sorted by word.
+        merge(self, writer):
+            merge all runs into an IndexWriter and delete them.
+    """
+
+    def __init__(self, run_dir, memory_budget=DEFAULT_MEMORY_BUDGET):
+        os.makedirs(run_dir, exist_ok=True)
+        self.run_dir = run_dir
+        self.memory_budget = memory_budget
+        self.tokens = {}
+        self.size = 0
+        self.runs = []
+
+    def add_document(self, doc_idx, doc):
+        tokens = self.tokens
+        for token_idx, word in enumerate(doc):
+            token = tokens.get(word)
+            if token is None:
+                token = tokens[word] = Token(word)
+                self.size += WORD_SIZE
+            if not token.doc_ids or token.doc_ids[-1] != doc_idx:
+                self.size += POSTING_SIZE
+            token.add_position(doc_idx, token_idx)
+            self.size += POSITION_SIZE
+        if self.size >= self.memory_budget:
+            self.flush()
+
+    def flush(self):
+        if not self.tokens:
+            return
+        path = os.path.join(self.run_dir, f'run{len(self.runs):05d}.bin')
+        with open(path, 'wb') as file:
+            for word in sorted(self.tokens):
+                token = self.tokens[word]
+                encoded = word.encode('utf-8')
+                file.write(RUN_RECORD.pack(len(encoded), len(token.doc_ids), len(token.positions)))
+                file.write(encoded)
+                file.write(token.doc_ids.tobytes())
+                file.write(token.offsets.tobytes())
+                file.write(token.positions.tobytes())
+        self.runs.append(path)
+        self.tokens = {}
+        self.size = 0
+
+    def merge(self, writer):
+        self.flush()
+        # records of the same word are ordered by run, so their doc ids are concatenated in order
+        records = heapq.merge(*[read_run(path, run) for run, path in enumerate(self.runs)])
+        for word, parts in groupby(records, key=itemgetter(0)):
+            _, _, doc_ids, offsets, positions = next(parts)
+            for _, _, run_doc_ids, run_offsets, run_positions in parts:
+                doc_ids.extend(run_doc_ids)
+                # the offsets of a later run continue after the positions of the earlier ones
+                offsets.extend(array('i', map(len(positions).__add__, run_offsets[1:])))
+                positions.extend(run_positions)
+            writer.add(word, doc_ids, offsets, positions)
+        for path in self.runs:
+            os.remove(path)
+        self.runs = []
+
+
+def read_run(path, run):
+    """
+    yield the records of a run file one by one.
+    :param path:
+        path of the run file
+    :param run:
+        number of the run, it is yielded with every record so records of the same word sort by run
+    :return:
+        iterator of (word, run, doc_ids, offsets, positions)
+    """
+    with open(path, 'rb') as file:
+        while True:
+            header = file.read(RUN_RECORD.size)
+            if not header:
+                return
+            word_length, df, n_positions = RUN_RECORD.unpack(header)
+            word = file.read(word_length).decode('utf-8')
+            doc_ids, offsets, positions = array('i'), array('i'), array('i')
+            doc_ids.frombytes(file.read(df * 4))
+            offsets.frombytes(file.read((df + 1) * 4))
+            positions.frombytes(file.read(n_positions * 4))
+            yield word, run, doc_ids, offsets, positions
+
+
+def ingest(documents, path, memory_budget=DEFAULT_MEMORY_BUDGET, preprocess=True, **kwargs):
+    """
+    index a stream of documents into the directory `path` with bounded memory, and load the index from it.
+    :param documents:
+        iterable of raw documents, like iter_documents(doc_folder), or of lists of tokens if preprocess is False
+    :param path:
+        directory of the index files. the runs are written to a subdirectory of it and deleted after the merge.
+    :param memory_budget:
+        bytes the posting lists in memory may take before they are written to a run
+    :param preprocess:
+        whether the documents should go through preprocess_text
+    :param kwargs:
+        passed to InvertedIndex.load, like case_sensitive and spell_backend
+    :return:
+        the memory-mapped InvertedIndex, with its documents in a DocumentStore
+    """
+    indexer = SpimiIndexer(os.path.join(path, 'runs'), memory_budget)
+    document_writer = DocumentWriter(path)
+    n_docs = 0
+    for doc_idx, document in enumerate(documents):
+        doc = preprocess_text(document) if preprocess else document
+        document_writer.add(doc)
+        indexer.add_document(doc_idx, doc)
+        n_docs += 1
+    document_writer.close()
+    writer = IndexWriter(path)
+    indexer.merge(writer)
+    writer.close(n_docs)
+    os.rmdir(indexer.run_dir)
+    return InvertedIndex.load(path, **kwargs)
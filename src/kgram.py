@@ -0,0 +1,125 @@
+import math
+from array import array
+
+from src.utils import bounded_edit_distance, intersect_sorted
+
+EMPTY = array('i')
+
+
+def word_grams(word, k):
+    """
+    return the set of k-grams of `$word$`. the '$' marks the beginning and the end of the word.
+    """
+    padded = '$' + word + '$'
+    return {padded[i:i + k] for i in range(len(padded) - k + 1)}
+
+
+class KGramIndex:
+    """
+    This class is a character k-gram index of the vocabulary. For every k-gram of `$word$`, it keeps the sorted term
+    ids of the words that contain it. A wildcard pattern is resolved by intersecting the lists of the k-grams of its
+    literal parts, then checking the remaining candidates with the whole pattern. The same lists give the candidates
+    for spell correction, because a word with a few edits still shares most of its k-grams.
+    ...
+    Attributes:
+    ----------
+    words: Sequence[str]
+        the vocabulary. term ids are indexes in it.
+    k: int
+        length of the grams, 2 for bigrams and 3 for trigrams
+    grams: dict
+        {gram: array of sorted term ids}
+    checked: int
+        number of words whose distance was computed by the last nearest
+
+    Methods:
+    -------
+    Methods defined here:
+        __init__(self, words, k=2):
+            build the index of the vocabulary.
+        add(self, term_id):
+            add the grams of words[term_id]. term ids should be added in increasing order to keep the lists sorted.
+        pattern_grams(self, pattern):
+            return the k-grams of the literal parts of a wildcard pattern.
+        wildcard_candidates(self, pattern):
+            return the sorted term ids of the words that have every k-gram of the pattern, or None if the pattern has
+            no k-gram and every word is a candidate.
+        nearest(self, word):
+            return the term id and the distance of the nearest word, the same one as scanning the whole vocabulary.
+    """
+
+    def __init__(self, words, k=2):
+        self.words = words
+        self.k = k
+        self.grams = {}
+        self.checked = 0
+        for term_id in range(len(words)):
+            self.add(term_id)
+
+    def add(self, term_id):
+        for gram in word_grams(self.words[term_id], self.k):
+            postings = self.grams.get(gram)
+            if postings is None:
+                postings = self.grams[gram] = array('i')
+            postings.append(term_id)
+
+    def pattern_grams(self, pattern):
+        grams = set()
+        padded = '$' + pattern + '$'
+        for part in padded.replace('?', '*').split('*'):
+            grams.update(part[i:i + self.k] for i in range(len(part) - self.k + 1))
+        return grams
+
+    def wildcard_candidates(self, pattern):
+        grams = self.pattern_grams(pattern)
+        if not grams:
+            return None
+        # start from the shortest list, so the intermediate results stay small
+        lists = sorted((self.grams.get(gram, EMPTY) for gram in grams), key=len)
+        result = lists[0]
+        for postings in lists[1:]:
+            if not result:
+                break
+            result = intersect_sorted(result, postings)
+        return list(result)
+
+    def nearest(self, word):
+        """
+        One edit changes at most k grams of a word, so a word that shares `shared` grams with the query is at least
+        ceil((len(query grams) - shared) / k) edits away. The candidates are checked in order of this lower bound, and
+        the search stops when the bound is more than the best distance found. The words that share no gram are only
+        checked if the best distance is not below their bound.
+        """
+        query_grams = word_grams(word, self.k)
+        shared = {}
+        for gram in query_grams:
+            for term_id in self.grams.get(gram, EMPTY):
+                shared[term_id] = shared.get(term_id, 0) + 1
+
+        def lower_bound(count):
+            return math.ceil((len(query_grams) - count) / self.k)
+
+        best_idx, best_dist = -1, math.inf
+        checked = 0
+        for bound, term_id in sorted((lower_bound(count), term_id) for term_id, count in shared.items()):
+            if bound > best_dist:
+                break
+            best_idx, best_dist = self._check(term_id, word, best_idx, best_dist)
+            checked += 1
+        if best_dist >= lower_bound(0):
+            checked += len(self.words) - len(shared)
+            for term_id in range(len(self.words)):
+                if term_id not in shared:
+                    best_idx, best_dist = self._check(term_id, word, best_idx, best_dist)
+        self.checked = checked
+        return best_idx, best_dist
+
+    def _check(self, term_id, word, best_idx, best_dist):
+        """
+        compare words[term_id] with the best word so far. on equal distance, the smaller term id wins.
+        """
+        bound = len(word) + len(self.words[term_id]) if best_dist == math.inf else best_dist
+        dist = bounded_edit_distance(self.words[term_id], word, bound)
+        if dist < best_dist or (dist == best_dist and term_id < best_idx):
+            return term_id, dist
+        return best_idx, best_dist
@@ -0,0 +1,221 @@
+"""
+A sorted term dictionary stored with front coding. The terms are cut into blocks of BLOCK_SIZE. The first term of a
+block is stored whole, and every other term is stored as the length of the prefix it shares with the term before it and
+the rest of its bytes:
+
+    block:  varint(len(head)) head  (varint(shared) varint(len(suffix)) suffix) * (BLOCK_SIZE - 1)
+
+Sorted terms share long prefixes, so the blob is a fraction of the size of the terms, and only one offset is kept per
+block instead of one per term. A term is found by a binary search over the heads of the blocks, then a scan of one
+block, and its term id is its index in sorted order. utf-8 bytes sort in the same order as python strings, so the
+comparisons are done on the encoded bytes.
+"""
+from array import array
+from bisect import bisect_right
+
+# a larger block compresses better but scans more terms per lookup
+BLOCK_SIZE = 8
+
+
+def encode_varint(n):
+    """
+    return the bytes of a non-negative integer, 7 bits per byte, lowest bits first. the high bit of a byte is set if
+    more bytes follow.
+    """
+    out = bytearray()
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def decode_varint(buffer, pos):
+    """
+    read a varint from buffer at pos.
+    :return:
+        the integer and the position after it
+    """
+    n = shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _shared_prefix(first, second):
+    n = min(len(first), len(second))
+    i = 0
+    while i < n and first[i] == second[i]:
+        i += 1
+    return i
+
+
+class FrontCodedLexicon:
+    """
+    This class is a read-only sequence of sorted terms, front coded in blocks, with the lookup of the term id of a
+    term. Terms are appended in sorted order, or the arrays of a saved lexicon are given, as memoryviews of a mapped
+    file for example.
+    ...
+    Attributes:
+    -----------
+    block_size: int
+        number of terms of a block
+    n_terms: int
+        number of terms
+    block_offsets: array
+        the b-th block starts at blob[block_offsets[b]]. it can also be a memoryview.
+    blob: bytearray
+        the encoded blocks. it can also be a memoryview.
+
+    Methods
+    -------
+    Methods defined here:
+        append(self, word):
+            add a word after the last one. words should be appended in sorted order, without repeats.
+        term_id(self, word):
+            return the term id of a word, or -1 if it is not in the lexicon. O(log V) comparisons of block heads and a
+            scan of one block.
+        heads(self):
+            return the encoded first term of every block, which are kept after the first lookup.
+        lower_bound(self, word):
+            return the term id of the first term that is not smaller than word.
+        prefix_range(self, prefix):
+            return (low, high) so that the term ids of all terms that start with prefix are range(low, high).
+        __getitem__(self, term_id):
+            return the term of a term id. the last decoded block is kept, so reading the terms in order decodes every
+            block once.
+    """
+
+    def __init__(self, words=(), block_size=BLOCK_SIZE, block_offsets=None, blob=None, n_terms=0):
+        self.block_size = block_size
+        self.n_terms = n_terms
+        self.block_offsets = array('q') if block_offsets is None else block_offsets
+        self.blob = bytearray() if blob is None else blob
+        self._last = None
+        self._cached = (-1, None)
+        self._heads = None
+        for word in words:
+            self.append(word)
+
+    def append(self, word):
+        encoded = word.encode('utf-8')
+        if self.n_terms % self.block_size == 0:
+            if self._last is not None and encoded <= self._last:
+                raise Exception(f"Terms should be appended in sorted order, but {word!r} is after {self[-1]!r}")
+            self.block_offsets.append(len(self.blob))
+            self.blob += encode_varint(len(encoded)) + encoded
+        else:
+            if encoded <= self._last:
+                raise Exception(f"Terms should be appended in sorted order, but {word!r} is after {self[-1]!r}")
+            shared = _shared_prefix(self._last, encoded)
+            self.blob += encode_varint(shared) + encode_varint(len(encoded) - shared) + encoded[shared:]
+        self._last = encoded
+        self.n_terms += 1
+        self._cached = (-1, None)
+        self._heads = None
+
+    @property
+    def n_blocks(self):
+        return (self.n_terms + self.block_size - 1) // self.block_size
+
+    def heads(self):
+        """
+        return the first term of every block, encoded. they are decoded on the first lookup and kept, which is one term
+        per block, so the binary search compares bytes objects without decoding anything.
+        """
+        if self._heads is None:
+            blob = self.blob
+            heads = []
+            for offset in self.block_offsets[:self.n_blocks]:
+                length, pos = decode_varint(blob, offset)
+                heads.append(bytes(blob[pos:pos + length]))
+            self._heads = heads
+        return self._heads
+
+    def _block(self, b):
+        """
+        return the encoded terms of the b-th block.
+        """
+        cached_b, terms = self._cached
+        if cached_b == b:
+            return terms
+        blob = self.blob
+        length, pos = decode_varint(blob, self.block_offsets[b])
+        term = bytes(blob[pos:pos + length])
+        pos += length
+        terms = [term]
+        for _ in range(min(self.block_size, self.n_terms - b * self.block_size) - 1):
+            shared, pos = decode_varint(blob, pos)
+            length, pos = decode_varint(blob, pos)
+            term = term[:shared] + bytes(blob[pos:pos + length])
+            pos += length
+            terms.append(term)
+        self._cached = (b, terms)
+        return terms
+
+    def __len__(self):
+        return self.n_terms
+
+    def __getitem__(self, term_id):
+        if term_id < 0:
+            term_id += self.n_terms
+        if not 0 <= term_id < self.n_terms:
+            raise IndexError("lexicon index out of range")
+        b, i = divmod(term_id, self.block_size)
+        return str(self._block(b)[i], 'utf-8')
+
+    def __iter__(self):
+        for b in range(self.n_blocks):
+            for term in self._block(b):
+                yield str(term, 'utf-8')
+
+    def _lower_bound(self, encoded):
+        """
+        return the term id of the first term that is not smaller than encoded, and that term, or None if there is none.
+        """
+        # the last block whose head is not larger than the term, then the terms of it are decoded until one is not
+        # smaller
+        b = bisect_right(self.heads(), encoded) - 1
+        if b < 0:
+            return 0, self._heads[0] if self._heads else None
+        blob = self.blob
+        length, pos = decode_varint(blob, self.block_offsets[b])
+        term = bytes(blob[pos:pos + length])
+        pos += length
+        term_id = b * self.block_size
+        end = min(term_id + self.block_size, self.n_terms)
+        while term < encoded:
+            term_id += 1
+            if term_id == end:
+                return term_id, self._heads[b + 1] if b + 1 < len(self._heads) else None
+            # lengths are almost always one byte
+            shared = blob[pos]
+            if shared < 0x80:
+                pos += 1
+            else:
+                shared, pos = decode_varint(blob, pos)
+            length = blob[pos]
+            if length < 0x80:
+                pos += 1
+            else:
+                length, pos = decode_varint(blob, pos)
+            term = term[:shared] + bytes(blob[pos:pos + length])
+            pos += length
+        return term_id, term
+
+    def lower_bound(self, word):
+        return self._lower_bound(word.encode('utf-8'))[0]
+
+    def term_id(self, word):
+        encoded = word.encode('utf-8')
+        term_id, term = self._lower_bound(encoded)
+        return term_id if term == encoded else -1
+
+    def prefix_range(self, prefix):
+        encoded = prefix.encode('utf-8')
+        # no utf-8 text has the byte 0xff, so every term that starts with the prefix is smaller than prefix + 0xff
+        return self._lower_bound(encoded)[0], self._lower_bound(encoded + b'\xff')[0]
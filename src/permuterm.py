@@ -0,0 +1,85 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+# an entry is (term_id << SHIFT_BITS) | shift, so words can be up to 2 ** 16 - 2 characters long
+SHIFT_BITS = 16
+SHIFT_MASK = (1 << SHIFT_BITS) - 1
+
+
+class PermutermIndex:
+    """
+    This class is a permuterm index stored as a sorted array of rotations. Instead of one TrieNode per character of
+    every rotation, a rotation of `word$` is a single integer, (term_id << 16) | shift, and the array is sorted by the
+    rotation strings. A prefix query is two binary searches, and the rotation strings are only built for the entries
+    that the search looks at.
+    ...
+    Attributes:
+    ----------
+    words: Sequence[str]
+        the vocabulary. term ids of the entries are indexes in it.
+    entries: array
+        sorted rotations as int64 entries. it can also be a memoryview of a mapped file.
+
+    Methods:
+    -------
+    Methods defined here:
+        __init__(self, words, entries=None):
+            build the sorted entries of all rotations of the words, or use the given entries if they were built before.
+        rotation(self, entry):
+            return the rotation string of an entry.
+        add(self, term_id):
+            insert the rotations of words[term_id] at their sorted places. a mapped index is copied into memory first.
+        iter_query(self, x:str):
+            yield all rotations that start with x, sorted.
+        iter_term_ids(self, x:str):
+            yield the term ids of all rotations that start with x, in the same order, without building the rotations.
+        query(self, x:str, limit=None):
+            return all rotations that start with x, sorted, at most limit of them. it returns the same list as
+            Trie.query.
+    """
+
+    def __init__(self, words, entries=None):
+        self.words = words
+        if entries is None:
+            entries = array('q', [(term_id << SHIFT_BITS) | shift
+                                  for term_id, word in enumerate(words) for shift in range(len(word) + 1)])
+            entries = array('q', sorted(entries, key=self.rotation))
+        self.entries = entries
+
+    def rotation(self, entry):
+        word = self.words[entry >> SHIFT_BITS] + '$'
+        shift = entry & SHIFT_MASK
+        return word[shift:] + word[:shift]
+
+    def add(self, term_id):
+        if not isinstance(self.entries, array):
+            self.entries = array('q', self.entries)
+        word = self.words[term_id] + '$'
+        for shift in range(len(word)):
+            position = bisect_left(self.entries, word[shift:] + word[:shift], key=self.rotation)
+            self.entries.insert(position, (term_id << SHIFT_BITS) | shift)
+
+    def _range(self, x):
+        n = len(x)
+
+        def key(entry):
+            return self.rotation(entry)[:n]
+
+        low = bisect_left(self.entries, x, key=key)
+        return low, bisect_right(self.entries, x, lo=low, key=key)
+
+    def iter_query(self, x: str):
+        low, high = self._range(x)
+        for i in range(low, high):
+            yield self.rotation(self.entries[i])
+
+    def iter_term_ids(self, x: str):
+        low, high = self._range(x)
+        for i in range(low, high):
+            yield self.entries[i] >> SHIFT_BITS
+
+    def query(self, x: str, limit=None):
+        low, high = self._range(x)
+        if limit is not None:
+            high = min(high, low + limit)
+        return [self.rotation(entry) for entry in self.entries[low:high]]
@@ -1,10 +1,41 @@
 import os
 import re
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+import sys
 
-# Initialize NLTK stop words
-stop_words = set(stopwords.words('english'))
+# the english stop words of NLTK, so they do not have to be downloaded
+stop_words = frozenset((
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', "you're", "you've", "you'll", "you'd", 'your',
+    'yours', 'yourself', 'yourselves', 'he', 'him', 'his', 'himself', 'she', "she's", 'her', 'hers', 'herself', 'it',
+    "it's", 'its', 'itself', 'they', 'them', 'their', 'theirs', 'themselves', 'what', 'which', 'who', 'whom', 'this',
+    'that', "that'll", 'these', 'those', 'am', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had',
+    'having', 'do', 'does', 'did', 'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as', 'until',
+    'while', 'of', 'at', 'by', 'for', 'with', 'about', 'against', 'between', 'into', 'through', 'during', 'before',
+    'after', 'above', 'below', 'to', 'from', 'up', 'down', 'in', 'out', 'on', 'off', 'over', 'under', 'again',
+    'further', 'then', 'once', 'here', 'there', 'when', 'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few',
+    'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so', 'than', 'too', 'very',
+    's', 't', 'can', 'will', 'just', 'don', "don't", 'should', "should've", 'now', 'd', 'll', 'm', 'o', 're', 've', 'y',
+    'ain', 'aren', "aren't", 'couldn', "couldn't", 'didn', "didn't", 'doesn', "doesn't", 'hadn', "hadn't", 'hasn',
+    "hasn't", 'haven', "haven't", 'isn', "isn't", 'ma', 'mightn', "mightn't", 'mustn', "mustn't", 'needn', "needn't",
+    'shan', "shan't", 'shouldn', "shouldn't", 'wasn', "wasn't", 'weren', "weren't", 'won', "won't", 'wouldn',
+    "wouldn't",
+))
+
+PUNCTUATION = re.compile(r'[^\w\s]')
+# the contractions that the word tokenizer of NLTK splits, the CONTRACTIONS2 and CONTRACTIONS3 of its
+# MacIntyreContractions. after the punctuation is removed only the ones without an apostrophe are left, and they are
+# split even though there is no apostrophe.
+CONTRACTIONS = {
+    'cannot': ('can', 'not'),
+    "d'ye": ('d', "'ye"),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    "more'n": ('more', "'n"),
+    'wanna': ('wan', 'na'),
+    "'tis": ("'t", 'is'),
+    "'twas": ("'t", 'was'),
+}
 
 
 def read_documents(doc_folder):
@@ -21,27 +52,66 @@ def read_documents(doc_folder):
     return documents
 
 
-def preprocess_text(text):
+def iter_documents(doc_folder, encoding='utf-8', fallback='cp1252'):
+    """
+    Yields the content of the text files of the specified directory one by one, in the same order as
+    read_documents, so only one document is in memory at a time. Some files of dataset/raw are not utf-8, a file that
+    can not be decoded with encoding is decoded with fallback instead (cp1252 decodes nearly any bytes). With fallback
+    None, it raises UnicodeDecodeError.
+    """
+    for doc_file in os.listdir(doc_folder):
+        if doc_file.endswith('.txt'):
+            with open(os.path.join(doc_folder, doc_file), 'rb') as file:
+                content = file.read()
+            try:
+                text = content.decode(encoding)
+            except UnicodeDecodeError:
+                if fallback is None:
+                    raise
+                text = content.decode(fallback)
+            yield text
+
+
+def regex_tokenize(text):
+    """
+    Splits a text without punctuation into tokens. It gives the same tokens as NLTK word_tokenize on such text, without
+    its sentence splitter and its dozens of regular expressions.
+    """
+    tokens = text.split()
+    if CONTRACTIONS.keys().isdisjoint(tokens):
+        return tokens
+    return [part for token in tokens for part in CONTRACTIONS.get(token, (token,))]
+
+
+def nltk_tokenize(text):
+    """
+    Splits a text into tokens with NLTK word_tokenize. NLTK is only imported when it is used. The text has no
+    punctuation, so it is one sentence and the Punkt sentence splitter is not needed.
+    """
+    from nltk.tokenize import word_tokenize
+    return word_tokenize(text, preserve_line=True)
+
+
+def preprocess_text(text, tokenizer=regex_tokenize):
     """
-    Preprocesses the text by tokenizing, converting to lowercase, removing punctuation,
-    and filtering out stop words.
+    Preprocesses the text by converting to lowercase, removing punctuation, tokenizing,
+    and filtering out stop words. The tokens are interned, so all occurrences of a word
+    share one string.
     """
-    # Convert to lowercase
-    text = text.lower()
-    # Remove punctuation
-    text = re.sub(r'[^\w\s]', '', text)
+    # Convert to lowercase and remove punctuation
+    text = PUNCTUATION.sub('', text.lower())
     # Tokenize text
-    tokens = word_tokenize(text)
+    tokens = tokenizer(text)
     # Filter out stop words
-    filtered_tokens = [token for token in tokens if token not in stop_words]
-    return filtered_tokens
+    intern = sys.intern
+    return [intern(token) for token in tokens if token not in stop_words]
 
 
-def preprocess_documents(documents):
+def preprocess_documents(documents, tokenizer=regex_tokenize):
     """
     Apply text preprocessing to each document in the dictionary.
     """
     preprocessed_docs = []
     for doc_id, content in enumerate(documents):
-        preprocessed_docs.append(preprocess_text(content))
+        preprocessed_docs.append(preprocess_text(content, tokenizer))
     return preprocessed_docs
@@ -0,0 +1,534 @@
+"""
+Profiling of queries. A Profiler attached to a QueryProcessor times every stage of its queries: the lookups of words
+in the lexicon, the spell corrections, the wildcard expansions, the evaluation of the nodes of the query tree with
+their set operations, and the BM25 ranking. It also counts what every stage reads, like the words a spell correction
+compared, the candidates of a wildcard and the postings of the resolved tokens.
+
+    profiler = Profiler().attach(processor)
+    processor.search('(exa*le or sampel) and not content')
+    print(profiler.last_trace.report())
+    profiler.to_json(), profiler.to_prometheus()
+    profiler.detach()
+
+Every query makes a Trace, the tree of its stages with their times, and the time and the counts of every stage are
+added to histograms, which are exported as JSON or in the text format of Prometheus. The stages are timed by wrapping
+the methods of the processor and of its index on the instances, so a processor that no profiler is attached to runs
+its own methods and costs nothing more.
+"""
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+
+from src.query_parser import Term
+
+# upper bounds of the buckets of the time histograms, in seconds, from 10 microseconds to 10 seconds
+SECONDS_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+# upper bounds of the buckets of the count histograms, like the candidates of a wildcard, from 1 to 4 ** 12 (16M)
+COUNT_BUCKETS = tuple(4 ** i for i in range(13))
+# a trace keeps this many spans, the stages after them are only counted in the histograms
+MAX_SPANS = 1000
+
+
+def spell_candidates(index):
+    """
+    return the number of words whose edit distance was computed by the last spell correction of an index.
+    """
+    if index.spell_backend == 'bktree':
+        return index.bk_tree.checked
+    if index.spell_backend == 'kgram':
+        return index.get_kgram_index().checked
+    return len(index.vocabulary())
+
+
+class Histogram:
+    """
+    This class is a histogram with fixed buckets, like the histograms of Prometheus. bucket i counts the values that
+    are at most bounds[i] and more than bounds[i - 1], and the last bucket counts the values above all bounds.
+    ...
+    Attributes:
+    -----------
+    bounds: tuple
+        the sorted upper bounds of the buckets
+    counts: List[int]
+        number of values of every bucket, one more than bounds
+    count: int
+        number of values
+    sum: float
+        sum of the values
+
+    Methods
+    -------
+    Methods defined here:
+        observe(self, value):
+            add a value.
+        quantile(self, q):
+            return the upper bound of the bucket of the q-quantile, an estimate of it.
+        cumulative(self):
+            return the number of values at most every bound.
+        to_dict(self):
+            return the count, the sum and the cumulative counts of the buckets.
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'sum')
+
+    def __init__(self, bounds=SECONDS_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        return the upper bound of the bucket that has the q-quantile of the values, or None if there are none. a value
+        above all bounds is estimated by the largest bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.bounds[-1]
+
+    def cumulative(self):
+        """
+        return [(bound, number of values at most bound)], ending with ('+Inf', count).
+        """
+        result, seen = [], 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            seen += count
+            result.append((bound, seen))
+        return result
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'buckets': self.cumulative()}
+
+
+class Span:
+    """
+    This class is a call of a stage in a Trace.
+    ...
+    Attributes:
+    -----------
+    stage: str
+        name of the stage, like 'evaluate' or 'spell_correction'
+    depth: int
+        number of stages the call is nested in, 0 for the query itself
+    start: float
+        seconds from the start of the trace to the call
+    seconds: float
+        time of the call, with the stages it called
+    children: float
+        time of the stages it called
+    details: dict
+        counts of what the call read, like {'candidates': 1200}, or None if there are none
+    """
+    __slots__ = ('stage', 'depth', 'start', 'seconds', 'children', 'details')
+
+    def __init__(self, stage, depth, start):
+        self.stage = stage
+        self.depth = depth
+        self.start = start
+        self.seconds = 0
+        self.children = 0
+        self.details = None
+
+    @property
+    def self_seconds(self):
+        return self.seconds - self.children
+
+    def to_dict(self):
+        return {'stage': self.stage, 'depth': self.depth, 'start': self.start, 'seconds': self.seconds,
+                'self_seconds': self.self_seconds, 'details': self.details or {}}
+
+
+class Trace:
+    """
+    This class is the profile of one query, the calls of its stages in the order they started. the spans of a stage
+    that called other stages are followed by their spans, one level deeper.
+    ...
+    Attributes:
+    -----------
+    kind: str
+        the method of the query, like 'search' or 'ranked_search'
+    query: str
+        the query, or None if the method was not given one string
+    seconds: float
+        time of the query
+    spans: List[Span]
+        calls of the stages, the first one is the query itself
+    dropped: int
+        number of calls after MAX_SPANS, which are not in spans
+
+    Methods
+    -------
+    Methods defined here:
+        stages(self):
+            return {stage: {'calls', 'seconds', 'self_seconds', details...}}, the totals of every stage.
+        report(self):
+            return the spans as an indented text table.
+        to_dict(self):
+            return the trace as a dictionary for JSON.
+    """
+
+    def __init__(self, kind, query, start):
+        self.kind = kind
+        self.query = query
+        self.start = start
+        self.seconds = 0
+        self.spans = []
+        self.dropped = 0
+
+    def stages(self):
+        """
+        return the totals of the spans of every stage. the self times of all stages add up to the time of the query,
+        the inclusive times do not when a stage calls itself, like evaluate does for the nodes of the tree.
+        """
+        result = {}
+        for span in self.spans:
+            totals = result.setdefault(span.stage, {'calls': 0, 'seconds': 0, 'self_seconds': 0})
+            totals['calls'] += 1
+            totals['seconds'] += span.seconds
+            totals['self_seconds'] += span.self_seconds
+            for item, value in (span.details or {}).items():
+                totals[item] = totals.get(item, 0) + value
+        return result
+
+    def report(self):
+        lines = [f"{self.kind} {self.query!r}: {self.seconds * 1000:.3f} ms",
+                 f"{'stage':<40} {'ms':>9} {'self ms':>9}  details"]
+        for span in self.spans:
+            details = ' '.join(f'{item}={value}' for item, value in (span.details or {}).items())
+            lines.append(f"{'  ' * span.depth + span.stage:<40} {span.seconds * 1000:9.3f} "
+                         f"{span.self_seconds * 1000:9.3f}  {details}")
+        if self.dropped:
+            lines.append(f"... {self.dropped} more calls")
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {'kind': self.kind, 'query': self.query, 'seconds': self.seconds, 'dropped': self.dropped,
+                'stages': self.stages(), 'spans': [span.to_dict() for span in self.spans]}
+
+
+class Profiler:
+    """
+    This class profiles the queries of QueryProcessor objects. attach replaces the methods of the stages with timed
+    ones on the processor and its index, and detach puts the methods of their classes back. the outermost timed call,
+    usually search, ranked_search or search_many, starts a Trace, and the calls it makes are its spans.
+    The stages are:
+        search, ranked_search, search_many: the query, its own time is parsing it and making the result set.
+        resolve_term, resolve_wildcard: the tokens of a word (spell corrected if needed) or of a wildcard, with the
+            number of tokens and of their postings. resolving a word that was resolved in the query is not a stage.
+        wildcard_candidates: counted in the stage that expands the wildcard, the term ids checked with its pattern. it
+            is only counted in sampled queries, like the other stages.
+        get_token_index, spell_correction: the lookup of a word in the lexicon, and the correction of a word that is
+            not there, with the number of words whose distance was computed.
+        evaluate, evaluate_docset: a node of the query tree, its own time is the set operations of the node.
+        get_bm25: the BM25 scorer, which counts the lengths of the documents the first time.
+        rank: BM25 scoring of ranked_search, with the number of postings of the scored tokens.
+    The profiler is not thread safe, and the stages run by the workers of search_many are not seen.
+    ...
+    Attributes:
+    -----------
+    sample: int
+        one query out of sample is profiled
+    traces: deque
+        the last max_traces traces of the profiled queries
+    query_seconds: dict
+        {kind: Histogram} of the times of the queries
+    stage_seconds: dict
+        {stage: Histogram} of the self times of the calls of the stages
+    stage_items: dict
+        {(stage, item): Histogram} of the counts of the stages, like ('spell_correction', 'candidates')
+    queries: int
+        number of queries seen while sampling, to pick the sampled ones
+    skipping: int
+        number of running calls of a query that is not sampled
+    stack: List[Span]
+        the spans that are running, the innermost last
+    trace: Trace
+        the trace of the running query, or None
+    wrapped: List
+        (object, name) of every method that is replaced
+
+    Methods
+    -------
+    Methods defined here:
+        attach(self, processor):
+            time the stages of a QueryProcessor and of its index, and return the profiler.
+        detach(self):
+            restore the methods of everything attached.
+        skip(self):
+            whether a call is not timed, because its query is not sampled.
+        record(self, stage, item, value):
+            add a count of a stage to its histogram and to the running span.
+        last_trace:
+            the trace of the last query, or None.
+        reset(self):
+            drop the traces and the histograms.
+        to_dict(self), to_json(self, indent=None):
+            the histograms and the last trace, as a dictionary or as JSON.
+        to_prometheus(self, prefix='ir_query'):
+            the histograms in the text format of Prometheus.
+    """
+
+    def __init__(self, max_traces=100, sample=1):
+        """
+        :param max_traces:
+            number of traces that are kept
+        :param sample:
+            profile one query out of `sample`. the other queries only go through the wrapped methods, which costs much
+            less than timing them.
+        """
+        if sample < 1:
+            raise Exception("sample should be at least 1")
+        self.sample = sample
+        self.queries = 0
+        self.skipping = 0
+        self.traces = deque(maxlen=max_traces)
+        self.query_seconds = {}
+        self.stage_seconds = {}
+        self.stage_items = {}
+        self.stack = []
+        self.trace = None
+        self.wrapped = []
+
+    def attach(self, processor):
+        """
+        replace the methods of the stages of a processor and of its indexing_model by timed ones. the methods are set
+        on the instances, so other processors of the same classes are not timed.
+        :return:
+            the profiler
+        """
+        for name in ('search', 'ranked_search', 'search_many', 'evaluate', 'evaluate_docset'):
+            self.wrap(processor, name, name, self.describe_evaluate if name == 'evaluate' else None)
+        self.wrap_resolve(processor)
+        self.wrap_wildcard_candidates(processor)
+
+        index = processor.indexing_model
+        self.wrap(index, 'get_token_index', 'get_token_index')
+        self.wrap(index, 'spell_correction', 'spell_correction',
+                  lambda stage, args, result: self.record(stage, 'candidates', spell_candidates(index)))
+        get_bm25 = index.get_bm25
+
+        @wraps(get_bm25)
+        def timed_get_bm25():
+            # the BM25 object is made again when the index changes, so its methods are wrapped when it is fetched
+            if self.skip():
+                bm25 = self.untimed(get_bm25, (), {})
+            else:
+                self.enter('get_bm25', ())
+                try:
+                    bm25 = get_bm25()
+                finally:
+                    self.exit()
+            if 'top_k' not in vars(bm25):
+                self.wrap(bm25, 'top_k', 'rank', self.describe_rank)
+                self.wrap(bm25, 'score_all', 'rank', self.describe_rank)
+            return bm25
+
+        self.replace(index, 'get_bm25', timed_get_bm25)
+        return self
+
+    def detach(self):
+        for obj, name in self.wrapped:
+            vars(obj).pop(name, None)
+        self.wrapped = []
+
+    def replace(self, obj, name, function):
+        setattr(obj, name, function)
+        self.wrapped.append((obj, name))
+
+    def wrap(self, obj, name, stage, describe=None):
+        """
+        replace the method `name` of obj by a timed one, a span of `stage`.
+        :param describe:
+            function (span stage, arguments, result) that records the counts of a call, or None
+        """
+        method = getattr(obj, name)
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            if self.skip():
+                return self.untimed(method, args, kwargs)
+            self.enter(stage, args)
+            try:
+                result = method(*args, **kwargs)
+                if describe is not None:
+                    describe(stage, args, result)
+                return result
+            finally:
+                self.exit()
+
+        self.replace(obj, name, timed)
+
+    def wrap_resolve(self, processor):
+        resolve = processor.resolve
+
+        @wraps(resolve)
+        def timed_resolve(node, resolved):
+            key = processor.resolve_key(node)
+            if key in resolved:
+                return resolved[key]
+            if self.skip():
+                return self.untimed(resolve, (node, resolved), {})
+            stage = 'resolve_term' if isinstance(node, Term) else 'resolve_wildcard'
+            self.enter(stage, (key,))
+            try:
+                tokens = resolve(node, resolved)
+                self.record(stage, 'tokens', len(tokens))
+                self.record(stage, 'postings', sum(len(token.doc_ids) for token in tokens))
+                return tokens
+            finally:
+                self.exit()
+
+        self.replace(processor, 'resolve', timed_resolve)
+
+    def wrap_wildcard_candidates(self, processor):
+        wildcard_candidates = processor.wildcard_candidates
+
+        def counted(candidates, trace):
+            n = 0
+            try:
+                for term_id in candidates:
+                    n += 1
+                    yield term_id
+            finally:
+                # the candidates can be read after their query ended, they only count in the trace of their query
+                if self.trace is trace:
+                    self.record('wildcard_candidates', 'candidates', n)
+
+        @wraps(wildcard_candidates)
+        def counted_wildcard_candidates(token):
+            candidates, matcher = wildcard_candidates(token)
+            # only the wildcards of a sampled query are counted
+            if self.skipping or self.trace is None:
+                return candidates, matcher
+            return counted(candidates, self.trace), matcher
+
+        self.replace(processor, 'wildcard_candidates', counted_wildcard_candidates)
+
+    def describe_evaluate(self, stage, args, result):
+        self.record(stage, 'docs', len(result))
+
+    def describe_rank(self, stage, args, result):
+        self.record(stage, 'postings', sum(len(token.doc_ids) for token in args[0]))
+
+    def skip(self):
+        """
+        return True if a call is part of a query that is not sampled, or starts one.
+        """
+        if self.skipping:
+            return True
+        if self.trace is None and self.sample > 1:
+            self.queries += 1
+            return self.queries % self.sample != 0
+        return False
+
+    def untimed(self, method, args, kwargs):
+        # the calls that the method makes are skipped too
+        self.skipping += 1
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self.skipping -= 1
+
+    def enter(self, stage, args):
+        now = time.perf_counter()
+        if self.trace is None:
+            self.trace = Trace(stage, args[0] if args and isinstance(args[0], str) else None, now)
+        span = Span(stage, len(self.stack), now - self.trace.start)
+        self.stack.append(span)
+        if len(self.trace.spans) < MAX_SPANS:
+            self.trace.spans.append(span)
+        else:
+            self.trace.dropped += 1
+
+    def exit(self):
+        span = self.stack.pop()
+        span.seconds = time.perf_counter() - self.trace.start - span.start
+        histogram = self.stage_seconds.get(span.stage)
+        if histogram is None:
+            histogram = self.stage_seconds[span.stage] = Histogram(SECONDS_BUCKETS)
+        histogram.observe(span.self_seconds)
+        if self.stack:
+            self.stack[-1].children += span.seconds
+            return
+        trace, self.trace = self.trace, None
+        trace.seconds = span.seconds
+        self.traces.append(trace)
+        histogram = self.query_seconds.get(trace.kind)
+        if histogram is None:
+            histogram = self.query_seconds[trace.kind] = Histogram(SECONDS_BUCKETS)
+        histogram.observe(trace.seconds)
+
+    def record(self, stage, item, value):
+        """
+        add a count of a stage, like the candidates of a wildcard, to its histogram and to the details of the innermost
+        running span.
+        """
+        histogram = self.stage_items.get((stage, item))
+        if histogram is None:
+            histogram = self.stage_items[stage, item] = Histogram(COUNT_BUCKETS)
+        histogram.observe(value)
+        if self.stack:
+            span = self.stack[-1]
+            if span.details is None:
+                span.details = {}
+            span.details[item] = span.details.get(item, 0) + value
+
+    @property
+    def last_trace(self):
+        return self.traces[-1] if self.traces else None
+
+    def reset(self):
+        self.traces.clear()
+        self.query_seconds = {}
+        self.stage_seconds = {}
+        self.stage_items = {}
+
+    def to_dict(self):
+        return {
+            'queries': {kind: histogram.to_dict() for kind, histogram in self.query_seconds.items()},
+            'stages': {stage: histogram.to_dict() for stage, histogram in self.stage_seconds.items()},
+            'items': {f'{stage}.{item}': histogram.to_dict() for (stage, item), histogram in self.stage_items.items()},
+            'last_trace': self.last_trace.to_dict() if self.traces else None,
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self, prefix='ir_query'):
+        """
+        return the histograms in the text exposition format of Prometheus, as three histogram families:
+        <prefix>_seconds{kind} of the queries, <prefix>_stage_seconds{stage} of the self times of the stages, and
+        <prefix>_stage_items{stage, item} of their counts.
+        """
+        families = [
+            (f'{prefix}_seconds', 'time of the queries', {(('kind', kind),): histogram
+                                                          for kind, histogram in self.query_seconds.items()}),
+            (f'{prefix}_stage_seconds', 'time of the stages of the queries, without the stages they call',
+             {(('stage', stage),): histogram for stage, histogram in self.stage_seconds.items()}),
+            (f'{prefix}_stage_items', 'what the stages of the queries read, like candidates and postings',
+             {(('stage', stage), ('item', item)): histogram
+              for (stage, item), histogram in self.stage_items.items()}),
+        ]
+        lines = []
+        for name, description, histograms in families:
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+            for labels, histogram in sorted(histograms.items()):
+                text = ','.join(f'{label}="{value}"' for label, value in labels)
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{text},le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{{text}}} {histogram.sum}')
+                lines.append(f'{name}_count{{{text}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
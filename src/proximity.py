@@ -0,0 +1,94 @@
+"""
+Positional matching for NEAR/k and phrase queries. Everything here works on the posting lists of tokens: the doc ids of
+the tokens are intersected first, then the sorted position lists of the common documents are merged. The text of the
+documents is never read.
+"""
+from src.utils import gallop, gallop_intersect
+
+
+def common_postings(tokens):
+    """
+    yield the documents that contain all tokens, walking the rarest token and galloping in the doc ids of the others.
+    :param tokens:
+        list of Token
+    :return:
+        iterator of (doc_idx, [i_0, i_1, ...]) where i_t is the index of the document in tokens[t].doc_ids
+    """
+    all_doc_ids = [token.doc_ids for token in tokens]
+    order = sorted(range(len(tokens)), key=lambda t: len(all_doc_ids[t]))
+    rarest, others = order[0], order[1:]
+    starts = [0] * len(tokens)
+    for i, doc_idx in enumerate(all_doc_ids[rarest]):
+        indexes = [0] * len(tokens)
+        indexes[rarest] = i
+        for t in others:
+            doc_ids = all_doc_ids[t]
+            starts[t] = gallop(doc_ids, doc_idx, starts[t])
+            if starts[t] == len(doc_ids):
+                return
+            if doc_ids[starts[t]] != doc_idx:
+                break
+            indexes[t] = starts[t]
+        else:
+            yield doc_idx, indexes
+
+
+def within_distance(first, second, distance):
+    """
+    return True if some position of first and some position of second are at most `distance` apart, in either order.
+    the closest pair of two sorted lists is next to each other in their merged order, so one merge walk is enough.
+    :param first:
+        sorted positions of the first word in a document
+    :param second:
+        sorted positions of the second word in the same document
+    :param distance:
+        the largest allowed distance
+    :return:
+        bool
+    """
+    i, j = 0, 0
+    n, m = len(first), len(second)
+    while i < n and j < m:
+        gap = first[i] - second[j]
+        if gap and -distance <= gap <= distance:
+            return True
+        if gap <= 0:
+            i += 1
+        else:
+            j += 1
+    return False
+
+
+def phrase_starts(position_lists):
+    """
+    return the positions where the words occur one right after the other, in the given order.
+    :param position_lists:
+        sorted positions of each word of the phrase in one document
+    :return:
+        sorted list of the positions of the first word of every occurrence of the phrase
+    """
+    starts = list(position_lists[0])
+    for offset in range(1, len(position_lists)):
+        if not starts:
+            break
+        shifted = gallop_intersect([position + offset for position in starts], position_lists[offset])
+        starts = [position - offset for position in shifted]
+    return starts
+
+
+def near_docs(first, second, distance):
+    """
+    return the sorted documents where the two tokens occur at most `distance` words apart.
+    """
+    return [doc_idx for doc_idx, (i, j) in common_postings([first, second])
+            if within_distance(first.doc_positions(i), second.doc_positions(j), distance)]
+
+
+def phrase_docs(tokens):
+    """
+    return the sorted documents where the tokens occur as a phrase, in the given order.
+    """
+    if len(tokens) == 1:
+        return list(tokens[0].doc_ids)
+    return [doc_idx for doc_idx, indexes in common_postings(tokens)
+            if phrase_starts([token.doc_positions(i) for token, i in zip(tokens, indexes)])]
@@ -0,0 +1,229 @@
+import re
+
+OPERATORS = ('and', 'or', 'not')
+# distance of a NEAR without /k
+DEFAULT_NEAR_DISTANCE = 3
+
+_TOKEN_PATTERN = re.compile(r'"[^"]*"?|\(|\)|[^\s()"]+')
+_NEAR_PATTERN = re.compile(r'near(?:/(\d+))?$')
+
+
+class Term:
+    """
+    a query word. if it is not in the index, it is spell corrected.
+    """
+
+    def __init__(self, word):
+        self.word = word
+
+    def __repr__(self):
+        return f'Term({self.word!r})'
+
+
+class Wildcard:
+    """
+    a query word with * or ?, it stands for the OR of all words that match it.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+
+    def __repr__(self):
+        return f'Wildcard({self.pattern!r})'
+
+
+class Phrase:
+    """
+    documents where the words occur one right after the other, in this order. it is written in double quotes.
+    """
+
+    def __init__(self, words):
+        self.words = words
+
+    def __repr__(self):
+        return f'Phrase({self.words!r})'
+
+
+class And:
+    """
+    documents that match all children.
+    """
+
+    def __init__(self, children):
+        self.children = children
+
+    def __repr__(self):
+        return f'And({self.children!r})'
+
+
+class Or:
+    """
+    documents that match any of the children.
+    """
+
+    def __init__(self, children):
+        self.children = children
+
+    def __repr__(self):
+        return f'Or({self.children!r})'
+
+
+class Not:
+    """
+    documents that do not match the child.
+    """
+
+    def __init__(self, child):
+        self.child = child
+
+    def __repr__(self):
+        return f'Not({self.child!r})'
+
+
+class Near:
+    """
+    documents where the two words occur at most `distance` words apart. left and right are Term or Wildcard nodes.
+    """
+
+    def __init__(self, left, right, distance):
+        self.left = left
+        self.right = right
+        self.distance = distance
+
+    def __repr__(self):
+        return f'Near({self.left!r}, {self.right!r}, {self.distance})'
+
+
+class QueryParser:
+    """
+    This class parses a boolean query into a tree of Term, Wildcard, And, Or, Not and Near nodes. The grammar, from the
+    lowest precedence to the highest, is:
+
+        query    := and_expr ('or' and_expr)*
+        and_expr := not_expr (['and'] not_expr)*        two operands without an operator mean AND
+        not_expr := 'not' not_expr | near_expr
+        near_expr:= primary ('near/k' primary)*          k is DEFAULT_NEAR_DISTANCE if it is not given
+        primary  := '(' query ')' | '"' word+ '"' | word
+
+    Operators are case-insensitive. A word that contains * or ? is a Wildcard, and words in double quotes are a Phrase.
+    ...
+    Attributes:
+    -----------
+    tokens: List[str]
+        the tokens of the query
+    pos: int
+        index of the next token
+
+    Methods
+    -------
+    Methods defined here:
+        parse(self):
+            parse the whole query and return the root node. raise an Exception if the query is not valid.
+    """
+
+    def __init__(self, query):
+        self.tokens = _TOKEN_PATTERN.findall(query)
+        self.pos = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise Exception("Query is empty")
+        node = self._or()
+        if self.pos != len(self.tokens):
+            raise Exception(f"Query is not valid: unexpected {self.tokens[self.pos]!r}")
+        return node
+
+    def _peek(self):
+        return self.tokens[self.pos].lower() if self.pos < len(self.tokens) else None
+
+    def _next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def _or(self):
+        children = [self._and()]
+        while self._peek() == 'or':
+            self._next()
+            children.append(self._and())
+        return children[0] if len(children) == 1 else Or(_flatten(Or, children))
+
+    def _and(self):
+        children = [self._not()]
+        while self._peek() is not None and self._peek() not in ('or', ')'):
+            if self._peek() == 'and':
+                self._next()
+            children.append(self._not())
+        return children[0] if len(children) == 1 else And(_flatten(And, children))
+
+    def _not(self):
+        if self._peek() == 'not':
+            self._next()
+            return Not(self._not())
+        return self._near()
+
+    def _near(self):
+        node = self._primary()
+        while self._peek() is not None and _NEAR_PATTERN.match(self._peek()):
+            distance = _NEAR_PATTERN.match(self._next().lower()).group(1)
+            right = self._primary()
+            if not isinstance(node, (Term, Wildcard)) or not isinstance(right, (Term, Wildcard)):
+                raise Exception("Query is not valid: NEAR works between two words")
+            node = Near(node, right, int(distance) if distance else DEFAULT_NEAR_DISTANCE)
+        return node
+
+    def _primary(self):
+        token = self._peek()
+        if token is None:
+            raise Exception("Query is not valid: it ends with an operator")
+        if token == '(':
+            self._next()
+            node = self._or()
+            if self._peek() != ')':
+                raise Exception("Query is not valid: missing ')'")
+            self._next()
+            return node
+        if token == ')' or token in OPERATORS or _NEAR_PATTERN.match(token):
+            raise Exception(f"Query is not valid: unexpected {self.tokens[self.pos]!r}")
+        word = self._next()
+        if word.startswith('"'):
+            return self._phrase(word)
+        if '*' in word or '?' in word:
+            return Wildcard(word)
+        return Term(word)
+
+    def _phrase(self, token):
+        if len(token) < 2 or not token.endswith('"'):
+            raise Exception("Query is not valid: missing '\"'")
+        words = token[1:-1].split()
+        if not words:
+            raise Exception("Query is not valid: empty phrase")
+        if any('*' in word or '?' in word for word in words):
+            raise Exception("Query is not valid: a phrase can not have wildcards")
+        if len(words) == 1:
+            return Term(words[0])
+        return Phrase(words)
+
+
+def _flatten(node_type, children):
+    """
+    merge the children of nested nodes of the same type, so a and (b and c) becomes one And of three children.
+    """
+    result = []
+    for child in children:
+        if type(child) is node_type:
+            result.extend(child.children)
+        else:
+            result.append(child)
+    return result
+
+
+def parse_query(query):
+    """
+    parse a boolean query into a tree of nodes. see QueryParser for the grammar.
+    :param query:
+        the query string
+    :return:
+        the root node
+    """
+    return QueryParser(query).parse()
@@ -1,4 +1,44 @@
-from src.utils import get_all_permutations
+import gc
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from src.cache import MISSING, LRUCache
+from src.permuterm import PermutermIndex
+from src.proximity import near_docs, phrase_docs
+from src.query_parser import And, Near, Not, Or, Phrase, Term, Wildcard, parse_query
+from src.segments import LiveIndex
+from src.storage import load_permuterm, save_permuterm
+from src.utils import complement, gallop_difference, gallop_intersect, get_all_permutations, union_sorted, \
+    wildcard_to_regex
+
+WILDCARD_BACKENDS = ('trie', 'array', 'kgram')
+DOC_SET_BACKENDS = ('list', 'numpy')
+# a few chunks of queries per worker of search_many, so a worker that gets slow queries does not hold the others back
+CHUNKS_PER_WORKER = 4
+
+# (processor, query trees, resolved tokens) of the search_many of a worker process, set by _init_batch. it is only set
+# in the workers, so several search_many can run at the same time in the parent process.
+_batch = None
+
+
+def _init_batch(processor, nodes, resolved):
+    """
+    keep the batch of search_many in a worker process. the workers are forked, so the arguments are inherited from the
+    parent process instead of being pickled.
+    """
+    global _batch
+    _batch = (processor, nodes, resolved)
+
+
+def _evaluate_batch(start, end):
+    """
+    evaluate the query trees start to end of the batch of a worker process, see _init_batch. only the results are sent
+    back.
+    """
+    processor, nodes, resolved = _batch
+    return [list(processor.evaluate_ids(node, resolved)) for node in nodes[start:end]]
 
 
 class TrieNode:
@@ -12,7 +52,7 @@ class TrieNode:
     is_end: bool
         this attribute determines if the current node is the end of a word or not.
     children: dict
-        this attribute contains the children nodes of a node.
+        this attribute contains the children nodes of a node, in sorted order of their characters.
 
     Methods:
     -------
@@ -72,7 +112,17 @@ class Trie(object):
                     the word you want to insert into the tree.
             :return
                 The last node which is the end of the word.
-        _dfs(self, node, prefix, result=[]):
+        iter_words(self, node, prefix):
+            This function get a node(root of a tree or subtree) and a prefix, then yield all words under the node in
+            lexicographic order, without recursion.
+            :parameter
+                - node:TrieNode
+                    the node to start with
+                - prefix:str
+                    the characters before the node
+            :return
+                generator of all words that contain the given prefix in the given tree.
+        _dfs(self, node, prefix, result=None):
             This function get a node(root of a tree or subtree) and a prefix, then return all words that contain the
             given prefix in the result argument.
 
@@ -83,7 +133,7 @@ class Trie(object):
                     the current prefix, for tracing a
                     word while traversing the trie
                 - result:list
-                    the list that the function will add all words into it.
+                    the list that the function will add all words into it. a new list if it is None.
             :return
                 return all words that contain the given prefix in the given tree.
 
@@ -104,12 +154,16 @@ class Trie(object):
                 None
             :return
                 None
-        query(self, x:str):
+        iter_query(self, x:str):
+            the same as query, but yield the words one by one in lexicographic order.
+        query(self, x:str, limit=None):
             This function is as same as the dfs_helper function, but first check if the given word is in trie or not, then
             call the the dfs_helper with the root node and return all words contain x as prefix(include x if there exist).
             :parameter
                 - x:str
                     the given word or prefix
+                - limit:int
+                    the largest number of words to return, or None for all of them
             :return
                 return all words contain x as prefix(include x if there exist).
     """
@@ -139,12 +193,48 @@ class Trie(object):
                 node = node.children[char]
             else:
                 new_node = TrieNode(char)
-                node.children[char] = new_node
+                if node.children and char < next(reversed(node.children)):
+                    # keep children in sorted order, so the traversal yields words in lexicographic order
+                    node.children[char] = new_node
+                    node.children = dict(sorted(node.children.items()))
+                else:
+                    node.children[char] = new_node
                 node = new_node
         node.is_end = True
         return node
 
-    def _dfs(self, node, prefix, result=[]):
+    def iter_words(self, node, prefix):
+        """
+        This function get a node(root of a tree or subtree) and a prefix, then yield all words under the node in
+        lexicographic order. it walks the tree with a stack of children iterators instead of recursion, and keeps the
+        characters of the current path in a list, so a string is only built for the words it yields.
+            :parameter
+                - node:TrieNode
+                    the node to start with
+                - prefix:str
+                    the characters before the node
+            :return
+                generator of all words that contain the given prefix in the given tree.
+        """
+        path = [prefix, node.char]
+        if node.is_end:
+            yield ''.join(path)
+        stack = [iter(node.children.values())]
+        while stack:
+            for child in stack[-1]:
+                path.append(child.char)
+                if child.is_end:
+                    yield ''.join(path)
+                if child.children:
+                    # go down into the child, and come back to the rest of the siblings when it is done
+                    stack.append(iter(child.children.values()))
+                    break
+                path.pop()
+            else:
+                stack.pop()
+                path.pop()
+
+    def _dfs(self, node, prefix, result=None):
         """
         This function get a node(root of a tree or subtree) and a prefix, then return all words that contain the
         given prefix in the result argument.
@@ -155,16 +245,14 @@ class Trie(object):
                     the current prefix, for tracing a
                     word while traversing the trie
                 - result:list
-                    the list that the function will add all words into it.
+                    the list that the function will add all words into it. a new list if it is None.
             :return
                  return all words that contain the given prefix in the given tree.
         """
-        if node.is_end:
-            # result.append(node)
-            result.append(prefix + node.char)
-
-        for child in node.children.values():
-            self._dfs(child, prefix + node.char, result)
+        if result is None:
+            result = []
+        result.extend(self.iter_words(node, prefix))
+        return result
 
     def dfs_helper(self, node, prefix):
         """
@@ -178,9 +266,7 @@ class Trie(object):
             :return
                 return all words that contain the given prefix in the given tree.
         """
-        result = []
-        self._dfs(node, prefix, result=result)
-        return result
+        return list(self.iter_words(node, prefix))
 
     def print_all_words(self):
         """
@@ -191,27 +277,41 @@ class Trie(object):
             :return
                 None
         """
-        for word in sorted(self.dfs_helper(self.root, '')):
+        for word in self.iter_words(self.root, ''):
             print(word)
 
-    def query(self, x: str):
+    def iter_query(self, x: str):
         """
-        This function is as same as the dfs_helper function, but first check if the given word is in trie or not, then
-        call the the dfs_helper with the root node and return all words contain x as prefix(include x if there exist).
+        This function first check if the given word is in trie or not, then yield all words contain x as prefix
+        (include x if there exist) in lexicographic order.
         :parameter
             - x:str
                 the given word or prefix
         :return
-            return all words contain x as prefix(include x if there exist).
+            generator of all words contain x as prefix(include x if there exist).
         """
         node = self.root
         for char in x:
             if char in node.children:
                 node = node.children[char]
             else:
-                return []
-        result = self.dfs_helper(node, x[:-1])
-        return sorted(result)
+                return
+        yield from self.iter_words(node, x[:-1])
+
+    def query(self, x: str, limit=None):
+        """
+        This function is as same as the dfs_helper function, but first check if the given word is in trie or not, then
+        call the the dfs_helper with the root node and return all words contain x as prefix(include x if there exist).
+        the words come out of the traversal sorted, so only the first `limit` words are visited.
+        :parameter
+            - x:str
+                the given word or prefix
+            - limit:int
+                the largest number of words to return, or None for all of them
+        :return
+            return all words contain x as prefix(include x if there exist).
+        """
+        return list(islice(self.iter_query(x), limit))
 
 
 class QueryProcessor:
@@ -222,9 +322,40 @@ class QueryProcessor:
     -----------
     indexing_model: InvertedIndex
         an instance of InvertedIndex class which has been created by indexing documents.
+    wildcard_backend: str
+        the structure that create_prefix_trie builds for wildcard queries. 'trie' inserts every permuterm into a Trie,
+        'array' builds a PermutermIndex, a sorted array of permuterms that needs much less memory, and 'kgram' uses the
+        bigram index of indexing_model instead of permuterms.
+    doc_sets: str
+        how search combines the documents of the parts of a query. 'list' keeps them as sorted lists and merges them.
+        'numpy' keeps them as DocSet of src.docsets, NumPy arrays of doc ids or bitmaps, whichever is smaller, and
+        combines them with vectorized operations, which is faster when the query has common words or NOT.
+    prefix_trie: Trie or PermutermIndex
+        the permuterm structure of the vocabulary.
+    kgram_index: KGramIndex
+        the bigram index of the vocabulary, if wildcard_backend is 'kgram'.
+    indexed_words: int
+        number of words of the vocabulary in prefix_trie, or None if it is not created yet.
+    term_cache: LRUCache
+        {word: token}, the tokens of query words, after spell correction.
+    wildcard_cache: LRUCache
+        {pattern: tokens}, the tokens of the words that match a wildcard.
+    result_cache: LRUCache
+        {query: frozenset of documents}, the results of search. queries are keyed by their parsed tree, so the same
+        query written with other spaces or letter cases is the same entry.
+    cache_version: int
+        the version of indexing_model when the caches were filled. they are emptied when the index has another version.
     Methods
     -------
     Methods defined here:
+        get_token(self, word):
+            return the token of a word, spell corrected if it is not in the index, from term_cache if it is there.
+        sync_caches(self):
+            empty the caches if the index changed since they were filled, and return the version of the index.
+        cached(self, cache, key, compute):
+            return the value of key in one of the caches, or compute and put it there.
+        cache_stats(self):
+            return the stats of the three caches.
         get_word_docs(self, word: str):
                 this simple function gets a token and will return all index of documents that this token is appeared in.
                 :param word:
@@ -239,7 +370,7 @@ class QueryProcessor:
                 second_word: str
                     second word you want to search
                 :return
-                    list of indexes of documents.
+                    sorted list of indexes of documents, intersected by galloping in the longer posting list.
             union(self, first_word, second_word):
                 this function get two words, and find documents that either each of these word has been occurred.
                 :parameter
@@ -255,161 +386,672 @@ class QueryProcessor:
                 word: str
                     the word you want to search
                 :return
-                    list of indexes of documents.
-            near(self, first_word, second_word, length):
-                this function get two words, and find documents that either each of these word has been occurred near by at most 3 words on left or right.
+                    iterator over the sorted indexes of documents, made lazily from the posting list of the word.
+            near(self, first_word, second_word, distance):
+                this function get two words, and find documents that these words has been occurred near by at most
+                `distance` words on left or right. it intersects the documents of the two words, then merges their
+                positions in each common document, without reading the text of documents.
                 :parameter
                 first_word: str
                     first word you want to search
                 second_word: str
                     second word you want to search
+                distance: int
+                    the largest distance between the two words
                 :return
-                    list of indexes of documents.
+                    sorted list of indexes of documents.
+            phrase(self, words):
+                this function get a list of words, and find documents that these words has been occurred one right
+                after the other, in the same order. stop words are skipped, the same as in the documents.
+                :return
+                    sorted list of indexes of documents.
+            complement(self, doc_ids):
+                return a lazy iterator over the sorted documents that are not in doc_ids and are not deleted.
+            update_prefix_trie(self):
+                add the new words of a LiveIndex to prefix_trie. iter_wildcard_query calls it by itself.
+            iter_wildcard_query(self, token):
+                yield the words that match a token with any number of * and ?, lazily, so callers can stop early.
+            iter_wildcard_ids(self, token):
+                the same as iter_wildcard_query, but yield the term ids of the words, their indexes in posting_list.
+            wildcard_candidates(self, token):
+                return the term ids of the words that may match a token, and the regular expression they should match.
+            wildcard_query(self, token, limit=None):
+                return the words that match a token with any number of * and ?, at most limit of them.
+            save_prefix_trie(self, path):
+                save the permuterm index of the vocabulary into the directory `path`, next to the saved index.
+            load_prefix_trie(self, path):
+                map the permuterm index saved with save_prefix_trie, instead of calling create_prefix_trie. the loaded
+                prefix_trie is a PermutermIndex.
+            resolve(self, node, resolved):
+                return the tokens of a Term or a Wildcard node of a query, resolving every word once per query.
+            resolve_key(node):
+                return the key of a Term or Wildcard node in the resolved dictionary.
+            resolve_all(self, node, resolved):
+                resolve every word and wildcard of a query tree into resolved.
+            estimate(self, node, resolved):
+                return an upper bound of the number of documents of a node of a query.
+            evaluate(self, node, resolved):
+                return the sorted documents of a node of a query. AND operands are evaluated from the rarest one,
+                and the evaluation stops when the result is empty.
+            evaluate_docset(self, node, resolved):
+                the same as evaluate, but return a DocSet.
+            complement_docset(self, doc_set):
+                return the DocSet of the documents that are not in doc_set and are not deleted.
+            evaluate_ids(self, node, resolved):
+                return the sorted documents of a node of a query with evaluate or evaluate_docset, as doc_sets says.
+            union_all(doc_lists):
+                return the sorted union of several sorted lists of documents.
             search(self, query):
-                this function get a query and recognize what kind of query is; then search the query.
+                this function parses a query with AND, OR, NOT, NEAR/k, "phrases" and parentheses, then evaluates it.
                 :parameter
                     query: str
                         the query that user wants to search
                 :return
-                    print list of indexes of documents in a pretty way.
+                    set of indexes of documents.
+            search_many(self, queries, workers=1):
+                search a batch of queries. each distinct query is evaluated once, and each word, wildcard and spell
+                correction is resolved once for the whole batch. it returns the list of the results of search.
+            scored_tokens(self, node, resolved):
+                return the tokens of the words of a query that are not under a NOT.
+            ranked_search(self, query, k=10, exhaustive=False):
+                this function returns the k documents of a query with the best BM25 scores, found with MaxScore
+                pruning, as a list of (doc_idx, score).
     """
 
-    def __init__(self, indexing_model):
+    def __init__(self, indexing_model, wildcard_backend='trie', cache_size=0, cache_ttl=None, doc_sets='list'):
+        """
+        :param doc_sets:
+            'list' or 'numpy', see the doc_sets attribute. 'numpy' needs NumPy.
+        :param cache_size:
+            the largest number of entries of each cache, 0 (the default) does not cache anything
+        :param cache_ttl:
+            seconds a cached entry is valid, or None if entries are valid until the index changes
+        """
+        if wildcard_backend not in WILDCARD_BACKENDS:
+            raise Exception(f"wildcard_backend should be one of {WILDCARD_BACKENDS}")
+        if doc_sets not in DOC_SET_BACKENDS:
+            raise Exception(f"doc_sets should be one of {DOC_SET_BACKENDS}")
         self.indexing_model = indexing_model
+        self.wildcard_backend = wildcard_backend
+        self.doc_sets = doc_sets
         self.prefix_trie: Trie = Trie()
+        self.kgram_index = None
+        self.indexed_words = None
+        self.term_cache = LRUCache(cache_size, cache_ttl)
+        self.wildcard_cache = LRUCache(cache_size, cache_ttl)
+        self.result_cache = LRUCache(cache_size, cache_ttl)
+        self.cache_version = indexing_model.version
+
+    def sync_caches(self):
+        """
+        empty all caches if the version of the index changed since they were filled.
+        :return:
+            the version of the index
+        """
+        version = self.indexing_model.version
+        if version != self.cache_version:
+            self.term_cache.clear()
+            self.wildcard_cache.clear()
+            self.result_cache.clear()
+            self.cache_version = version
+        return version
+
+    def cached(self, cache, key, compute):
+        """
+        return the value of key in cache, or call compute and put its value in cache. the caches are synced with the
+        index first. a value that was computed while the index changed is not put, because it may be of the old index.
+        :param cache:
+            term_cache, wildcard_cache or result_cache
+        :param key:
+            the key in cache
+        :param compute:
+            function without arguments that returns the value of key
+        :return:
+            the value of key
+        """
+        if not cache.maxsize:
+            return compute()
+        version = self.sync_caches()
+        value = cache.get(key, MISSING)
+        if value is MISSING:
+            value = compute()
+            if self.indexing_model.version == version:
+                cache.put(key, value)
+        return value
+
+    def cache_stats(self):
+        """
+        return {cache name: stats} of term_cache, wildcard_cache and result_cache, see LRUCache.stats.
+        """
+        return {'term': self.term_cache.stats(), 'wildcard': self.wildcard_cache.stats(),
+                'result': self.result_cache.stats()}
+
+    def get_token(self, word):
+        """
+        return the token of a word, or of its spell correction if it is not in the index. a spell correction searches
+        the vocabulary, so with a term_cache each misspelled word is only corrected once.
+        """
+        return self.cached(self.term_cache, word, lambda: self.indexing_model.get_token(word))
 
     def get_word_docs(self, word):
-        t = self.indexing_model.get_token(word)
-        result = set()
-        for doc in t.docs:
-            result.add(doc['doc_idx'])
-        return result
+        t = self.get_token(word)
+        return set(t.doc_ids)
 
     def create_prefix_trie(self):
         """
-        This functions should run after create_posting_list to add all words to prefix_trie to create it.
+        This functions should run after create_posting_list to add all words to prefix_trie to create it. with the
+        'kgram' backend, it builds the bigram index instead.
         :return:
             None
         """
-        if self.indexing_model.posting_list:
-            for token in self.indexing_model.posting_list:
+        if self.indexing_model.posting_list and self.wildcard_backend == 'kgram':
+            self.kgram_index = self.indexing_model.get_kgram_index()
+        elif self.indexing_model.posting_list and self.wildcard_backend == 'array':
+            self.prefix_trie = PermutermIndex(self.indexing_model.vocabulary())
+        elif self.indexing_model.posting_list:
+            for word in self.indexing_model.vocabulary():
                 # Add permuterms
-                permuterms = get_all_permutations(token.word + '$')
+                permuterms = get_all_permutations(word + '$')
                 for term in permuterms:
                     node = self.prefix_trie.insert(term)
         else:
             raise Exception("You should first create posting list")
+        self.indexed_words = len(self.indexing_model.vocabulary())
+
+    def update_prefix_trie(self):
+        """
+        add the words that were added to a LiveIndex since create_prefix_trie to prefix_trie. the words of a LiveIndex
+        are only appended, so the new ones are the last words of the vocabulary. the bigram index is updated by the
+        LiveIndex itself.
+        :return:
+            None
+        """
+        words = self.indexing_model.vocabulary()
+        if self.indexed_words is None or self.indexed_words == len(words):
+            return
+        for term_id in range(self.indexed_words, len(words)):
+            if isinstance(self.prefix_trie, PermutermIndex):
+                self.prefix_trie.add(term_id)
+            elif self.wildcard_backend != 'kgram':
+                for term in get_all_permutations(words[term_id] + '$'):
+                    self.prefix_trie.insert(term)
+        self.indexed_words = len(words)
+
+    def save_prefix_trie(self, path):
+        """
+        save all permuterms of the vocabulary into the directory `path`. see src.storage for the format. the saved
+        permuterms are always a PermutermIndex, whatever the wildcard_backend is.
+        :param path:
+            directory of the index files
+        :return:
+            None
+        """
+        permuterm = self.prefix_trie
+        if not isinstance(permuterm, PermutermIndex):
+            permuterm = PermutermIndex(self.indexing_model.vocabulary())
+        save_permuterm(permuterm, path)
+
+    def load_prefix_trie(self, path):
+        """
+        map the permuterms saved with save_prefix_trie. the indexing_model should be the same index that was saved
+        with them, because permuterms refer to words by their index in posting_list.
+        :param path:
+            directory of the index files
+        :return:
+            None
+        """
+        self.prefix_trie = load_permuterm(path, self.indexing_model.vocabulary())
+        self.indexed_words = len(self.indexing_model.vocabulary())
+
+    def iter_wildcard_query(self, token: str):
+        """
+        This function gets a token that contain * or ? and yield matched words one by one, in the order of their
+        permuterms. see iter_wildcard_ids.
+        :param token:
+            the token that has * or ? and you wants to get all matches.
+        :return:
+            generator of all matches
+        """
+        words = self.indexing_model.vocabulary()
+        for term_id in self.iter_wildcard_ids(token):
+            yield words[term_id]
 
-    def wildcard_query(self, token: str):
+    def iter_wildcard_ids(self, token: str):
         """
-        This function gets a token that contain * and return matched word.
-        If there is just one *, it will add a '$' at the end of the word, and then permutate it such that the * pose on
-        the end of the string, and then search it in prefix_trie and will return the all match tokens.
-        If there are two *, it convert two * and the characters between these two into one *. Then do the same thing for
-        having one *. And from resulted matched, it search if they have the sequence characters of between two * in the
-        input token.
+        This function gets a token that contain * or ? and yield the term ids of the matched words one by one, in the
+        order of their permuterms. the candidates of wildcard_candidates are checked with its regular expression, if
+        there is one.
+        :param token:
+            the token that has * or ? and you wants to get all matches.
+        :return:
+            generator of term ids
+        """
+        candidates, matcher = self.wildcard_candidates(token)
+        words = self.indexing_model.vocabulary()
+        for term_id in candidates:
+            if matcher is None or matcher.fullmatch(words[term_id]):
+                yield term_id
+
+    def wildcard_candidates(self, token: str):
+        """
+        This function gets a token that contain * or ? and returns the term ids of the words that may match it.
+        * matches any number of characters and ? matches one character, and there can be any number of them. A '$' at
+        the end of the token (as search adds it) is ignored, the pattern always matches whole words.
+        The part before the first wildcard is the prefix and the part after the last one is the suffix of the word, so
+        it rotates them into suffix + '$' + prefix and searches it in prefix_trie. If there was only one *, all of these
+        words match. Else, the candidates are checked with a regular expression of the whole pattern, because the
+        middle segments should appear in order and without overlapping. If nothing is anchored, like *a*e*, it checks
+        the whole vocabulary instead. If only the prefix is anchored, like ab*c*, the candidates are a range of term ids
+        of the sorted lexicon, which is in the same order as the permuterms.
+        With the 'kgram' backend, the candidates are the words that have all bigrams of the pattern, and they are always
+        checked with the regular expression. they come out in posting_list order.
+        :param token:
+            the token that has * or ? and you wants to get all matches.
+        :return:
+            (candidates, matcher), an iterable of term ids, made lazily when it can be, and the compiled regular
+            expression the words of the candidates should fully match, or None if they all match
+        """
+        if isinstance(self.indexing_model, LiveIndex):
+            self.update_prefix_trie()
+        pattern = token[:-1] if token.endswith('$') else token
+        wildcards = [i for i, char in enumerate(pattern) if char in '*?']
+        if not wildcards:
+            raise Exception("Query is not valid")
+        prefix = pattern[:wildcards[0]]
+        suffix = pattern[wildcards[-1] + 1:]
+        if len(wildcards) == 1 and pattern[wildcards[0]] == '*':
+            matcher = None
+        else:
+            matcher = wildcard_to_regex(pattern)
+        lexicon = self.indexing_model.get_lexicon()
+        if prefix and not suffix and lexicon is not None:
+            candidates = range(*lexicon.prefix_range(prefix))
+        elif self.wildcard_backend == 'kgram':
+            matcher = wildcard_to_regex(pattern)
+            # the index builds it if create_prefix_trie was not called (or load_prefix_trie was), and builds it again
+            # after its vocabulary changed
+            self.kgram_index = self.indexing_model.get_kgram_index()
+            candidates = self.kgram_index.wildcard_candidates(pattern)
+            if candidates is None:
+                candidates = range(len(self.indexing_model.vocabulary()))
+        elif not prefix and not suffix:
+            # nothing is anchored, every word is a candidate, and reading the vocabulary is cheaper than the permuterms
+            candidates = range(len(self.indexing_model.vocabulary()))
+        elif isinstance(self.prefix_trie, PermutermIndex):
+            candidates = self.prefix_trie.iter_term_ids(suffix + '$' + prefix)
+        else:
+            dollar_idx = len(suffix)
+            candidates = (self.indexing_model.get_token_index(rotation[dollar_idx + 1:] + rotation[:dollar_idx])
+                          for rotation in self.prefix_trie.iter_query(suffix + '$' + prefix))
+        return candidates, matcher
+
+    def wildcard_query(self, token: str, limit=None):
+        """
+        This function gets a token that contain * or ? and return matched word. see iter_wildcard_query.
         :param token:
             the token that has * and you wants to get all matches.
+        :param limit:
+            the largest number of matches to return, or None for all of them. the search stops at the limit.
         :return:
             return all matches
         """
-        if token.count('*') == 1:
-            star_idx = token.index('*')
-            result_tokens = self.prefix_trie.query(token[star_idx + 1:] + token[0:star_idx])
-            for i, word in enumerate(result_tokens):
-                dollar_idx = word.index('$')
-                result_tokens[i] = word[dollar_idx + 1:] + word[0:dollar_idx]
-            return result_tokens
-
-        elif token.count('*') == 2:
-            star1_idx = token.index('*')
-            star2_idx = token.index('*', star1_idx + 1)
-            result_tokens = self.prefix_trie.query(token[star2_idx + 1:] + token[0:star1_idx])
-            for i, word in enumerate(result_tokens):
-                dollar_idx = word.index('$')
-                result_tokens[i] = word[dollar_idx + 1:] + word[0:dollar_idx]
-            # print(result_tokens)
-            result = []
-            for word in result_tokens:
-                if token[star1_idx + 1:star2_idx] in word:
-                    result.append(word)
-            return result
-        else:
-            raise Exception("Query is not valid")
+        return list(islice(self.iter_wildcard_query(token), limit))
 
     def intersect(self, first_word, second_word):
-        docs1 = self.get_word_docs(first_word)
-        docs2 = self.get_word_docs(second_word)
-        return set(docs1 & docs2)
+        docs1 = self.get_token(first_word).doc_ids
+        docs2 = self.get_token(second_word).doc_ids
+        return gallop_intersect(docs1, docs2)
 
     def union(self, first_word, second_word):
-        docs1 = self.get_word_docs(first_word)
-        docs2 = self.get_word_docs(second_word)
-        return set(docs1 | docs2)
+        docs1 = self.get_token(first_word).doc_ids
+        docs2 = self.get_token(second_word).doc_ids
+        return union_sorted(docs1, docs2)
 
     def not_in(self, word):
-        all_docs = set(range(len(self.indexing_model.documents)))
-        word_docs = self.get_word_docs(word)
-        return set(all_docs - word_docs)
+        return self.complement(self.get_token(word).doc_ids)
+
+    def complement(self, doc_ids):
+        """
+        return a lazy iterator over the sorted documents that are not in doc_ids and are not deleted.
+        """
+        deleted = self.indexing_model.deleted_docs()
+        if deleted:
+            doc_ids = union_sorted(doc_ids, deleted)
+        return complement(doc_ids, self.indexing_model.num_docs)
 
     def near(self, first_word, second_word, distance):
-        result = set()
-        t1 = self.indexing_model.get_token(first_word)
-        t2 = self.indexing_model.get_token(second_word)
-        for t in (t1, t2):
-            for doc in t.docs:
-                for idx in doc['indexes']:
-                    if second_word in self.indexing_model.documents[doc["doc_idx"]][idx + 1:idx + 1 + distance]:
-                        result.add(doc['doc_idx'])
-        return set(result)
+        t1 = self.get_token(first_word)
+        t2 = self.get_token(second_word)
+        return near_docs(t1, t2, distance)
 
-    def search(self, query):
-        query_parts = query.lower().split()
-        if len(query_parts) > 2:
-            if '*' not in query_parts[0]:
-                query_parts[0] = [query_parts[0]]
-            if '*' not in query_parts[2]:
-                query_parts[2] = [query_parts[2]]
-            if '*' in query_parts[0]:
-                query_parts[0] = self.wildcard_query(query_parts[0] + '$')
-            if '*' in query_parts[2]:
-                query_parts[2] = self.wildcard_query(query_parts[1] + '$')
-        if len(query_parts) == 1:
-            if '*' in query_parts[0]:
-                query_parts[0] = self.wildcard_query(query_parts[0] + '$')
+    def phrase(self, words):
+        tokens = [self.get_token(word) for word in words if word not in self.indexing_model.stop_words]
+        if not tokens:
+            return []
+        return phrase_docs(tokens)
+
+    def resolve(self, node, resolved):
+        """
+        return the tokens of a Term or Wildcard node. a Term is one token (spell corrected if needed), a Wildcard is
+        the tokens of all words that match it. each word and pattern is resolved once per query, and once until the
+        index changes if there is a term_cache and a wildcard_cache.
+        :param node:
+            a Term or Wildcard node
+        :param resolved:
+            dictionary of the tokens resolved so far in this query
+        :return:
+            list of tokens
+        """
+        key = self.resolve_key(node)
+        if key not in resolved:
+            if isinstance(node, Term):
+                resolved[key] = [self.get_token(node.word)]
             else:
-                query_parts[0] = [query_parts[0]]
-            result = self.get_word_docs(query_parts[0][0])
-            for token1 in query_parts[0]:
-                result = result.union(self.get_word_docs(token1))
-            return result
-        elif 'and' in query_parts:
-            result = set()
-            for token1 in query_parts[0]:
-                for token2 in query_parts[2]:
-                    result = result.union(self.intersect(token1, token2))
-            return result
-        elif 'or' in query_parts:
-            result = set()
-            for token1 in query_parts[0]:
-                for token2 in query_parts[2]:
-                    result = result.union(self.union(token1, token2))
-            return result
-        elif 'not' in query_parts:
-            if '*' in query_parts[0]:
-                query_parts[1] = self.wildcard_query(query_parts[1] + '$')
+                posting_list = self.indexing_model.posting_list
+                resolved[key] = self.cached(self.wildcard_cache, node.pattern, lambda: [
+                    posting_list[term_id] for term_id in self.iter_wildcard_ids(node.pattern)])
+        return resolved[key]
+
+    @staticmethod
+    def resolve_key(node):
+        """
+        return the key of a Term or Wildcard node in the resolved dictionary of resolve.
+        """
+        return node.word if isinstance(node, Term) else '*' + node.pattern
+
+    def resolve_all(self, node, resolved):
+        """
+        resolve the words and wildcards of every Term, Wildcard, Phrase and NEAR of a query tree, also under NOT, so
+        evaluating the tree does not resolve anything any more.
+        :param node:
+            a node of the tree made by parse_query
+        :param resolved:
+            dictionary of the tokens resolved so far, it can be shared by many queries
+        :return:
+            None
+        """
+        if isinstance(node, (Term, Wildcard)):
+            self.resolve(node, resolved)
+        elif isinstance(node, Phrase):
+            for word in node.words:
+                if word not in self.indexing_model.stop_words:
+                    self.resolve(Term(word), resolved)
+        elif isinstance(node, Near):
+            self.resolve(node.left, resolved)
+            self.resolve(node.right, resolved)
+        elif isinstance(node, Not):
+            self.resolve_all(node.child, resolved)
+        else:
+            for child in node.children:
+                self.resolve_all(child, resolved)
+
+    def estimate(self, node, resolved):
+        """
+        return an upper bound of the number of documents that match a node, from the document frequencies of its
+        words. it is used to evaluate the operands of AND from the rarest to the most common.
+        """
+        if isinstance(node, (Term, Wildcard)):
+            return sum(len(token.doc_ids) for token in self.resolve(node, resolved))
+        if isinstance(node, And):
+            return min([self.estimate(child, resolved) for child in node.children if not isinstance(child, Not)] or
+                       [self.indexing_model.num_docs])
+        if isinstance(node, Or):
+            return min(self.indexing_model.num_docs, sum(self.estimate(child, resolved) for child in node.children))
+        if isinstance(node, Not):
+            return self.indexing_model.num_docs
+        if isinstance(node, Phrase):
+            return min([self.estimate(Term(word), resolved) for word in node.words
+                        if word not in self.indexing_model.stop_words] or [0])
+        return min(self.estimate(node.left, resolved), self.estimate(node.right, resolved))
+
+    def evaluate(self, node, resolved):
+        """
+        return the sorted documents that match a node of the query tree. doc ids stay sorted lists (or the arrays of
+        the tokens) all the way, and are combined with the merge functions of src.utils.
+        A wildcard is expanded once, into the union of the documents of all of its words. The operands of AND are
+        intersected from the smallest estimate to the largest with galloping, the NOT operands are subtracted at the
+        end, and the evaluation stops as soon as the intermediate result is empty.
+        :param node:
+            a node of the tree made by parse_query
+        :param resolved:
+            dictionary of the tokens resolved so far in this query
+        :return:
+            sorted list (or array) of indexes of documents
+        """
+        if isinstance(node, (Term, Wildcard)):
+            return self.union_all([token.doc_ids for token in self.resolve(node, resolved)])
+        if isinstance(node, Or):
+            return self.union_all([self.evaluate(child, resolved) for child in node.children])
+        if isinstance(node, Not):
+            return list(self.complement(self.evaluate(node.child, resolved)))
+        if isinstance(node, Near):
+            pairs = [(token1, token2) for token1 in self.resolve(node.left, resolved)
+                     for token2 in self.resolve(node.right, resolved)]
+            return self.union_all([near_docs(token1, token2, node.distance) for token1, token2 in pairs])
+        if isinstance(node, Phrase):
+            tokens = [token for word in node.words if word not in self.indexing_model.stop_words
+                      for token in self.resolve(Term(word), resolved)]
+            return phrase_docs(tokens) if tokens else []
+
+        positives = sorted((child for child in node.children if not isinstance(child, Not)),
+                           key=lambda child: self.estimate(child, resolved))
+        negatives = [child.child for child in node.children if isinstance(child, Not)]
+        if positives:
+            result = self.evaluate(positives[0], resolved)
+        else:
+            result = list(self.complement([]))
+        for child in positives[1:]:
+            if not result:
+                return result
+            if isinstance(child, Term):
+                # a compressed token only decodes the blocks that can have the documents of result
+                result = self.resolve(child, resolved)[0].intersect(result)
             else:
-                query_parts[1] = [query_parts[1]]
-            result = self.not_in(query_parts[1][0])
-            for token1 in query_parts[1]:
-                result = result.intersection(self.not_in(token1))
+                result = gallop_intersect(result, self.evaluate(child, resolved))
+        for child in negatives:
+            if not result:
+                return result
+            result = gallop_difference(result, self.evaluate(child, resolved))
+        return result
+
+    def evaluate_docset(self, node, resolved):
+        """
+        the same as evaluate, with DocSet instead of sorted lists. the documents of a word stay an array if the word is
+        rare and become a bitmap if it is common, and AND, OR and NOT are NumPy operations on them. NEAR and phrases
+        merge positions as evaluate does, and their documents are turned into a DocSet.
+        :param node:
+            a node of the tree made by parse_query
+        :param resolved:
+            dictionary of the tokens resolved so far in this query
+        :return:
+            DocSet
+        """
+        from src.docsets import DocSet
+        n = self.indexing_model.num_docs
+        if isinstance(node, (Term, Wildcard)):
+            return DocSet.union_all([token.doc_ids for token in self.resolve(node, resolved)], n)
+        if isinstance(node, Or):
+            result = self.evaluate_docset(node.children[0], resolved)
+            for child in node.children[1:]:
+                result = result | self.evaluate_docset(child, resolved)
             return result
-        elif 'near' in query:
-            distance = int(query_parts[1].split('/')[1])
-            result = set()
-            for token1 in query_parts[0]:
-                for token2 in query_parts[2]:
-                    result = result.union(self.near(token1, token2, distance=distance))
-            return self.near(query_parts[0], query_parts[2], distance)
+        if isinstance(node, Not):
+            return self.complement_docset(self.evaluate_docset(node.child, resolved))
+        if isinstance(node, (Near, Phrase)):
+            return DocSet.from_ids(self.evaluate(node, resolved), n)
+
+        positives = sorted((child for child in node.children if not isinstance(child, Not)),
+                           key=lambda child: self.estimate(child, resolved))
+        negatives = [child.child for child in node.children if isinstance(child, Not)]
+        if positives:
+            result = self.evaluate_docset(positives[0], resolved)
         else:
-            return list(self.get_word_docs(query_parts[0]))
+            result = self.complement_docset(DocSet.from_ids([], n))
+        for child in positives[1:]:
+            if not result:
+                return result
+            if isinstance(child, Term):
+                # the doc ids of the word are searched for result, without making a DocSet of them
+                result = result.intersect_ids(self.resolve(child, resolved)[0].doc_ids)
+            else:
+                result = result & self.evaluate_docset(child, resolved)
+        for child in negatives:
+            if not result:
+                return result
+            result = result - self.evaluate_docset(child, resolved)
+        return result
+
+    def complement_docset(self, doc_set):
+        """
+        return the DocSet of the documents that are not in doc_set and are not deleted.
+        """
+        from src.docsets import DocSet
+        result = ~doc_set
+        deleted = self.indexing_model.deleted_docs()
+        if deleted:
+            result = result - DocSet.from_ids(deleted, doc_set.n)
+        return result
+
+    def evaluate_ids(self, node, resolved):
+        """
+        return the sorted documents of a node of the query tree, evaluated with DocSet if doc_sets is 'numpy', else
+        with sorted lists. doc ids are only made from a DocSet here, at the end of the query.
+        """
+        if self.doc_sets == 'numpy':
+            return self.evaluate_docset(node, resolved).to_list()
+        return self.evaluate(node, resolved)
+
+    @staticmethod
+    def union_all(doc_lists):
+        """
+        return the sorted union of several sorted lists of documents. two lists are merged, more are collected into a
+        set and sorted once, which is cheaper than merging them one by one.
+        """
+        if not doc_lists:
+            return []
+        if len(doc_lists) == 1:
+            return doc_lists[0]
+        if len(doc_lists) == 2:
+            return union_sorted(doc_lists[0], doc_lists[1])
+        result = set()
+        for docs in doc_lists:
+            result.update(docs)
+        return sorted(result)
+
+    def search(self, query):
+        """
+        this function parses a boolean query with AND, OR, NOT, NEAR/k, "phrases" and parentheses (see QueryParser),
+        then evaluates it. with a result_cache, the documents of a query are kept until the index changes.
+        :param query:
+            the query that user wants to search, like (exa*le or sample) and not content
+        :return:
+            set of indexes of documents
+        """
+        node = parse_query(query.lower())
+        if not self.result_cache.maxsize:
+            return set(self.evaluate_ids(node, {}))
+        return set(self.cached(self.result_cache, repr(node), lambda: frozenset(self.evaluate_ids(node, {}))))
+
+    def search_many(self, queries, workers=1):
+        """
+        this function searches a batch of queries, like relevance tests or replayed logs. the queries are parsed first,
+        and the same query written with other spaces or letter cases is evaluated once. the words and wildcards of all
+        queries are resolved into one dictionary, so a word (or its spell correction) and its posting list are fetched
+        once for the whole batch, then the query trees are evaluated with it. with a result_cache, cached queries are
+        not evaluated, and the new results are put in it.
+        :param queries:
+            list of queries, with the same syntax as search
+        :param workers:
+            number of processes that evaluate the queries. with more than one, the processes are forked after the
+            words are resolved and share them with this process. where there is no fork start method, like on
+            Windows, or for a LiveIndex, the queries are evaluated in this process. the merger thread of a LiveIndex
+            can hold its lock at the time of the fork, and the lock would then stay held forever in the workers.
+        :return:
+            list of the sets of documents of the queries, the same as [search(query) for query in queries]
+        """
+        nodes = {}
+        keys = []
+        for query in queries:
+            node = parse_query(query.lower())
+            key = repr(node)
+            nodes.setdefault(key, node)
+            keys.append(key)
+        version = self.sync_caches()
+        results = {}
+        if self.result_cache.maxsize:
+            for key in nodes:
+                value = self.result_cache.get(key, MISSING)
+                if value is not MISSING:
+                    results[key] = value
+        pending = [key for key in nodes if key not in results]
+        resolved = {}
+        for key in pending:
+            self.resolve_all(nodes[key], resolved)
+
+        plans = [nodes[key] for key in pending]
+        workers = workers or os.cpu_count() or 1
+        if (workers == 1 or len(plans) < 2 or 'fork' not in multiprocessing.get_all_start_methods()
+                or isinstance(self.indexing_model, LiveIndex)):
+            docs = [self.evaluate_ids(node, resolved) for node in plans]
+        else:
+            n_chunks = min(len(plans), workers * CHUNKS_PER_WORKER)
+            bounds = [len(plans) * i // n_chunks for i in range(n_chunks + 1)]
+            context = multiprocessing.get_context('fork')
+            # see build_index, frozen objects are not scanned by the garbage collection of the forked workers
+            gc.freeze()
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_batch,
+                                         initargs=(self, plans, resolved)) as executor:
+                    futures = [executor.submit(_evaluate_batch, bounds[i], bounds[i + 1]) for i in range(n_chunks)]
+                    docs = [doc_ids for future in futures for doc_ids in future.result()]
+            finally:
+                gc.unfreeze()
+
+        store = self.result_cache.maxsize and self.indexing_model.version == version
+        for key, doc_ids in zip(pending, docs):
+            results[key] = frozenset(doc_ids)
+            if store:
+                self.result_cache.put(key, results[key])
+        return [set(results[key]) for key in keys]
+
+    def scored_tokens(self, node, resolved):
+        """
+        return the tokens of the words of a query that count in its score, which are all words that are not under a
+        NOT.
+        """
+        if isinstance(node, (Term, Wildcard)):
+            return self.resolve(node, resolved)
+        if isinstance(node, Phrase):
+            return [token for word in node.words if word not in self.indexing_model.stop_words
+                    for token in self.resolve(Term(word), resolved)]
+        if isinstance(node, Near):
+            return self.resolve(node.left, resolved) + self.resolve(node.right, resolved)
+        if isinstance(node, (And, Or)):
+            return [token for child in node.children for token in self.scored_tokens(child, resolved)]
+        return []
+
+    def ranked_search(self, query, k=10, exhaustive=False):
+        """
+        this function returns the k documents of a query with the best BM25 scores. a query of words and wildcards
+        joined with OR (or a single word) ranks every document that has any of the words. any other query ranks the
+        documents that match it, the same documents as search returns.
+        :param query:
+            the query that user wants to search, with the same syntax as search
+        :param k:
+            number of documents
+        :param exhaustive:
+            if True, score every posting instead of pruning with MaxScore. it is only useful for comparison.
+        :return:
+            list of (doc_idx, score), best first
+        """
+        node = parse_query(query.lower())
+        resolved = {}
+        allowed = None
+        if not (isinstance(node, (Term, Wildcard)) or
+                isinstance(node, Or) and all(isinstance(child, (Term, Wildcard)) for child in node.children)):
+            allowed = self.evaluate_ids(node, resolved)
+        bm25 = self.indexing_model.get_bm25()
+        tokens = self.scored_tokens(node, resolved)
+        if exhaustive:
+            return bm25.score_all(tokens, k, allowed)
+        return bm25.top_k(tokens, k, allowed)
@@ -0,0 +1,154 @@
+import heapq
+from array import array
+from math import log
+
+from src.utils import gallop
+
+# below this ratio of the length of a posting list to the number of scored documents, walking the list is faster than
+# galloping in it for every scored document
+GALLOP_LOOKUPS = 16
+
+
+class BM25:
+    """
+    This class scores documents with BM25, from the term frequencies and document lengths of an InvertedIndex. The top
+    k documents of a query are found term at a time with MaxScore: the words are walked from the largest score they can
+    give to a document to the smallest. Once the bounds of the remaining words together can not lift a new document
+    above the k-th best score so far, the remaining lists (the long lists of common words, which have the smallest
+    bounds) are only searched for the documents that are already scored, and documents that can not reach the top k
+    any more are dropped.
+    ...
+    Attributes:
+    -----------
+    index: InvertedIndex
+        the index to score. create_posting_list should have been called.
+    k1: float
+        saturation of the term frequency
+    b: float
+        how much the length of a document normalizes its term frequencies
+    doc_lengths: array
+        number of indexed words of every document, counted from the positions of the posting list
+    avg_length: float
+        average length of the documents
+    norms: array
+        k1 * (1 - b + b * length / avg_length) of every document
+    upper_bounds: dict
+        {word: the largest score of the word in any document}. a bound is computed from the whole posting list when the
+        word is ranked for the first time, and kept.
+
+    Methods
+    -------
+    Methods defined here:
+        __init__(self, index, k1=1.2, b=0.75):
+            count the document lengths from the posting list.
+        idf(self, token):
+            return the inverse document frequency of a token.
+        upper_bound(self, token):
+            return the largest score the token gives to any document.
+        score_all(self, tokens, k=10, allowed=None):
+            score every posting of the tokens and return the top k, without pruning.
+            :parameter
+                tokens: List[Token]
+                    the words of the query
+                k: int
+                    number of documents
+                allowed: Sequence[int]
+                    if it is given, only these documents are scored
+            :return
+                list of (doc_idx, score), best first. equal scores are ordered by doc_idx.
+        top_k(self, tokens, k=10, allowed=None):
+            return the same documents as score_all, with MaxScore pruning.
+    """
+
+    def __init__(self, index, k1=1.2, b=0.75):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = array('i', bytes(4 * index.num_docs))
+        for token in index.posting_list:
+            offsets = token.offsets
+            for i, doc_idx in enumerate(token.doc_ids):
+                self.doc_lengths[doc_idx] += offsets[i + 1] - offsets[i]
+        self.avg_length = sum(self.doc_lengths) / max(1, index.num_docs) or 1.0
+        self.norms = array('d', (k1 * (1 - b + b * length / self.avg_length) for length in self.doc_lengths))
+        self.upper_bounds = {}
+
+    def idf(self, token):
+        df = len(token.doc_ids)
+        return log(1 + (self.index.num_docs - df + 0.5) / (df + 0.5))
+
+    def upper_bound(self, token):
+        if token.word not in self.upper_bounds:
+            offsets, norms = token.offsets, self.norms
+            best = 0.0
+            for i, doc_idx in enumerate(token.doc_ids):
+                tf = offsets[i + 1] - offsets[i]
+                best = max(best, tf / (tf + norms[doc_idx]))
+            self.upper_bounds[token.word] = self.idf(token) * (self.k1 + 1) * best
+        return self.upper_bounds[token.word]
+
+    def score_all(self, tokens, k=10, allowed=None):
+        allowed = None if allowed is None else set(allowed)
+        scores = {}
+        for token in _unique(tokens):
+            weight = self.idf(token) * (self.k1 + 1)
+            offsets, norms = token.offsets, self.norms
+            for i, doc_idx in enumerate(token.doc_ids):
+                if allowed is not None and doc_idx not in allowed:
+                    continue
+                tf = offsets[i + 1] - offsets[i]
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + weight * tf / (tf + norms[doc_idx])
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return best
+
+    def top_k(self, tokens, k=10, allowed=None):
+        allowed = None if allowed is None else set(allowed)
+        tokens = sorted(_unique(tokens), key=self.upper_bound, reverse=True)
+        # remaining[t] is the largest score that tokens[t:] can add to a document
+        remaining = [0.0] * (len(tokens) + 1)
+        for t in range(len(tokens) - 1, -1, -1):
+            remaining[t] = remaining[t + 1] + self.upper_bound(tokens[t])
+        norms = self.norms
+        scores = {}
+        threshold = -1.0
+        for t, token in enumerate(tokens):
+            doc_ids, offsets = token.doc_ids, token.offsets
+            weight = self.idf(token) * (self.k1 + 1)
+            if remaining[t] >= threshold and len(scores) >= k and len(doc_ids) >= len(scores):
+                # the k-th best score so far only grows, and it is computed when the next list costs more than it
+                threshold = heapq.nlargest(k, scores.values())[-1]
+                if remaining[t] < threshold:
+                    scores = {doc_idx: score for doc_idx, score in scores.items() if score + remaining[t] >= threshold}
+            if remaining[t] >= threshold:
+                for i, doc_idx in enumerate(doc_ids):
+                    if allowed is not None and doc_idx not in allowed:
+                        continue
+                    tf = offsets[i + 1] - offsets[i]
+                    scores[doc_idx] = scores.get(doc_idx, 0.0) + weight * tf / (tf + norms[doc_idx])
+            elif len(scores) * GALLOP_LOOKUPS < len(doc_ids):
+                # a document that has none of the words so far can not reach the top k any more, so the list is only
+                # searched for the documents that are already scored
+                i = 0
+                for doc_idx in sorted(scores):
+                    i = gallop(doc_ids, doc_idx, i)
+                    if i == len(doc_ids):
+                        break
+                    if doc_ids[i] == doc_idx:
+                        tf = offsets[i + 1] - offsets[i]
+                        scores[doc_idx] += weight * tf / (tf + norms[doc_idx])
+            else:
+                for i, doc_idx in enumerate(doc_ids):
+                    if doc_idx in scores:
+                        tf = offsets[i + 1] - offsets[i]
+                        scores[doc_idx] += weight * tf / (tf + norms[doc_idx])
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def _unique(tokens):
+    """
+    drop repeated tokens, a word is scored once however many times the query has it.
+    """
+    seen = {}
+    for token in tokens:
+        seen.setdefault(token.word, token)
+    return list(seen.values())
@@ -0,0 +1,362 @@
+"""
+A live index that documents can be added to and deleted from while it is searched. New documents go into a small
+in-memory segment, which is sealed when it is full. Deleted documents are tombstones that are filtered out of the
+postings at query time and dropped for good when their segment is merged. A merger, which can run in a background
+thread, compacts adjacent segments of similar sizes into one, so a word is read from a few segments only.
+
+Every segment covers a range of doc ids after the previous one, so the postings of a word are the concatenation of its
+postings in the segments, in order. Term ids are given to words in the order they are first seen and never change, so
+the structures built over the vocabulary (BK-tree, bigram index, deletion dictionary and permuterms) are updated with
+the new words only, instead of being built again.
+"""
+import threading
+from array import array
+
+from src.indexing import InvertedIndex, Token
+from src.storage import IndexWriter
+
+# number of documents of the in-memory segment before it is sealed
+DEFAULT_SEGMENT_SIZE = 1000
+# number of adjacent segments of similar size that are merged together
+DEFAULT_MERGE_FACTOR = 4
+
+
+class Segment:
+    """
+    postings of a range of documents.
+    ...
+    Attributes:
+    -----------
+    first_doc: int
+        index of the first document of the segment
+    n_docs: int
+        number of documents of the segment, deleted ones too
+    tokens: dict
+        {word: Token} with global doc ids
+    """
+
+    def __init__(self, first_doc):
+        self.first_doc = first_doc
+        self.n_docs = 0
+        self.tokens = {}
+
+
+def merge_postings(word, parts, deleted=frozenset(), frozen=True):
+    """
+    concatenate the postings of a word in several segments, without the deleted documents.
+    :param word:
+        the word
+    :param parts:
+        the tokens of the word, in order of their segments
+    :param deleted:
+        set of deleted doc ids
+    :param frozen:
+        whether the parts do not change any more, like the tokens of sealed segments. a single frozen part with no
+        deleted document is returned as it is, otherwise the postings are copied.
+    :return:
+        a Token
+    """
+    if frozen and len(parts) == 1 and (not deleted or deleted.isdisjoint(parts[0].doc_ids)):
+        return parts[0]
+    doc_ids, offsets, positions = array('i'), array('i', [0]), array('i')
+    for part in parts:
+        if not deleted or deleted.isdisjoint(part.doc_ids):
+            doc_ids.extend(part.doc_ids)
+            offsets.extend(array('i', map(len(positions).__add__, part.offsets[1:])))
+            positions.extend(part.positions)
+            continue
+        for i, doc_idx in enumerate(part.doc_ids):
+            if doc_idx not in deleted:
+                doc_ids.append(doc_idx)
+                positions.extend(part.positions[part.offsets[i]:part.offsets[i + 1]])
+                offsets.append(len(positions))
+    return Token.from_arrays(word, doc_ids, offsets, positions)
+
+
+class LivePostingList:
+    """
+    This class is the posting_list of a LiveIndex, in order of term ids. the i-th token is the merged postings of the
+    i-th word of the vocabulary across all segments.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    @property
+    def words(self):
+        return self.index.words
+
+    def __len__(self):
+        return len(self.index.words)
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return [self[i] for i in range(*t.indices(len(self)))]
+        return self.index.merged_token(self.index.words[t])
+
+    def __iter__(self):
+        for t in range(len(self)):
+            yield self[t]
+
+
+class LiveIndex(InvertedIndex):
+    """
+    This class is an InvertedIndex that can add and delete documents while it is searched. Queries see all segments
+    through posting_list, so QueryProcessor works with it as it is, and picks up the new words for wildcards by
+    itself.
+    The words of posting_list are in the order they were first added, not sorted, and words whose documents are all
+    deleted stay in the vocabulary with empty postings. Deleted documents keep their indexes, so the indexes of the
+    documents never change.
+    ...
+    Attributes:
+    -----------
+    words: List[str]
+        the vocabulary, in order of term ids. words are only appended to it.
+    term_ids: dict
+        {word: term id}
+    segments: List[Segment]
+        the sealed segments, oldest first. the list is replaced, never changed in place, so a query can read it
+        without a lock.
+    memory: Segment
+        the segment that new documents go into
+    deleted: set
+        tombstones, the indexes of the deleted documents
+    merged: dict
+        {word: Token} postings merged across the segments, dropped when they change
+    segment_size: int
+        number of documents of the in-memory segment before it is sealed
+    merge_factor: int
+        number of adjacent segments that are merged together
+    lock: threading.RLock
+        lock of the in-memory segment and the tombstones
+
+    Methods
+    -------
+    Methods defined here:
+        add(self, doc):
+            index a document and return its index.
+            :param doc:
+                list of tokens of the document
+            :return:
+                int: index of the document
+        add_document(self, doc_idx, doc):
+            the same as add. doc_idx should be the next index, num_docs.
+        delete(self, doc_idx):
+            delete a document. it is not returned by any query any more, and its tokens become an empty list.
+        seal(self):
+            turn the in-memory segment into a sealed segment and start a new one.
+        merge_segments(self, force=False):
+            merge adjacent segments of similar sizes, until there is nothing to merge. with force, merge all sealed
+            segments into one.
+            :return:
+                number of merges
+        start_merger(self, interval=1.0):
+            run merge_segments in a background thread every `interval` seconds.
+        stop_merger(self):
+            stop the background thread.
+        merged_token(self, word):
+            return the postings of a word across all segments, without deleted documents.
+        get_lexicon(self):
+            return None, because the words are not sorted. get_token_index uses term_ids.
+        save(self, path):
+            save the index in the format of src.storage, in sorted order of words. deleted documents are saved as
+            documents without words.
+    """
+
+    def __init__(self, documents=None, segment_size=DEFAULT_SEGMENT_SIZE, merge_factor=DEFAULT_MERGE_FACTOR,
+                 case_sensitive=False, spell_backend='linear'):
+        super().__init__([], case_sensitive=case_sensitive, spell_backend=spell_backend)
+        self.segment_size = segment_size
+        self.merge_factor = merge_factor
+        self.words = []
+        self.term_ids = {}
+        self.segments = []
+        self.memory = Segment(0)
+        self.deleted = set()
+        self.merged = {}
+        self.lock = threading.RLock()
+        self.posting_list = LivePostingList(self)
+        self._merge_lock = threading.Lock()
+        self._merger = None
+        self._stop = threading.Event()
+        for doc in documents or []:
+            self.add(doc)
+
+    def clear_vocabulary_caches(self):
+        """
+        drop the structures that change with every document. the vocabulary and the structures built from it are
+        updated with the new words instead.
+        """
+        self.version += 1
+        self.doc_freqs = None
+        self.bm25 = None
+
+    def create_posting_list(self, bulk=True):
+        """
+        documents are indexed when they are added, so this only seals the in-memory segment.
+        """
+        self.seal()
+
+    def add(self, doc):
+        with self.lock:
+            doc_idx = len(self.documents)
+            self.documents.append(doc)
+            occurrences = {}
+            for token_idx, word in enumerate(doc):
+                occurrences.setdefault(word, []).append(token_idx)
+            tokens = self.memory.tokens
+            for word, positions in occurrences.items():
+                if word not in self.term_ids:
+                    self._add_word(word)
+                token = tokens.get(word)
+                if token is None:
+                    token = tokens[word] = Token(word)
+                token.insert_document(doc_idx, positions)
+                self.merged.pop(word, None)
+            self.memory.n_docs += 1
+            self.clear_vocabulary_caches()
+            if self.memory.n_docs >= self.segment_size:
+                self.seal()
+        return doc_idx
+
+    def _add_word(self, word):
+        term_id = self.term_ids[word] = len(self.words)
+        self.words.append(word)
+        if self.bk_tree is not None:
+            self.bk_tree.insert(term_id)
+        if self.kgram_index is not None:
+            self.kgram_index.add(term_id)
+        if self.deletion_index is not None:
+            self.deletion_index.add(term_id)
+
+    def add_document(self, doc_idx, doc):
+        if doc_idx != self.num_docs:
+            raise Exception(f"The next document of a LiveIndex is {self.num_docs}, not {doc_idx}")
+        self.add(doc)
+
+    def delete(self, doc_idx):
+        with self.lock:
+            if not 0 <= doc_idx < self.num_docs or doc_idx in self.deleted:
+                raise Exception(f"Document {doc_idx} is not in the index")
+            self.deleted.add(doc_idx)
+            self.documents[doc_idx] = []
+            self.merged = {}
+            self.clear_vocabulary_caches()
+
+    def deleted_docs(self):
+        with self.lock:
+            return sorted(self.deleted)
+
+    def get_token_index(self, x):
+        return self.term_ids.get(x, -1)
+
+    def get_lexicon(self):
+        """
+        the words of a LiveIndex are in order of their term ids, not sorted, so they have no front-coded lexicon. words
+        are found with term_ids instead.
+        """
+        return None
+
+    def seal(self):
+        with self.lock:
+            if self.memory.n_docs:
+                self.segments = self.segments + [self.memory]
+                self.memory = Segment(len(self.documents))
+
+    def merged_token(self, word):
+        """
+        return the postings of a word in all segments. a cached token never changes, so it is read without the lock,
+        and the lock is only taken to merge the postings of a word that is not cached.
+        """
+        token = self.merged.get(word)
+        if token is not None:
+            return token
+        with self.lock:
+            token = self.merged.get(word)
+            if token is None:
+                parts = [segment.tokens[word] for segment in self.segments + [self.memory] if word in segment.tokens]
+                # the token of the in-memory segment changes when documents are added, so queries get a copy of it
+                token = self.merged[word] = merge_postings(word, parts, self.deleted,
+                                                           frozen=word not in self.memory.tokens)
+            return token
+
+    @staticmethod
+    def _live_docs(segment, deleted):
+        return segment.n_docs - sum(1 for doc_idx in deleted
+                                    if segment.first_doc <= doc_idx < segment.first_doc + segment.n_docs)
+
+    def _pick_merge(self, force):
+        """
+        return (slice of segments to merge next or None, segments, deleted documents). the segments and the deleted
+        documents are read together under the lock, because delete changes them from other threads while the merger
+        thread picks a merge.
+        """
+        with self.lock:
+            segments = self.segments
+            deleted = set(self.deleted)
+        if force:
+            return (slice(0, len(segments)) if len(segments) > 1 else None), segments, deleted
+        if len(segments) < self.merge_factor:
+            return None, segments, deleted
+        sizes = [max(1, self._live_docs(segment, deleted)) for segment in segments]
+        best = None
+        for start in range(len(segments) - self.merge_factor + 1):
+            window = sizes[start:start + self.merge_factor]
+            # segments of similar size, so every document is merged a logarithmic number of times
+            if max(window) <= self.merge_factor * min(window) and (best is None or sum(window) < best[0]):
+                best = (sum(window), start)
+        if best is None:
+            return None, segments, deleted
+        return slice(best[1], best[1] + self.merge_factor), segments, deleted
+
+    def merge_segments(self, force=False):
+        with self._merge_lock:
+            return self._merge_segments(force)
+
+    def _merge_segments(self, force):
+        merges = 0
+        while True:
+            picked, segments, deleted = self._pick_merge(force)
+            if picked is None:
+                return merges
+            old = segments[picked]
+            # the sealed segments do not change, so they are merged without the lock
+            merged = Segment(old[0].first_doc)
+            merged.n_docs = sum(segment.n_docs for segment in old)
+            words = sorted({word for segment in old for word in segment.tokens})
+            for word in words:
+                token = merge_postings(word, [segment.tokens[word] for segment in old if word in segment.tokens],
+                                       deleted)
+                if len(token.doc_ids):
+                    merged.tokens[word] = token
+            with self.lock:
+                segments = self.segments
+                self.segments = segments[:picked.start] + [merged] + segments[picked.stop:]
+            merges += 1
+            force = False
+
+    def start_merger(self, interval=1.0):
+        if self._merger is not None:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.merge_segments()
+
+        self._merger = threading.Thread(target=run, daemon=True)
+        self._merger.start()
+
+    def stop_merger(self):
+        if self._merger is None:
+            return
+        self._stop.set()
+        self._merger.join()
+        self._merger = None
+
+    def save(self, path):
+        writer = IndexWriter(path)
+        for word in sorted(self.words):
+            token = self.merged_token(word)
+            writer.add(word, token.doc_ids, token.offsets, token.positions)
+        writer.close(self.num_docs)
@@ -0,0 +1,392 @@
+"""
+Query server. It serves an index saved with InvertedIndex.save (or src.ingest) over HTTP with asyncio, so many clients
+are served at the same time by one process:
+
+    python -m src.server PATH [--host 127.0.0.1] [--port 8000] [--workers 2] [--timeout 5]
+
+    GET /search?q=QUERY&limit=100   {"query": ..., "count": number of documents, "docs": the first `limit` of them}
+    GET /ranked?q=QUERY&k=10        {"query": ..., "count": ..., "results": [[doc_idx, score], ...]}
+    GET /health                     {"status": "ok"}
+    GET /stats                      counters of the requests
+
+The index files are memory-mapped, so the server process and its worker processes share one copy of them in the page
+cache. A query whose words are all in the index and have few documents is answered by a thread of the server process,
+one query at a time, so the event loop is never blocked by a query. Queries that need a spell correction, a wildcard
+expansion, a NOT or large merges run in a pool of worker processes, which load the index once when they start, so the
+thread keeps answering the cheap ones in the meantime. With no workers, every query runs in the thread.
+
+Every query has a timeout (504 after it), at most max_concurrency queries run at the same time, and at most max_queue
+more wait for them. Requests after that are rejected with 503 right away, instead of queueing without bound. A query
+can not be stopped in the middle, so a query that times out keeps running, only nobody waits for it any more. In the
+thread it delays the cheap queries after it, which time out as well if it takes long. In the pool it holds a worker,
+so when every worker runs a query that timed out, the pool is replaced by a new one and the old workers are killed;
+the queries that waited in the old pool are answered with 500. An invalid query or limit is
+answered with 400, and a query that fails in the server, like when a worker process died, with 500 and its traceback
+in the log.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from src.indexing import InvertedIndex
+from src.query_parser import Near, Not, Phrase, Term, Wildcard, parse_query
+from src.querying import QueryProcessor
+from src.storage import PERMUTERM_FILE
+
+DEFAULT_PORT = 8000
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_LIMIT = 100
+# a query whose words are in the index and have at most this many documents together is answered in the event loop
+INLINE_POSTINGS = 20000
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error',
+           503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+logger = logging.getLogger(__name__)
+
+# the QueryProcessor of a worker process, made by _init_worker
+_processor = None
+
+
+def open_processor(path, spell_backend='linear', **options):
+    """
+    load the index of the directory `path` and return a QueryProcessor of it. the saved permuterm index is mapped if
+    there is one, otherwise it is built.
+    :param spell_backend:
+        passed to InvertedIndex.load
+    :param options:
+        passed to QueryProcessor, like wildcard_backend, doc_sets and cache_size
+    """
+    processor = QueryProcessor(InvertedIndex.load(path, spell_backend=spell_backend), **options)
+    if os.path.exists(os.path.join(path, PERMUTERM_FILE)):
+        processor.load_prefix_trie(path)
+    else:
+        processor.create_prefix_trie()
+    return processor
+
+
+def execute(processor, kind, query, limit):
+    """
+    run a query and return the body of its response.
+    :param kind:
+        'search' for the documents of a boolean query, 'ranked' for the best `limit` documents by BM25
+    """
+    if kind == 'search':
+        docs = sorted(processor.search(query))
+        return {'query': query, 'count': len(docs), 'docs': docs[:limit]}
+    results = processor.ranked_search(query, k=limit)
+    return {'query': query, 'count': len(results), 'results': [[doc_idx, score] for doc_idx, score in results]}
+
+
+def _init_worker(path, options):
+    global _processor
+    _processor = open_processor(path, **options)
+
+
+def _execute_in_worker(kind, query, limit):
+    return execute(_processor, kind, query, limit)
+
+
+def _ping():
+    return os.getpid()
+
+
+class QueryServer:
+    """
+    This class is the asyncio HTTP server of an index, see the module docstring for the endpoints. It speaks just
+    enough HTTP/1.1 for GET requests, with keep-alive connections.
+    ...
+    Attributes:
+    -----------
+    path: str
+        directory of the index files
+    processor: QueryProcessor
+        the processor of the server process, for the cheap queries
+    inline_executor: ThreadPoolExecutor
+        the thread that runs the queries of processor, one at a time
+    executor: ProcessPoolExecutor
+        the worker processes, or None if every query runs in inline_executor
+    workers: int
+        number of worker processes
+    stuck: set
+        futures of the pooled queries that timed out and are still running in a worker
+    timeout: float
+        seconds a query can take, waiting included, before it is answered with 504
+    max_concurrency: int
+        number of queries that run at the same time
+    max_queue: int
+        number of queries that wait for the running ones, more are answered with 503
+    pending: int
+        number of queries that are running or waiting
+    stats: dict
+        counters of requests, inline and pooled queries, rejections, timeouts, invalid queries (400), errors of the
+        server (500) and replaced pools
+
+    Methods
+    -------
+    Methods defined here:
+        __init__(self, path, workers=2, timeout=DEFAULT_TIMEOUT, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_queue=DEFAULT_MAX_QUEUE, **options):
+            load the index and start the worker processes. options are passed to open_processor.
+        start_pool(self):
+            start the worker processes.
+        is_cheap(self, query):
+            whether a query is answered by the thread of the server process.
+        run(self, kind, query, limit):
+            run a query in the thread or in the pool, and return its body.
+        abandon(self, executor, future):
+            stop waiting for a pooled query that timed out, and replace the pool if all of its workers are stuck.
+        dispatch(self, kind, query, limit):
+            run a query with the limits of the server and return (status, body).
+        route(self, method, target):
+            return (status, body) of a request.
+        handle(self, reader, writer):
+            serve the requests of a connection.
+        start(self, host, port):
+            start listening, and return the asyncio server.
+        close(self):
+            stop the worker processes and the thread.
+    """
+
+    def __init__(self, path, workers=2, timeout=DEFAULT_TIMEOUT, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 max_queue=DEFAULT_MAX_QUEUE, **options):
+        self.path = path
+        self.options = options
+        self.processor = open_processor(path, **options)
+        # one thread, so the processor and its caches are used by one query at a time
+        self.inline_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inline-query')
+        self.workers = workers
+        self.executor = None
+        self.stuck = set()
+        if workers:
+            self.executor = self.start_pool()
+            # start every worker now, so the first queries do not wait for them
+            for future in [self.executor.submit(_ping) for _ in range(workers)]:
+                future.result()
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.pending = 0
+        self.semaphore = None
+        self.stats = {'requests': 0, 'inline': 0, 'pooled': 0, 'rejected': 0, 'timeouts': 0, 'invalid': 0,
+                      'errors': 0, 'recycled': 0}
+
+    def start_pool(self):
+        # spawned workers do not inherit the event loop, they load the index from its files
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker, initargs=(self.path, self.options))
+
+    def is_cheap(self, query):
+        """
+        return True if the words of the query are all in the index, it has no wildcard and no NOT, and the words have at
+        most INLINE_POSTINGS documents together. such a query takes about a millisecond, less than sending it to a
+        worker.
+        """
+        index = self.processor.indexing_model
+        total = 0
+        nodes = [parse_query(query.lower())]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, (Wildcard, Not)):
+                return False
+            if isinstance(node, Near):
+                nodes += [node.left, node.right]
+                continue
+            if not isinstance(node, (Term, Phrase)):
+                nodes += node.children
+                continue
+            for word in [node.word] if isinstance(node, Term) else node.words:
+                if word in index.stop_words and isinstance(node, Phrase):
+                    continue
+                term_id = index.get_token_index(word)
+                if term_id == -1:
+                    # it needs a spell correction
+                    return False
+                total += len(index.posting_list[term_id].doc_ids)
+        return total <= INLINE_POSTINGS
+
+    async def run(self, kind, query, limit):
+        """
+        run a query in inline_executor if it is cheap, otherwise in the pool. the event loop only waits for it, so
+        wait_for can answer 504 when it takes too long.
+        """
+        async with self.semaphore:
+            if self.executor is None or self.is_cheap(query):
+                self.stats['inline'] += 1
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.inline_executor, execute, self.processor, kind, query, limit)
+            self.stats['pooled'] += 1
+            executor = self.executor
+            future = executor.submit(_execute_in_worker, kind, query, limit)
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # wait_for timed out
+                self.abandon(executor, future)
+                raise
+
+    def abandon(self, executor, future):
+        """
+        stop waiting for a pooled query. a query that did not start yet is cancelled. a running one can not be
+        stopped, it holds its worker until it ends, so when every worker holds one, the pool is replaced and the old
+        workers are killed, otherwise new queries would only wait behind them.
+        """
+        if future.cancel() or executor is not self.executor:
+            # it did not start, or its pool was replaced already
+            return
+        self.stuck.add(future)
+        future.add_done_callback(self.stuck.discard)
+        if len(self.stuck) < self.workers:
+            return
+        logger.warning("all %d workers run queries that timed out, starting new ones", self.workers)
+        self.executor, self.stuck = self.start_pool(), set()
+        self.stats['recycled'] += 1
+        for _ in range(self.workers):
+            self.executor.submit(_ping)
+        # the queries that wait in the old pool fail with BrokenProcessPool when its workers are killed
+        processes = list(executor._processes.values())
+        executor.shutdown(wait=False)
+        for process in processes:
+            process.kill()
+
+    async def dispatch(self, kind, query, limit):
+        """
+        run a query that was checked to be valid. an exception of the query is a bug or a broken worker, not a bad
+        request, so it is answered with 500 and logged.
+        """
+        if self.pending >= self.max_concurrency + self.max_queue:
+            self.stats['rejected'] += 1
+            return 503, {'error': 'too many queries, try again later'}
+        self.pending += 1
+        try:
+            return 200, await asyncio.wait_for(self.run(kind, query, limit), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            return 504, {'error': f'the query took more than {self.timeout} seconds'}
+        except Exception:
+            self.stats['errors'] += 1
+            logger.exception("query %r failed", query)
+            return 500, {'error': 'the query failed, see the log of the server'}
+        finally:
+            self.pending -= 1
+
+    async def route(self, method, target):
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, {'status': 'ok'}
+        if url.path == '/stats':
+            return 200, dict(self.stats, pending=self.pending)
+        if url.path not in ('/search', '/ranked'):
+            return 404, {'error': f'no endpoint {url.path}'}
+        if method != 'GET':
+            return 405, {'error': 'only GET is supported'}
+        params = parse_qs(url.query)
+        query = params.get('q', [''])[0]
+        if not query.strip():
+            return 400, {'error': 'the query q is empty'}
+        name = 'limit' if url.path == '/search' else 'k'
+        try:
+            limit = int(params.get(name, [DEFAULT_LIMIT])[0])
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            self.stats['invalid'] += 1
+            return 400, {'error': f'{name} should be a positive integer'}
+        try:
+            # the parser raises Exception for invalid queries, anything that fails after it is an error of the server
+            parse_query(query.lower())
+        except Exception as error:
+            self.stats['invalid'] += 1
+            return 400, {'error': str(error)}
+        return await self.dispatch(url.path[1:], query, limit)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode('latin-1').split()
+                self.stats['requests'] += 1
+                if len(parts) != 3:
+                    status, body, keep_alive = 400, {'error': 'bad request line'}, False
+                else:
+                    method, target, version = parts
+                    status, body = await self.route(method, target)
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                payload = json.dumps(body).encode()
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(payload)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        self.inline_executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(server, host, port):
+    listener = await server.start(host, port)
+    # stop on SIGTERM too, so main stops the worker processes, otherwise they wait for queries forever
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    print(f"serving {server.path} on http://{host}:{port}", flush=True)
+    async with listener:
+        await stop.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='serve the queries of a saved index over HTTP')
+    parser.add_argument('path', help='directory of the index, made by InvertedIndex.save or src.ingest')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=2,
+                        help='worker processes, 0 runs every query in the server process')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds a query can take')
+    parser.add_argument('--max-concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE)
+    parser.add_argument('--spell-backend', default='linear', help="'linear', 'bktree' or 'kgram'")
+    parser.add_argument('--doc-sets', default='list', help="'list' or 'numpy'")
+    parser.add_argument('--cache-size', type=int, default=0, help='entries of each query cache, 0 disables them')
+    args = parser.parse_args(argv)
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    server = QueryServer(args.path, workers=args.workers, timeout=args.timeout, max_concurrency=args.max_concurrency,
+                         max_queue=args.max_queue, spell_backend=args.spell_backend, doc_sets=args.doc_sets,
+                         cache_size=args.cache_size)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
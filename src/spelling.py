@@ -0,0 +1,174 @@
+from src.utils import bounded_edit_distance, edit_distance
+
+
+class BKTree:
+    """
+    This class is a Burkhard-Keller tree over the vocabulary. Every node is a word, and the child of a node under key k
+    is the subtree of words that have distance k to it. Because edit distance satisfies the triangle inequality, the
+    search for the nearest word only visits the subtrees whose key is within the best distance found so far.
+    ...
+    Attributes:
+    ----------
+    words: Sequence[str]
+        the vocabulary. nodes refer to words by their index in it.
+    node_words: List[int]
+        index of the word of each node. node 0 is the root.
+    children: List[dict]
+        children of each node, as {distance: node}
+    distance: Callable
+        the distance function, edit_distance by default
+    checked: int
+        number of words whose distance was computed by the last nearest
+
+    Methods:
+    -------
+    Methods defined here:
+        __init__(self, words, distance=edit_distance):
+            build the tree by inserting the words in their order.
+            :parameter
+                - words:Sequence[str]
+                    the vocabulary
+                - distance:Callable
+                    distance between two words. it should be a metric.
+            :return
+                None
+        insert(self, word_idx):
+            insert words[word_idx] into the tree.
+        within(self, word, max_distance):
+            return (distance, word_idx) pairs of all words within max_distance of word.
+        nearest(self, word):
+            return the index and the distance of the nearest word to the given word. if several words have the same
+            distance, the one with the smallest index wins, the same as scanning the whole vocabulary in order.
+    """
+
+    def __init__(self, words, distance=edit_distance):
+        self.words = words
+        self.distance = distance
+        self.checked = 0
+        self.node_words = []
+        self.children = []
+        for word_idx in range(len(words)):
+            self.insert(word_idx)
+
+    def insert(self, word_idx):
+        if not self.node_words:
+            self.node_words.append(word_idx)
+            self.children.append({})
+            return
+        word = self.words[word_idx]
+        node = 0
+        while True:
+            key = self.distance(self.words[self.node_words[node]], word)
+            child = self.children[node].get(key)
+            if child is None:
+                self.children[node][key] = len(self.node_words)
+                self.node_words.append(word_idx)
+                self.children.append({})
+                return
+            node = child
+
+    def within(self, word, max_distance):
+        result = []
+        if not self.node_words:
+            return result
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            word_idx = self.node_words[node]
+            dist = self.distance(self.words[word_idx], word)
+            if dist <= max_distance:
+                result.append((dist, word_idx))
+            for key, child in self.children[node].items():
+                if dist - max_distance <= key <= dist + max_distance:
+                    stack.append(child)
+        return result
+
+    def nearest(self, word):
+        if not self.node_words:
+            raise Exception("The tree is empty")
+        best_idx, best_dist = -1, float('inf')
+        checked = 0
+        # every item is a node and a lower bound of its distance, taken from the triangle inequality
+        stack = [(0, 0)]
+        while stack:
+            node, lower_bound = stack.pop()
+            if lower_bound > best_dist:
+                continue
+            word_idx = self.node_words[node]
+            dist = self.distance(self.words[word_idx], word)
+            checked += 1
+            if dist < best_dist or (dist == best_dist and word_idx < best_idx):
+                best_idx, best_dist = word_idx, dist
+            for key, child in self.children[node].items():
+                if abs(dist - key) <= best_dist:
+                    stack.append((child, abs(dist - key)))
+        self.checked = checked
+        return best_idx, best_dist
+
+
+def deletes(word, max_distance, prefix_length):
+    """
+    return all strings made by deleting at most max_distance characters of word[:prefix_length], including itself.
+    """
+    result = {word[:prefix_length]}
+    frontier = result
+    for _ in range(max_distance):
+        frontier = {candidate[:i] + candidate[i + 1:] for candidate in frontier for i in range(len(candidate))}
+        result |= frontier
+    return result
+
+
+class DeletionIndex:
+    """
+    This class is a SymSpell style deletion dictionary. Every word of the vocabulary is stored under each string that
+    can be made by deleting at most max_distance characters of its prefix. Two words within distance max_distance of
+    each other always share such a string, so the candidates for a query are found by generating its own deletes and
+    looking them up, without comparing the query with the rest of the vocabulary.
+    ...
+    Attributes:
+    ----------
+    words: Sequence[str]
+        the vocabulary. the dictionary refers to words by their index in it.
+    max_distance: int
+        largest distance the index can answer
+    prefix_length: int
+        only this many first characters of a word are used to make deletes, which keeps the dictionary small. the
+        candidates are checked with the distance of the whole words.
+    dictionary: dict
+        {delete: list of word indexes}
+
+    Methods:
+    -------
+    Methods defined here:
+        __init__(self, words, max_distance=2, prefix_length=7):
+            build the dictionary.
+        add(self, word_idx):
+            add words[word_idx] to the dictionary.
+        within(self, word, max_distance):
+            return (distance, word_idx) pairs of all words within max_distance of word.
+    """
+
+    def __init__(self, words, max_distance=2, prefix_length=7):
+        self.words = words
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.dictionary = {}
+        for word_idx in range(len(words)):
+            self.add(word_idx)
+
+    def add(self, word_idx):
+        for delete in deletes(self.words[word_idx], self.max_distance, self.prefix_length):
+            self.dictionary.setdefault(delete, []).append(word_idx)
+
+    def within(self, word, max_distance):
+        if max_distance > self.max_distance:
+            raise Exception(f"The index is built for distances up to {self.max_distance}")
+        candidates = set()
+        for delete in deletes(word, max_distance, self.prefix_length):
+            candidates.update(self.dictionary.get(delete, ()))
+        result = []
+        for word_idx in candidates:
+            dist = bounded_edit_distance(self.words[word_idx], word, max_distance)
+            if dist <= max_distance:
+                result.append((dist, word_idx))
+        return result
@@ -0,0 +1,442 @@
+"""
+Binary on-disk format of the inverted index and the permuterm index.
+
+An index is saved into a directory with these files:
+
+    lexicon.bin     header, then doc_starts and pos_starts (int64, n_terms + 1 items each), then the start of every
+                    block of the front-coded terms (int64), then the blocks. see src.lexicon.
+    postings.bin    header, then doc_ids of all tokens (int32), then the offsets arrays of all tokens (int32). the
+                    offsets of token t start at doc_starts[t] + t and have df + 1 items, the same as Token.offsets.
+    positions.bin   header, then the positions of all tokens (int32).
+    permuterm.bin   header, then the sorted entries of a PermutermIndex, (term_id << 16) | shift as int64.
+    documents.bin   header, then the tokens of every document joined by spaces (utf-8), document after document, then
+                    the start of every document in that text (int64, n_docs + 1 items). it is optional.
+
+An index saved with compressed postings has the records of src.codec instead: postings.bin has the doc record of every
+term and positions.bin its positions record, each padded to 4 bytes, and doc_starts and pos_starts of the lexicon are
+the byte offsets of the records after the header. The magic of postings.bin tells which layout a directory has.
+
+Every header is (magic, version, count). All arrays are little-endian and 8-byte aligned, so the files are opened with
+mmap and every Token gets memoryview slices of the mapped files instead of copies. Loading is O(1) in the size of the
+index, and several processes that load the same files share one copy of it in the page cache.
+
+IndexWriter writes the files from tokens given one by one in sorted order, so an index can be written while it is merged
+from runs on disk, without the whole posting list in memory.
+"""
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+
+from src.codec import CompressedToken, encode_postings
+from src.indexing import Token
+from src.lexicon import FrontCodedLexicon
+from src.permuterm import PermutermIndex
+
+FORMAT_VERSION = 2
+
+LEXICON_FILE = 'lexicon.bin'
+POSTINGS_FILE = 'postings.bin'
+POSITIONS_FILE = 'positions.bin'
+PERMUTERM_FILE = 'permuterm.bin'
+DOCUMENTS_FILE = 'documents.bin'
+
+LEXICON_MAGIC = b'IRLX'
+POSTINGS_MAGIC = b'IRPS'
+POSITIONS_MAGIC = b'IRPP'
+COMPRESSED_POSTINGS_MAGIC = b'IRCS'
+COMPRESSED_POSITIONS_MAGIC = b'IRCP'
+PERMUTERM_MAGIC = b'IRPM'
+DOCUMENTS_MAGIC = b'IRDC'
+
+# magic, version, count. the lexicon header also has the number of documents and the block size of the terms.
+HEADER = struct.Struct('<4sIQ')
+LEXICON_HEADER = struct.Struct('<4sIQQQ')
+
+
+def _check_byteorder():
+    if sys.byteorder != 'little':
+        raise Exception("The index format is little-endian and can not be mapped on this machine")
+
+
+def _pad(file):
+    """
+    write zero bytes until the file position is a multiple of 8.
+    """
+    remainder = file.tell() % 8
+    if remainder:
+        file.write(b'\0' * (8 - remainder))
+
+
+def _aligned(offset):
+    return (offset + 7) // 8 * 8
+
+
+def _pad4(file):
+    """
+    write zero bytes until the file position is a multiple of 4.
+    """
+    remainder = file.tell() % 4
+    if remainder:
+        file.write(b'\0' * (4 - remainder))
+
+
+def _open_mapped(path, magic, header=HEADER):
+    """
+    map a file into memory and check its header. magic can be a tuple of the magics that are accepted.
+    :return:
+        the mmap object and the unpacked header
+    """
+    with open(path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    values = header.unpack_from(mapped, 0)
+    if values[0] not in (magic if isinstance(magic, tuple) else (magic,)):
+        raise Exception(f"{path} is not an index file")
+    if values[1] != FORMAT_VERSION:
+        raise Exception(f"{path} has format version {values[1]}, but version {FORMAT_VERSION} is supported")
+    return mapped, values
+
+
+class MappedPostingList:
+    """
+    This class is a read-only replacement of InvertedIndex.posting_list for an index loaded from disk. Tokens are
+    created on access, and their arrays are memoryview slices of the mapped files.
+    ...
+    Attributes:
+    -----------
+    words: FrontCodedLexicon
+        the terms of the index
+    doc_starts: memoryview
+        postings of the t-th term are doc_ids[doc_starts[t]:doc_starts[t + 1]]
+    pos_starts: memoryview
+        positions of the t-th term are positions[pos_starts[t]:pos_starts[t + 1]]
+    doc_ids: memoryview
+        doc ids of all terms
+    offsets: memoryview
+        offsets arrays of all terms
+    positions: memoryview
+        positions of all terms
+    """
+
+    def __init__(self, words, doc_starts, pos_starts, doc_ids, offsets, positions, mapped_files):
+        self.words = words
+        self.doc_starts = doc_starts
+        self.pos_starts = pos_starts
+        self.doc_ids = doc_ids
+        self.offsets = offsets
+        self.positions = positions
+        # keep the mappings alive as long as the posting list is alive
+        self.mapped_files = mapped_files
+
+    def __len__(self):
+        return len(self.words)
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return [self[i] for i in range(*t.indices(len(self)))]
+        if t < 0:
+            t += len(self)
+        if not 0 <= t < len(self):
+            raise IndexError("posting list index out of range")
+        doc_start, doc_end = self.doc_starts[t], self.doc_starts[t + 1]
+        return Token.from_arrays(self.words[t],
+                                 self.doc_ids[doc_start:doc_end],
+                                 self.offsets[doc_start + t:doc_end + t + 1],
+                                 self.positions[self.pos_starts[t]:self.pos_starts[t + 1]])
+
+    def __iter__(self):
+        for t in range(len(self)):
+            yield self[t]
+
+
+class MappedCompressedPostingList(MappedPostingList):
+    """
+    This class is the posting list of an index saved with compressed postings. doc_starts and pos_starts are the byte
+    offsets of the records of every term, and a token is a CompressedToken over slices of the mapped files.
+    """
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return [self[i] for i in range(*t.indices(len(self)))]
+        if t < 0:
+            t += len(self)
+        if not 0 <= t < len(self):
+            raise IndexError("posting list index out of range")
+        return CompressedToken.from_records(self.words[t],
+                                            self.doc_ids[self.doc_starts[t]:self.doc_starts[t + 1]],
+                                            self.positions[self.pos_starts[t]:self.pos_starts[t + 1]])
+
+
+class IndexWriter:
+    """
+    This class writes the index files of src.storage from tokens given in sorted order. doc ids and positions go to
+    their files right away, the offsets go to a temporary file that is appended to postings.bin at the end, and only
+    the lexicon (a few integers and the front-coded bytes of every word) is kept in memory.
+    ...
+    Attributes:
+    -----------
+    path: str
+        directory of the index files
+    compressed: bool
+        whether the postings are written as the compressed records of src.codec
+    doc_starts, pos_starts: array
+        the arrays of lexicon.bin so far
+    lexicon: FrontCodedLexicon
+        the words so far
+
+    Methods
+    -------
+    Methods defined here:
+        add(self, word, doc_ids, offsets, positions):
+            write the postings of the next word. words should be added in sorted order, or it raises an exception.
+        close(self, n_docs):
+            write the lexicon and the headers, and close the files.
+    """
+
+    def __init__(self, path, compressed=False):
+        _check_byteorder()
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.compressed = compressed
+        self.doc_starts, self.pos_starts = array('q', [0]), array('q', [0])
+        self.lexicon = FrontCodedLexicon()
+        self.postings_file = open(os.path.join(path, POSTINGS_FILE), 'wb')
+        self.offsets_file = None if compressed else open(os.path.join(path, POSTINGS_FILE + '.tmp'), 'w+b')
+        self.positions_file = open(os.path.join(path, POSITIONS_FILE), 'wb')
+        self.postings_magic = COMPRESSED_POSTINGS_MAGIC if compressed else POSTINGS_MAGIC
+        self.positions_magic = COMPRESSED_POSITIONS_MAGIC if compressed else POSITIONS_MAGIC
+        # the counts of the headers are written in close
+        self.postings_file.write(HEADER.pack(self.postings_magic, FORMAT_VERSION, 0))
+        self.positions_file.write(HEADER.pack(self.positions_magic, FORMAT_VERSION, 0))
+
+    def add(self, word, doc_ids, offsets, positions):
+        self.lexicon.append(word)
+        if self.compressed:
+            record, pos_record = encode_postings(doc_ids, offsets, positions)
+            self.postings_file.write(record)
+            _pad4(self.postings_file)
+            self.positions_file.write(pos_record)
+            _pad4(self.positions_file)
+            self.doc_starts.append(self.postings_file.tell() - HEADER.size)
+            self.pos_starts.append(self.positions_file.tell() - HEADER.size)
+            return
+        self.doc_starts.append(self.doc_starts[-1] + len(doc_ids))
+        self.pos_starts.append(self.pos_starts[-1] + len(positions))
+        self.postings_file.write(doc_ids.tobytes())
+        self.offsets_file.write(offsets.tobytes())
+        self.positions_file.write(positions.tobytes())
+
+    def close(self, n_docs):
+        n_terms = len(self.lexicon)
+        if not self.compressed:
+            _pad(self.postings_file)
+            self.offsets_file.seek(0)
+            shutil.copyfileobj(self.offsets_file, self.postings_file)
+            self.offsets_file.close()
+            os.remove(os.path.join(self.path, POSTINGS_FILE + '.tmp'))
+        self.postings_file.seek(0)
+        self.postings_file.write(HEADER.pack(self.postings_magic, FORMAT_VERSION, self.doc_starts[-1]))
+        self.postings_file.close()
+        self.positions_file.seek(0)
+        self.positions_file.write(HEADER.pack(self.positions_magic, FORMAT_VERSION, self.pos_starts[-1]))
+        self.positions_file.close()
+
+        with open(os.path.join(self.path, LEXICON_FILE), 'wb') as file:
+            file.write(LEXICON_HEADER.pack(LEXICON_MAGIC, FORMAT_VERSION, n_terms, n_docs, self.lexicon.block_size))
+            file.write(self.doc_starts.tobytes())
+            file.write(self.pos_starts.tobytes())
+            file.write(self.lexicon.block_offsets.tobytes())
+            file.write(self.lexicon.blob)
+
+
+def save_index(index, path, compressed=False):
+    """
+    save the posting list of an InvertedIndex into the directory `path`. the directory is created if it does not
+    exist.
+    :param index:
+        the InvertedIndex you want to save. create_posting_list should have been called.
+    :param path:
+        directory of the index files
+    :param compressed:
+        whether the postings are saved as the compressed records of src.codec
+    :return:
+        None
+    """
+    writer = IndexWriter(path, compressed)
+    for token in index.posting_list:
+        writer.add(token.word, token.doc_ids, token.offsets, token.positions)
+    writer.close(index.num_docs)
+
+
+def load_index(path):
+    """
+    map the index files of the directory `path` and return the parts of an InvertedIndex.
+    :param path:
+        directory of the index files
+    :return:
+        a MappedPostingList (or a MappedCompressedPostingList) and the number of documents
+    """
+    _check_byteorder()
+    lexicon, (_, _, n_terms, n_docs, block_size) = _open_mapped(os.path.join(path, LEXICON_FILE), LEXICON_MAGIC,
+                                                                LEXICON_HEADER)
+    postings, (magic, _, n_postings) = _open_mapped(os.path.join(path, POSTINGS_FILE),
+                                                    (POSTINGS_MAGIC, COMPRESSED_POSTINGS_MAGIC))
+    compressed = magic == COMPRESSED_POSTINGS_MAGIC
+    positions, (_, _, n_positions) = _open_mapped(os.path.join(path, POSITIONS_FILE),
+                                                  COMPRESSED_POSITIONS_MAGIC if compressed else POSITIONS_MAGIC)
+
+    lexicon_view = memoryview(lexicon)
+    start = LEXICON_HEADER.size
+    size = (n_terms + 1) * 8
+    doc_starts = lexicon_view[start:start + size].cast('q')
+    pos_starts = lexicon_view[start + size:start + 2 * size].cast('q')
+    start += 2 * size
+    n_blocks = (n_terms + block_size - 1) // block_size
+    block_offsets = lexicon_view[start:start + n_blocks * 8].cast('q')
+    words = FrontCodedLexicon(block_size=block_size, block_offsets=block_offsets,
+                              blob=lexicon_view[start + n_blocks * 8:], n_terms=n_terms)
+
+    if compressed:
+        # the counts are the sizes of the records in bytes
+        posting_list = MappedCompressedPostingList(words, doc_starts, pos_starts,
+                                                   memoryview(postings)[HEADER.size:HEADER.size + n_postings], None,
+                                                   memoryview(positions)[HEADER.size:HEADER.size + n_positions],
+                                                   (lexicon, postings, positions))
+        return posting_list, n_docs
+
+    postings_view = memoryview(postings)
+    start = HEADER.size
+    doc_ids = postings_view[start:start + n_postings * 4].cast('i')
+    start = _aligned(start + n_postings * 4)
+    offsets = postings_view[start:start + (n_postings + n_terms) * 4].cast('i')
+
+    positions_view = memoryview(positions)[HEADER.size:HEADER.size + n_positions * 4].cast('i')
+
+    posting_list = MappedPostingList(words, doc_starts, pos_starts, doc_ids, offsets,
+                                     positions_view, (lexicon, postings, positions))
+    return posting_list, n_docs
+
+
+def save_permuterm(permuterm, path):
+    """
+    save the sorted entries of a PermutermIndex.
+    :param permuterm:
+        a PermutermIndex of the vocabulary in posting_list order, so that term ids match the lexicon
+    :param path:
+        directory of the index files
+    :return:
+        None
+    """
+    _check_byteorder()
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, PERMUTERM_FILE), 'wb') as file:
+        file.write(HEADER.pack(PERMUTERM_MAGIC, FORMAT_VERSION, len(permuterm.entries)))
+        file.write(permuterm.entries.tobytes())
+
+
+def load_permuterm(path, words):
+    """
+    map the permuterm file of the directory `path`.
+    :param path:
+        directory of the index files
+    :param words:
+        the vocabulary the permuterm was saved with
+    :return:
+        a PermutermIndex over the mapped entries
+    """
+    _check_byteorder()
+    mapped, (_, _, count) = _open_mapped(os.path.join(path, PERMUTERM_FILE), PERMUTERM_MAGIC)
+    entries = memoryview(mapped)[HEADER.size:HEADER.size + count * 8].cast('q')
+    return PermutermIndex(words, entries)
+
+
+class DocumentWriter:
+    """
+    This class writes the tokens of documents one by one into documents.bin, so the documents of an index can be kept
+    on disk instead of in memory.
+    ...
+    Attributes:
+    -----------
+    starts: array
+        start of every document in the text so far, and the end of the last one
+
+    Methods
+    -------
+    Methods defined here:
+        add(self, tokens):
+            append a document.
+        close(self):
+            write the starts and the header, and close the file.
+    """
+
+    def __init__(self, path):
+        _check_byteorder()
+        os.makedirs(path, exist_ok=True)
+        self.file = open(os.path.join(path, DOCUMENTS_FILE), 'wb')
+        self.file.write(HEADER.pack(DOCUMENTS_MAGIC, FORMAT_VERSION, 0))
+        self.starts = array('q', [0])
+
+    def add(self, tokens):
+        text = ' '.join(tokens).encode('utf-8')
+        self.file.write(text)
+        self.starts.append(self.starts[-1] + len(text))
+
+    def close(self):
+        _pad(self.file)
+        self.file.write(self.starts.tobytes())
+        self.file.seek(0)
+        self.file.write(HEADER.pack(DOCUMENTS_MAGIC, FORMAT_VERSION, len(self.starts) - 1))
+        self.file.close()
+
+
+class DocumentStore:
+    """
+    This class is a read-only list of the documents of documents.bin. the file is memory-mapped, and a document is
+    decoded into its list of tokens when it is accessed, so the documents take no memory of the process.
+    ...
+    Attributes:
+    -----------
+    starts: memoryview
+        the i-th document is text[starts[i]:starts[i + 1]]
+    text: memoryview
+        utf-8 text of all documents
+    """
+
+    def __init__(self, path):
+        _check_byteorder()
+        self.mapped, (_, _, count) = _open_mapped(os.path.join(path, DOCUMENTS_FILE), DOCUMENTS_MAGIC)
+        view = memoryview(self.mapped)
+        text_end = HEADER.size + struct.unpack_from('<q', self.mapped, len(self.mapped) - 8)[0]
+        self.text = view[HEADER.size:text_end]
+        start = _aligned(text_end)
+        self.starts = view[start:start + (count + 1) * 8].cast('q')
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("document index out of range")
+        text = str(self.text[self.starts[i]:self.starts[i + 1]], 'utf-8')
+        return text.split(' ') if text else []
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def load_documents(path):
+    """
+    map the documents of the directory `path`.
+    :return:
+        a DocumentStore, or None if the documents were not saved
+    """
+    if not os.path.exists(os.path.join(path, DOCUMENTS_FILE)):
+        return None
+    return DocumentStore(path)
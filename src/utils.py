@@ -1,3 +1,11 @@
+import re
+from bisect import bisect_left
+
+# below these ratios of the lengths of two posting lists, set operations are faster than galloping in the longer one
+GALLOP_RATIO = 32
+UNION_RATIO = 8
+
+
 def get_all_permutations(input_str: str):
     """
     this function will generate all circular permutation of a string
@@ -10,10 +18,153 @@ def get_all_permutations(input_str: str):
     return perm_list
 
 
+def intersect_sorted(first, second):
+    """
+    this function will intersect two sorted lists of integers by walking both of them at the same time.
+    :param first:
+        sorted list (or array) of integers
+    :param second:
+        sorted list (or array) of integers
+    :return:
+        sorted list of the integers that are in both of them
+    """
+    result = []
+    i, j = 0, 0
+    n, m = len(first), len(second)
+    while i < n and j < m:
+        if first[i] < second[j]:
+            i += 1
+        elif first[i] > second[j]:
+            j += 1
+        else:
+            result.append(first[i])
+            i += 1
+            j += 1
+    return result
+
+
+def gallop(items, item, lo):
+    """
+    return the index of the first element of the sorted `items` that is not smaller than item, searching from lo by
+    probing 1, 2, 4, ... elements ahead and then binary searching in the last step.
+    """
+    bound, n = 1, len(items)
+    while lo + bound < n and items[lo + bound] < item:
+        bound *= 2
+    return bisect_left(items, item, lo + bound // 2, min(lo + bound + 1, n))
+
+
+def gallop_intersect(first, second):
+    """
+    this function will intersect two sorted lists of integers. when one list is at least GALLOP_RATIO times longer than
+    the other, it walks the shorter one and gallops in the longer one, so it takes about O(n log(m / n)) steps for
+    lengths n <= m, close to the length of the shorter list. lists of similar lengths are intersected with a set, which
+    is faster than galloping or merging them item by item.
+    :param first:
+        sorted list (or array) of integers
+    :param second:
+        sorted list (or array) of integers
+    :return:
+        sorted list of the integers that are in both of them
+    """
+    if len(first) > len(second):
+        first, second = second, first
+    if len(second) < GALLOP_RATIO * len(first):
+        return sorted(set(first).intersection(second))
+    result = []
+    lo, m = 0, len(second)
+    for item in first:
+        lo = gallop(second, item, lo)
+        if lo == m:
+            break
+        if second[lo] == item:
+            result.append(item)
+            lo += 1
+    return result
+
+
+def gallop_difference(first, second):
+    """
+    this function will return the items of the sorted list `first` that are not in the sorted list `second`. it
+    gallops in second when second is much longer, otherwise it filters first with a set of second.
+    :return:
+        sorted list of integers
+    """
+    if len(second) < GALLOP_RATIO * len(first):
+        excluded = set(second)
+        return [item for item in first if item not in excluded]
+    result = []
+    lo, m = 0, len(second)
+    for item in first:
+        lo = gallop(second, item, lo)
+        if lo == m or second[lo] != item:
+            result.append(item)
+    return result
+
+
+def union_sorted(first, second):
+    """
+    this function will merge two sorted lists of integers into one sorted list without duplicates. when one list is
+    much longer, every item of the shorter one is found in it with a binary search, and the runs of the longer one
+    between them are copied as slices. otherwise the lists are merged with a set.
+    :return:
+        sorted list of the integers that are in either of them
+    """
+    if len(first) > len(second):
+        first, second = second, first
+    if len(second) < UNION_RATIO * len(first):
+        return sorted(set(first).union(second))
+    result = []
+    lo, m = 0, len(second)
+    for item in first:
+        position = bisect_left(second, item, lo)
+        result.extend(second[lo:position])
+        result.append(item)
+        lo = position + 1 if position < m and second[position] == item else position
+    result.extend(second[lo:])
+    return result
+
+
+def complement(items, n):
+    """
+    this function will lazily yield the integers of range(n) that are not in the sorted list `items`. nothing of size n
+    is built, so a NOT only costs as much as the part of it that the caller reads.
+    """
+    start = 0
+    for item in items:
+        yield from range(start, item)
+        start = item + 1
+    yield from range(start, n)
+
+
+def wildcard_to_regex(pattern: str):
+    """
+    this function will compile a wildcard pattern into a regular expression that matches whole words. * matches any
+    sequence of characters (also an empty one) and ? matches exactly one character. other characters match
+    themselves.
+    :param pattern: str
+        the wildcard pattern, like *inter*tion*al or c?t*
+    :return:
+        compiled regular expression, use its fullmatch method
+    """
+    parts = []
+    for char in pattern:
+        if char == '*':
+            if not parts or parts[-1] != '.*':
+                parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts), re.DOTALL)
+
+
 def edit_distance(word1: str, word2: str):
     """
     this function will calculate the distance of between two word. The distance means the total number of operation
-    that we need to convert each word to other
+    that we need to convert each word to other. it uses the bit-parallel algorithm of Myers (in the form of Hyyro), so
+    it keeps one column of the dynamic programming matrix as bits of two integers and computes a whole column with a
+    few integer operations, instead of filling the matrix cell by cell.
     :param word1: str
         first word you want to calculate distance of with another
     :param word2:
@@ -21,14 +172,73 @@ def edit_distance(word1: str, word2: str):
     :return:
         the edit distance of between word1 and word2
     """
-    dp = [[0 for j in range(len(word2))] for i in range(len(word1))]
-    for i in range(1, len(word1)):
-        dp[i][0] = i
-    for j in range(1, len(word2)):
-        dp[0][j] = j
-    for i in range(1, len(word1)):
-        for j in range(1, len(word2)):
-            dp[i][j] = min(dp[i - 1][j - 1] + (0 if word1[i] == word2[j] else 1),
-                           dp[i - 1][j] + 1,
-                           dp[i][j - 1] + 1)
-    return dp[-1][-1]
+    m = len(word1)
+    if m == 0:
+        return len(word2)
+    # peq[c] has the i-th bit set if word1[i] == c
+    peq = {}
+    for i, char in enumerate(word1):
+        peq[char] = peq.get(char, 0) | (1 << i)
+    full = (1 << m) - 1
+    last = 1 << (m - 1)
+    # pv and mv are the +1 and -1 vertical deltas of the current column
+    pv, mv = full, 0
+    score = m
+    for char in word2:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return score
+
+
+def bounded_edit_distance(word1: str, word2: str, max_distance: int):
+    """
+    this function calculates the edit distance only if it is at most max_distance. it fills two rows of the matrix,
+    only the cells of the diagonal band of width max_distance (the other cells are always more than max_distance), and
+    stops as soon as every cell of a row is more than max_distance. for large max_distance it uses edit_distance.
+    :param word1: str
+        first word you want to calculate distance of with another
+    :param word2: str
+        second word you want to calculate distance of with another
+    :param max_distance: int
+        the largest distance you are interested in
+    :return:
+        the edit distance of between word1 and word2, or max_distance + 1 if it is more than max_distance
+    """
+    m, n = len(word1), len(word2)
+    over = max_distance + 1
+    if max_distance < 0 or abs(m - n) > max_distance:
+        return over
+    if max_distance > 1:
+        # the band has more than 3 cells per row, so computing the whole distance bit-parallel is faster
+        return min(edit_distance(word1, word2), over)
+    previous = [j if j <= max_distance else over for j in range(n + 1)]
+    for i in range(1, m + 1):
+        current = [over] * (n + 1)
+        row_min = current[0] = i if i <= max_distance else over
+        char = word1[i - 1]
+        for j in range(max(1, i - max_distance), min(n, i + max_distance) + 1):
+            value = previous[j - 1] if char == word2[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if value > over:
+                value = over
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return over
+        previous = current
+    return previous[n]
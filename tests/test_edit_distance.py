@@ -0,0 +1,49 @@
+"""
+edit_distance and bounded_edit_distance against the plain Levenshtein matrix (the edit_distance of src.utils before the
+bit-parallel kernel) on random strings, some of them longer than the 64 bits of a machine word.
+
+    python -m pytest tests
+"""
+import random
+
+import pytest
+
+from src.utils import bounded_edit_distance, edit_distance
+from benchmarks.bench_edit_distance import reference_distance
+
+N_RANDOM = 5000
+
+
+def random_pairs(seed):
+    rng = random.Random(seed)
+    for _ in range(N_RANDOM):
+        # a small alphabet gives many matches, and long words go over one machine word in the bit-parallel kernel
+        alphabet = rng.choice(('ab', 'abc', 'abcdefghij'))
+        word1 = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, rng.choice((8, 80)))))
+        word2 = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, rng.choice((8, 80)))))
+        yield word1, word2, rng.randint(0, 10)
+
+
+@pytest.mark.parametrize('word1, word2, expected', [
+    ('', '', 0),
+    ('', 'abc', 3),
+    ('kitten', 'sitting', 3),
+    ('flaw', 'lawn', 2),
+    ('a' * 70, 'a' * 70, 0),
+    ('a' * 70, 'a' * 69 + 'b', 1),
+    ('ab' * 40, 'ba' * 40, 2),
+])
+def test_known_distances(word1, word2, expected):
+    assert edit_distance(word1, word2) == expected
+    assert edit_distance(word2, word1) == expected
+
+
+def test_edit_distance_matches_reference():
+    for word1, word2, _ in random_pairs(0):
+        assert edit_distance(word1, word2) == reference_distance(word1, word2), (word1, word2)
+
+
+def test_bounded_edit_distance_matches_reference():
+    for word1, word2, max_distance in random_pairs(1):
+        expected = min(reference_distance(word1, word2), max_distance + 1)
+        assert bounded_edit_distance(word1, word2, max_distance) == expected, (word1, word2, max_distance)